@@ -3,6 +3,10 @@ ASGI config for Ashil_BD project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+HTTP goes to Django as usual, WebSocket connections to /ws/chat/<room>/
+are served by students.realtime (live chat delivery). Run with any ASGI
+server, e.g. ``uvicorn Ashil_BD.asgi:application``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,4 +17,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Ashil_BD.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# импорт после get_asgi_application(): приложения Django уже загружены
+from students.realtime import websocket_router  # noqa: E402
+
+application = websocket_router(django_application)
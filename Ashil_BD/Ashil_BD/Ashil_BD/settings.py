@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -136,5 +137,110 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
-    ]
-}
\ No newline at end of file
+    ],
+    # Курсорная пагинация по умолчанию для всех viewset'ов (students/pagination.py)
+    'DEFAULT_PAGINATION_CLASS': 'students.pagination.IdCursorPagination',
+    'PAGE_SIZE': 50,
+}
+# Кэш страниц (students/cache.py). Версии моделей должны быть общими для всех
+# процессов: запись в одном воркере gunicorn или в команде (import_sis,
+# rebuild_stats, ...) обязана сбросить страницы и у остальных. Поэтому по
+# умолчанию — файловый кэш на общем диске, без дополнительных сервисов;
+# несколько серверов — Redis/Memcached. LocMemCache (свой у каждого
+# процесса) — только для тестов.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'page_cache',
+        # при переполнении удаляется треть записей; вытесненная версия не опасна (см. cache._initial_version)
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+if sys.argv[1:2] == ['test']:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'ashil-bd',
+        }
+    }
+PAGE_CACHE_TIMEOUT = 300
+
+# Пакетная запись сообщений чата (students/chat_buffer.py): сообщение
+# попадает в БД не позже FLUSH_INTERVAL секунд после отправки
+CHAT_WRITE_BUFFER = {
+    'ENABLED': True,
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 0.2,
+    'MAX_PENDING': 10000,
+}
+
+# Миниатюры фото студентов (students/thumbnails.py, команда generate_thumbnails):
+# рендер в пуле процессов после загрузки фото, JPEG + WebP на каждый размер
+STUDENT_THUMBNAILS = {
+    'ASYNC': True,
+    'WORKERS': 2,
+    'SIZES': {'card': 160, 'admin': 120},  # удвоенные 80px карточки и 60px админки — для retina
+}
+
+# Докачиваемая загрузка документов частями (students/uploads.py, /api/uploads/):
+# части пишутся во временный каталог, брошенные загрузки убирает gc_media
+CHUNKED_UPLOAD = {
+    'ROOT': BASE_DIR / 'upload_tmp',
+    'CHUNK_SIZE': 8 * 1024 * 1024,
+    'MAX_CHUNK_SIZE': 32 * 1024 * 1024,
+    'MAX_FILE_SIZE': 4 * 1024 * 1024 * 1024,
+    'EXPIRE_HOURS': 24,
+}
+
+# Отдача документов (students/downloads.py): 'direct' — FileResponse/sendfile
+# из Django; 'x-accel' (nginx, internal-location X_ACCEL_PREFIX → MEDIA_ROOT)
+# или 'x-sendfile' (Apache) — Django только проверяет доступ
+DOCUMENT_DOWNLOADS = {
+    'MODE': 'direct',
+    'X_ACCEL_PREFIX': '/protected-media/',
+    'MAX_AGE': 3600,
+}
+
+# Извлечение текста документов для поиска (students/extraction.py,
+# команда extract_document_text): пул процессов после загрузки файла
+DOCUMENT_TEXT = {
+    'ASYNC': True,
+    'WORKERS': 2,
+}
+
+# Календарные ленты .ics (students/ical.py): сколько клиенту можно не
+# перезапрашивать ленту и границы семестра для повторяющихся занятий
+CALENDAR_FEEDS = {
+    'MAX_AGE': 900,
+    'TERM_START': None,  # 'YYYY-MM-DD'; по умолчанию 1 сентября текущего учебного года
+    'TERM_END': None,
+}
+
+# Напоминания о сроках заданий (students/reminders.py, команда
+# send_deadline_reminders): за LEAD_HOURS до срока, пачками по курсам;
+# EMAIL — ещё и письмами записанным студентам
+DEADLINE_REMINDERS = {
+    'LEAD_HOURS': 24,
+    'POLL_SECONDS': 60,
+    'BATCH_SIZE': 500,
+    'EMAIL': False,
+}
+
+# Таблица рекордов «Змейки» (students/snake.py): результаты копятся в памяти
+# по студентам и пишутся одним upsert не реже чем раз в FLUSH_INTERVAL
+# секунд; страница опрашивает таблицу раз в POLL_SECONDS
+SNAKE_LEADERBOARD = {
+    'BUFFERED': True,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 2.0,
+    'MAX_BATCH': 50,
+    'MAX_SCORE': 100000,
+    'TOP': 10,
+    'POLL_SECONDS': 10,
+}
+
+# Архив чата (students/chat_archive.py, команда archive_chat): сообщения
+# старше CHAT_RETENTION_DAYS переносятся в сжатые сегменты по комнатам
+CHAT_ARCHIVE_ROOT = BASE_DIR / 'chat_archive'
+CHAT_RETENTION_DAYS = 30
+CHAT_ARCHIVE_SEGMENT_SIZE = 5000
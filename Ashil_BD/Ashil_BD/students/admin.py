@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Student, Teacher, Course, Enrollment, Grade, Announcement
+from .models import Student, Teacher, Course, Enrollment, Grade, Announcement, Schedule, Assignment, AssignmentScore, SnakeScore
 
 @admin.register(Student)
 class StudentAdmin(admin.ModelAdmin):
@@ -10,7 +10,10 @@ class StudentAdmin(admin.ModelAdmin):
 
     def photo_preview(self, obj):
         if hasattr(obj, 'photo') and obj.photo:
-            return format_html('<img src="{}" width="60" style="border-radius:5px;">', obj.photo.url)
+            # размера 'admin' может не быть в STUDENT_THUMBNAILS['SIZES'] — тогда оригинал
+            thumb = obj.thumbnails.get('admin')
+            return format_html('<img src="{}" width="60" height="60" loading="lazy" style="border-radius:5px; object-fit:cover;">',
+                               thumb['jpg'] if thumb else obj.photo.url)
         return "Нет фото"
     photo_preview.short_description = "Фото"
 
@@ -42,6 +45,37 @@ class AnnouncementAdmin(admin.ModelAdmin):
     list_filter = ('visible',)
     search_fields = ('title',)
 
+@admin.register(Schedule)
+class ScheduleAdmin(admin.ModelAdmin):
+    # накладки по аудитории и преподавателю проверяет Schedule.clean (conflicts.py)
+    list_display = ('course', 'day_of_week', 'start_time', 'end_time', 'classroom', 'is_active')
+    list_filter = ('day_of_week', 'is_active', 'classroom')
+    search_fields = ('course__title', 'classroom')
+    list_select_related = ('course',)
+
+@admin.register(Assignment)
+class AssignmentAdmin(admin.ModelAdmin):
+    list_display = ('title', 'course', 'due_date', 'max_score')
+    list_filter = ('course',)
+    search_fields = ('title', 'course__title')
+    list_select_related = ('course',)
+
+@admin.register(AssignmentScore)
+class AssignmentScoreAdmin(admin.ModelAdmin):
+    list_display = ('assignment', 'student', 'score', 'graded_at')
+    search_fields = ('student__name', 'assignment__title')
+    list_select_related = ('assignment', 'student')
+    raw_id_fields = ('assignment', 'student')
+
+@admin.register(SnakeScore)
+class SnakeScoreAdmin(admin.ModelAdmin):
+    # пишется пакетами из snake.ScoreBuffer; здесь — просмотр и удаление нечестных рекордов
+    list_display = ('student', 'best', 'games', 'updated_at')
+    search_fields = ('student__name',)
+    list_select_related = ('student',)
+    raw_id_fields = ('student',)
+    ordering = ('-best',)
+
 # Настройки панели администратора
 admin.site.site_header = "Панель управления Ashil_BD"
 admin.site.site_title = "Админка Ashil_BD"
@@ -0,0 +1,171 @@
+"""
+Аналитика оценок на NumPy: распределения, перцентили, разброс и динамика.
+
+Оценки выбранного среза (все, курс, преподаватель) читаются одним запросом
+values_list плоскими столбцами — балл, курс, преподаватель, полугодие записи
+на курс — и считаются векторно за один проход: гистограмма по тем же
+границам, что и цвета оценок (score_color: 50 / 70 / 90), перцентили,
+стандартное отклонение, средние по полугодиям и наклон тренда.
+
+Результаты кэшируются в версионированном кэше страниц (cache.py) и
+пересчитываются только после записи в Grade, Enrollment или Course.
+Отдаются через API: /api/analytics/... (api_views.AnalyticsAPIView).
+"""
+import numpy as np
+from django.db.models import CharField, ExpressionWrapper, FloatField, IntegerField, Value
+from django.db.models.functions import Cast, Coalesce, Substr
+
+from .cache import cached_context
+from .models import Course, Enrollment, Grade, Teacher
+
+ANALYTICS_MODELS = (Grade, Enrollment, Course)
+
+EDGES = np.array([50, 70, 90])  # как в score_color
+BUCKETS = (
+    ('danger', '0–49'),
+    ('warning', '50–69'),
+    ('info', '70–89'),
+    ('success', '90–100'),
+)
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def _round(value):
+    return None if value is None or np.isnan(value) else round(float(value), 2)
+
+
+def _term():
+    """
+    Полугодие записи на курс как целое: год * 2 + (месяц > 6). Считается в SQL
+    из текстового вида даты ('YYYY-MM-...'): Extract* на SQLite — функция
+    Python на каждую строку и медленнее всего остального запроса.
+    """
+    stamp = Cast('enrollment__enrolled_at', CharField())
+    year = Cast(Substr(stamp, 1, 4), IntegerField())
+    month = Cast(Substr(stamp, 6, 2), IntegerField())
+    return ExpressionWrapper(year * 2 + month / 7, output_field=IntegerField())
+
+
+def load(**filters):
+    """Столбцы среза одним запросом: балл, курс, преподаватель (0 — нет), полугодие."""
+    rows = list(
+        Grade.objects.filter(score__isnull=False, **filters)
+        .annotate(
+            value=Cast('score', FloatField()),
+            teacher=Coalesce('enrollment__course__teacher_id', Value(0), output_field=IntegerField()),
+            term=_term(),
+        )
+        .order_by()
+        .values_list('value', 'enrollment__course_id', 'teacher', 'term')
+    )
+    data = np.array(rows, dtype=np.float64).reshape(-1, 4)
+    return {
+        'scores': data[:, 0],
+        'course': data[:, 1].astype(np.int64),
+        'teacher': data[:, 2].astype(np.int64),
+        'term': data[:, 3].astype(np.int64),
+    }
+
+
+def term_label(term):
+    year, half = divmod(int(term), 2)
+    return f'{year} {"осень" if half else "весна"}'
+
+
+def histogram(scores):
+    counts = np.bincount(np.digitize(scores, EDGES), minlength=len(BUCKETS))
+    return [{'bucket': name, 'range': label, 'count': int(count)} for (name, label), count in zip(BUCKETS, counts)]
+
+
+def describe(scores):
+    if not scores.size:
+        return {'count': 0, 'mean': None, 'std': None, 'min': None, 'max': None,
+                'percentiles': {f'p{p}': None for p in PERCENTILES}, 'histogram': histogram(scores)}
+    values = np.percentile(scores, PERCENTILES)
+    return {
+        'count': int(scores.size),
+        'mean': _round(scores.mean()),
+        'std': _round(scores.std()),
+        'min': _round(scores.min()),
+        'max': _round(scores.max()),
+        'percentiles': {f'p{p}': _round(v) for p, v in zip(PERCENTILES, values)},
+        'histogram': histogram(scores),
+    }
+
+
+def trend(scores, terms):
+    """Средний балл по полугодиям, изменение к предыдущему и наклон линейного тренда (баллов за полугодие)."""
+    if not scores.size:
+        return {'terms': [], 'slope': None}
+    keys, inverse = np.unique(terms, return_inverse=True)
+    counts = np.bincount(inverse)
+    means = np.bincount(inverse, weights=scores) / counts
+    deltas = np.diff(means, prepend=np.nan)
+    slope = np.polyfit(keys - keys[0], means, 1)[0] if keys.size > 1 else None
+    return {
+        'terms': [
+            {'term': term_label(k), 'count': int(c), 'mean': _round(m), 'change': _round(d)}
+            for k, c, m, d in zip(keys, counts, means, deltas)
+        ],
+        'slope': _round(slope),
+    }
+
+
+def grouped(scores, groups):
+    """describe() по каждой группе: одна сортировка, дальше срезы одного массива."""
+    if not scores.size:
+        return {}
+    order = np.argsort(groups, kind='stable')
+    scores, groups = scores[order], groups[order]
+    keys, starts = np.unique(groups, return_index=True)
+    return {int(key): describe(part) for key, part in zip(keys, np.split(scores, starts[1:]))}
+
+
+def _summary(filters):
+    data = load(**filters)
+    result = describe(data['scores'])
+    result['trend'] = trend(data['scores'], data['term'])
+    return result
+
+
+def overview():
+    return cached_context('analytics', ANALYTICS_MODELS, lambda: _summary({}), 'all')
+
+
+def course_summary(course_id):
+    return cached_context('analytics', ANALYTICS_MODELS, lambda: _summary({'enrollment__course_id': course_id}),
+                          'course', course_id)
+
+
+def teacher_summary(teacher_id):
+    return cached_context('analytics', ANALYTICS_MODELS,
+                          lambda: _summary({'enrollment__course__teacher_id': teacher_id}), 'teacher', teacher_id)
+
+
+def by_course():
+    """Сводка по всем курсам сразу — один запрос и одна сортировка на весь набор оценок."""
+    def build():
+        data = load()
+        stats = grouped(data['scores'], data['course'])
+        titles = dict(Course.objects.values_list('pk', 'title'))
+        return [{'course_id': pk, 'course': titles.get(pk), **summary} for pk, summary in sorted(stats.items())]
+    return cached_context('analytics', ANALYTICS_MODELS, build, 'by_course')
+
+
+def by_teacher():
+    def build():
+        data = load()
+        stats = grouped(data['scores'], data['teacher'])
+        stats.pop(0, None)  # курсы без преподавателя
+        names = dict(Teacher.objects.values_list('pk', 'name'))
+        return [{'teacher_id': pk, 'teacher': names.get(pk), **summary} for pk, summary in sorted(stats.items())]
+    return cached_context('analytics', ANALYTICS_MODELS + (Teacher,), build, 'by_teacher')
+
+
+def by_cohort():
+    """Когорта — полугодие, в котором студент записался на курс."""
+    def build():
+        data = load()
+        stats = grouped(data['scores'], data['term'])
+        return [{'cohort': term_label(term), **summary} for term, summary in sorted(stats.items())]
+    return cached_context('analytics', ANALYTICS_MODELS, build, 'by_cohort')
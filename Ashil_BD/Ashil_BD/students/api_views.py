@@ -1,38 +1,226 @@
-from rest_framework import viewsets, permissions
+from django.shortcuts import get_object_or_404
+from rest_framework import mixins, viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.views import APIView
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
-from .models import Student, Course, Teacher, Enrollment, Grade, Document
+from . import analytics, bulk, leaderboard, search, uploads
+from .parsers import NDJSONParser
+from .models import Student, Course, Teacher, Enrollment, Grade, Document, UploadSession
 from .serializers import (
-    StudentSerializer, CourseSerializer, TeacherSerializer, 
-    EnrollmentSerializer, GradeSerializer, DocumentSerializer
+    StudentSerializer, CourseSerializer, TeacherSerializer,
+    EnrollmentSerializer, GradeSerializer, DocumentSerializer,
+    UploadSessionSerializer, query_list_param,
 )
 
-class StudentViewSet(viewsets.ModelViewSet):
+
+class OptimizedQuerysetMixin:
+    """
+    Готовит queryset под ?expand= и ?fields= сериализатора:
+    раскрытые связи подтягиваются одним JOIN (select_related), а при
+    ?fields= без expand читаются только нужные колонки (only).
+    """
+    # имя в ?expand= → пути для select_related
+    expand_related = {}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request is None:
+            return queryset
+
+        expand = query_list_param(self.request, 'expand') & set(self.expand_related)
+        related = [path for name in sorted(expand) for path in self.expand_related[name]]
+        if related:
+            return queryset.select_related(*related)
+
+        requested = query_list_param(self.request, 'fields')
+        if requested and self.action in ('list', 'retrieve'):
+            model_fields = {f.name for f in queryset.model._meta.concrete_fields}
+            columns = requested & model_fields
+            if columns:
+                queryset = queryset.only('id', *columns)
+        return queryset
+
+
+class BulkUpsertMixin:
+    """
+    POST <endpoint>/bulk/ — массив объектов (JSON) или NDJSON-поток.
+    Ответ: сводка и результат по каждой строке в исходном порядке.
+    """
+    bulk_upsert = None
+    bulk_max_rows = 50000
+
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        rows = request.data
+        if isinstance(rows, dict) and 'items' in rows:
+            rows = rows['items']
+        if not isinstance(rows, list):
+            return Response({'detail': 'ожидается массив объектов или NDJSON'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > self.bulk_max_rows:
+            return Response({'detail': f'не больше {self.bulk_max_rows} строк за запрос'},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        results = self.bulk_upsert(rows)
+        return Response({'summary': bulk.summarize(results), 'results': results})
+
+
+class StudentViewSet(OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Student.objects.all()
     serializer_class = StudentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticated]
+    expand_related = {'teacher': ['teacher']}
 
-class TeacherViewSet(viewsets.ModelViewSet):
+class TeacherViewSet(OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Teacher.objects.all()
     serializer_class = TeacherSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class EnrollmentViewSet(viewsets.ModelViewSet):
+class EnrollmentViewSet(BulkUpsertMixin, OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Enrollment.objects.all()
     serializer_class = EnrollmentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    expand_related = {'student': ['student'], 'course': ['course']}
+    bulk_upsert = staticmethod(bulk.upsert_enrollments)
 
-class GradeViewSet(viewsets.ModelViewSet):
+class GradeViewSet(BulkUpsertMixin, OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Grade.objects.all()
     serializer_class = GradeSerializer
     permission_classes = [permissions.IsAuthenticated]
+    expand_related = {
+        'enrollment': ['enrollment'],
+        'student': ['enrollment__student'],
+        'course': ['enrollment__course'],
+    }
+    bulk_upsert = staticmethod(bulk.upsert_grades)
 
-class DocumentViewSet(viewsets.ModelViewSet):
+class DocumentViewSet(OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Document.objects.all()
     serializer_class = DocumentSerializer
-    permission_classes = [permissions.IsAuthenticated]
\ No newline at end of file
+    permission_classes = [permissions.IsAuthenticated]
+    expand_related = {'course': ['course']}
+
+class UploadSessionViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """Докачиваемая загрузка документа частями (протокол — в uploads.py)."""
+    queryset = UploadSession.objects.all()
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        uploads.discard(instance)
+
+    def _error(self, exc):
+        body = {'detail': str(exc)}
+        if exc.received is not None:
+            body['received'] = exc.received
+        return Response(body, status=exc.status)
+
+    # тело части — сырые байты; парсеры DRF не нужны, request.data не трогаем
+    @action(detail=True, methods=['put'], url_path='chunk', parser_classes=[])
+    def chunk(self, request, pk=None):
+        session = self.get_object()
+        try:
+            start, length = uploads.parse_content_range(request.headers.get('Content-Range'), session.size)
+            received = uploads.write_chunk(session, request._request, start, length)
+        except uploads.UploadError as exc:
+            return self._error(exc)
+        return Response({'received': received, 'size': session.size})
+
+    @action(detail=True, methods=['post'], url_path='complete')
+    def complete(self, request, pk=None):
+        session = self.get_object()
+        try:
+            document = uploads.complete(session)
+        except uploads.UploadError as exc:
+            return self._error(exc)
+        return Response(DocumentSerializer(document, context=self.get_serializer_context()).data,
+                        status=status.HTTP_201_CREATED)
+
+class SearchAPIView(APIView):
+    """GET /api/search/?q=...&type=course,document&page=2 — ранжированные результаты (search.py)."""
+    permission_classes = [permissions.IsAuthenticated]
+    page_size = 20
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()[:200]
+        kinds = sorted(query_list_param(request, 'type') & set(search.INDEXES)) or None
+        try:
+            page = max(1, int(request.query_params.get('page', 1)))
+        except ValueError:
+            return Response({'detail': 'page должен быть целым числом'}, status=status.HTTP_400_BAD_REQUEST)
+        last = search.max_page(self.page_size)
+        if page > last:
+            return Response({'detail': f'page не больше {last}'}, status=status.HTTP_400_BAD_REQUEST)
+        results, has_more, truncated = search.search(query, kinds, (page - 1) * self.page_size, self.page_size)
+        return Response({
+            'query': query,
+            'page': page,
+            'has_more': has_more,
+            'truncated': truncated,
+            'results': [{**hit, 'title': str(hit['title']), 'snippet': str(hit['snippet'])} for hit in results],
+        })
+
+class AnalyticsAPIView(APIView):
+    """
+    Аналитика оценок (analytics.py), scope задаётся в urls.py:
+    /api/analytics/ — все оценки; courses/, teachers/, cohorts/ — сводка по группам;
+    courses/<id>/, teachers/<id>/ — один курс или преподаватель с динамикой по полугодиям.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    scope = 'all'
+
+    def get(self, request, pk=None):
+        if self.scope == 'course':
+            get_object_or_404(Course, pk=pk)
+            return Response(analytics.course_summary(pk))
+        if self.scope == 'teacher':
+            get_object_or_404(Teacher, pk=pk)
+            return Response(analytics.teacher_summary(pk))
+        builders = {
+            'all': analytics.overview,
+            'courses': analytics.by_course,
+            'teachers': analytics.by_teacher,
+            'cohorts': analytics.by_cohort,
+        }
+        return Response(builders[self.scope]())
+
+
+class LeaderboardAPIView(APIView):
+    """
+    Рейтинг студентов по среднему баллу (leaderboard.py):
+    GET /api/leaderboard/?page=3&page_size=50 — страница рейтинга;
+    GET /api/leaderboard/students/<id>/ — место одного студента.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    page_size = 50
+    max_page_size = 200
+
+    def get(self, request, pk=None):
+        if pk is not None:
+            get_object_or_404(Student, pk=pk)
+            place = leaderboard.rank(pk)
+            if place is None:
+                return Response({'detail': 'У студента пока нет оценок'}, status=status.HTTP_404_NOT_FOUND)
+            return Response({'student_id': pk, **place})
+        try:
+            page = max(1, int(request.query_params.get('page', 1)))
+            page_size = min(self.max_page_size, max(1, int(request.query_params.get('page_size', self.page_size))))
+        except ValueError:
+            return Response({'detail': 'page и page_size должны быть целыми числами'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'page': page,
+            'total': leaderboard.total(),
+            'results': leaderboard.page((page - 1) * page_size, page_size),
+        })
@@ -0,0 +1,206 @@
+"""
+Пакетная запись записей на курсы и оценок (API /bulk/ и импорт из SIS).
+
+Строки проверяются пачкой: все нужные студенты, курсы и записи на курс
+читаются несколькими запросами на весь пакет, запись — bulk_create с
+upsert по уникальному ключу. bulk_create не шлёт сигналы, поэтому после
+записи пересчитываются затронутые строки статистики (stats.py) и версии
+кэша страниц (cache.py).
+
+Каждая функция возвращает список результатов по строкам в исходном порядке:
+{'index': i, 'status': 'created' | 'updated' | 'unchanged' | 'error', 'id': ..., 'errors': {...}}
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from . import cache as page_cache
+from . import stats
+from .models import Course, Enrollment, Grade, Student
+
+LOOKUP_CHUNK = 900  # держимся ниже лимита переменных SQLite в IN (...)
+WRITE_BATCH = 1000
+
+
+def _chunks(items, size=LOOKUP_CHUNK):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _existing_ids(model, ids):
+    found = set()
+    for chunk in _chunks(ids):
+        found.update(model.objects.filter(pk__in=chunk).values_list('pk', flat=True))
+    return found
+
+
+def _enrollment_map(pairs):
+    """{(student_id, course_id): enrollment_id} для данных пар."""
+    result = {}
+    by_course = {}
+    for student_id, course_id in pairs:
+        by_course.setdefault(course_id, set()).add(student_id)
+    for course_id, student_ids in by_course.items():
+        for chunk in _chunks(student_ids):
+            rows = Enrollment.objects.filter(course_id=course_id, student_id__in=chunk)
+            result.update(((s, course_id), pk) for pk, s in rows.values_list('pk', 'student_id'))
+    return result
+
+
+def _as_int(value):
+    if isinstance(value, bool):
+        raise ValueError
+    return int(value)
+
+
+def _error(index, errors):
+    return {'index': index, 'status': 'error', 'errors': errors}
+
+
+def _refresh_after_write(course_ids, student_ids, models):
+    stats.refresh_course_stats(course_ids)
+    stats.refresh_student_stats(student_ids)
+    for model in models:
+        transaction.on_commit(lambda model=model: page_cache.bump_version(model))
+
+
+def upsert_enrollments(rows):
+    """rows: [{'student': id, 'course': id}, ...]"""
+    results = [None] * len(rows)
+    parsed = {}
+    for index, row in enumerate(rows):
+        try:
+            key = (_as_int(row['student']), _as_int(row['course']))
+        except (KeyError, TypeError, ValueError):
+            results[index] = _error(index, {'non_field_errors': ['нужны целые поля student и course']})
+            continue
+        if key in parsed:
+            results[index] = _error(index, {'non_field_errors': [f'дубликат строки {parsed[key]} в пакете']})
+            continue
+        parsed[key] = index
+
+    students = _existing_ids(Student, {s for s, _ in parsed})
+    courses = _existing_ids(Course, {c for _, c in parsed})
+    valid = {}
+    for key, index in parsed.items():
+        errors = {}
+        if key[0] not in students:
+            errors['student'] = [f'студент {key[0]} не найден']
+        if key[1] not in courses:
+            errors['course'] = [f'курс {key[1]} не найден']
+        if errors:
+            results[index] = _error(index, errors)
+        else:
+            valid[key] = index
+
+    with transaction.atomic():
+        existing = _enrollment_map(valid)
+        new = [Enrollment(student_id=s, course_id=c) for (s, c) in valid if (s, c) not in existing]
+        # у записи на курс нечего обновлять — конфликт по (student, course) просто пропускаем
+        Enrollment.objects.bulk_create(new, batch_size=WRITE_BATCH, ignore_conflicts=True)
+        ids = _enrollment_map(valid)
+        if new:
+            _refresh_after_write({c for _, c in valid}, {s for s, _ in valid}, [Enrollment])
+
+    for key, index in valid.items():
+        status = 'unchanged' if key in existing else 'created'
+        results[index] = {'index': index, 'status': status, 'id': ids.get(key)}
+    return results
+
+
+def _parse_score(value):
+    if value is None or value == '':
+        return None
+    score = Decimal(str(value))
+    if not score.is_finite() or score < 0 or score > 100:
+        raise ValueError
+    return score.quantize(Decimal('0.01'))
+
+
+def upsert_grades(rows):
+    """
+    rows: [{'enrollment': id, 'score': 87.5, 'comment': '...'}, ...]
+    вместо enrollment можно передать пару student + course.
+    """
+    results = [None] * len(rows)
+    parsed = []
+    for index, row in enumerate(rows):
+        errors = {}
+        enrollment_id = pair = score = None
+        try:
+            if row.get('enrollment') is not None:
+                enrollment_id = _as_int(row['enrollment'])
+            else:
+                pair = (_as_int(row['student']), _as_int(row['course']))
+        except (AttributeError, KeyError, TypeError, ValueError):
+            errors['enrollment'] = ['нужно поле enrollment или пара student и course']
+        try:
+            score = _parse_score(row.get('score') if isinstance(row, dict) else None)
+        except (InvalidOperation, TypeError, ValueError):
+            errors['score'] = ['Оценка должна быть от 0 до 100 баллов']
+        if errors:
+            results[index] = _error(index, errors)
+            continue
+        comment = row.get('comment') or ''
+        parsed.append((index, enrollment_id, pair, score, str(comment)))
+
+    pairs = _enrollment_map({p for _, _, p, _, _ in parsed if p is not None})
+    known = _existing_ids(Enrollment, {e for _, e, _, _, _ in parsed if e is not None}) | set(pairs.values())
+
+    valid = {}
+    for index, enrollment_id, pair, score, comment in parsed:
+        if pair is not None:
+            enrollment_id = pairs.get(pair)
+        if enrollment_id is None or enrollment_id not in known:
+            results[index] = _error(index, {'enrollment': ['запись на курс не найдена']})
+        elif enrollment_id in valid:
+            results[index] = _error(index, {'enrollment': [f'дубликат строки {valid[enrollment_id][0]} в пакете']})
+        else:
+            valid[enrollment_id] = (index, score, comment)
+
+    with transaction.atomic():
+        before = {}
+        for chunk in _chunks(valid):
+            before.update(
+                (e, (score, comment))
+                for e, score, comment in Grade.objects.filter(enrollment_id__in=chunk)
+                .values_list('enrollment_id', 'score', 'comment')
+            )
+        changed = [
+            Grade(enrollment_id=e, score=score, comment=comment)
+            for e, (_, score, comment) in valid.items()
+            if before.get(e) != (score, comment)
+        ]
+        Grade.objects.bulk_create(
+            changed, batch_size=WRITE_BATCH,
+            update_conflicts=True, unique_fields=['enrollment'], update_fields=['score', 'comment'],
+        )
+        ids = {}
+        keys = {}
+        for chunk in _chunks(valid):
+            ids.update(Grade.objects.filter(enrollment_id__in=chunk).values_list('enrollment_id', 'pk'))
+            keys.update(
+                (pk, (s, c)) for pk, s, c in Enrollment.objects.filter(pk__in=chunk).values_list('pk', 'student_id', 'course_id')
+            )
+        if changed:
+            touched = [keys[g.enrollment_id] for g in changed]
+            _refresh_after_write({c for _, c in touched}, {s for s, _ in touched}, [Grade])
+
+    changed_ids = {g.enrollment_id for g in changed}
+    for enrollment_id, (index, _, _) in valid.items():
+        if enrollment_id not in before:
+            status = 'created'
+        elif enrollment_id in changed_ids:
+            status = 'updated'
+        else:
+            status = 'unchanged'
+        results[index] = {'index': index, 'status': status, 'id': ids.get(enrollment_id)}
+    return results
+
+
+def summarize(results):
+    summary = {'created': 0, 'updated': 0, 'unchanged': 0, 'error': 0}
+    for result in results:
+        summary[result['status']] += 1
+    return summary
@@ -0,0 +1,103 @@
+"""
+Версионированный кэш страниц.
+
+У каждой модели есть счётчик версии в кэше, сигналы post_save/post_delete
+увеличивают его (см. signals.py). Ключ закэшированного контекста страницы
+включает версии всех моделей, от которых она зависит, поэтому запись в
+Document сбрасывает только список файлов, а не дашборд.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'model_version:{}'
+PAGE_KEY = 'page:{}:{}'
+COUNTER_KEY = 'page_cache_stats:{}:{}'
+PAGES_KEY = 'page_cache_stats:pages'
+
+
+def _label(model):
+    return model._meta.label_lower
+
+
+def _initial_version():
+    # если ключ версии вытеснен из кэша, новая версия не должна совпасть
+    # со старой, иначе снова поднимутся устаревшие страницы
+    return int(time.time() * 1000)
+
+
+def bump_version(model):
+    key = VERSION_KEY.format(_label(model))
+    if not cache.add(key, _initial_version(), timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), timeout=None)
+
+
+def get_versions(models):
+    keys = [VERSION_KEY.format(_label(model)) for model in models]
+    found = cache.get_many(keys)
+    missing = {key: _initial_version() for key in keys if key not in found}
+    if missing:
+        for key, value in missing.items():
+            cache.add(key, value, timeout=None)
+        found.update(cache.get_many(list(missing)))
+    return [found[key] for key in keys]
+
+
+def page_key(page, models, *parts):
+    versions = '.'.join(str(v) for v in get_versions(models))
+    suffix = ':'.join(str(p) for p in parts)
+    return PAGE_KEY.format(page, f'{versions}:{suffix}' if suffix else versions)
+
+
+def _count(page, outcome):
+    key = COUNTER_KEY.format(page, outcome)
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+    pages = cache.get(PAGES_KEY) or set()
+    if page not in pages:
+        cache.set(PAGES_KEY, pages | {page}, timeout=None)
+
+
+def cached_context(page, models, builder, *parts):
+    """
+    Возвращает контекст страницы из кэша или строит его через builder().
+
+    builder должен возвращать уже вычисленные данные (списки, числа),
+    а не ленивые QuerySet'ы — иначе в кэш попадёт только SQL.
+    """
+    key = page_key(page, models, *parts)
+    context = cache.get(key)
+    outcome = 'hit'
+    if context is None:
+        outcome = 'miss'
+        context = builder()
+        cache.set(key, context, getattr(settings, 'PAGE_CACHE_TIMEOUT', 300))
+    _count(page, outcome)
+    return context
+
+
+def cache_stats():
+    stats = {}
+    for page in sorted(cache.get(PAGES_KEY) or ()):
+        hits = cache.get(COUNTER_KEY.format(page, 'hit'), 0)
+        misses = cache.get(COUNTER_KEY.format(page, 'miss'), 0)
+        total = hits + misses
+        stats[page] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 3) if total else None,
+        }
+    return stats
+
+
+def reset_cache_stats():
+    pages = cache.get(PAGES_KEY) or ()
+    cache.delete_many([COUNTER_KEY.format(page, outcome) for page in pages for outcome in ('hit', 'miss')])
+    cache.delete(PAGES_KEY)
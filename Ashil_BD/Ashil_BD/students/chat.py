@@ -0,0 +1,129 @@
+from django.contrib.auth.models import User
+from django.db.models import Q
+
+from .models import ChatMessage
+
+MAX_MESSAGE_LENGTH = 2000
+HISTORY_LIMIT = 50
+MAX_HISTORY_LIMIT = 200
+
+# Имя комнаты — один сегмент пути, не длиннее ChatMessage.room. Одно правило
+# для HTTP-маршрутов (конвертер <room:...>) и WebSocket (realtime.ROOM_PATH).
+ROOM_NAME = r'[^/]{1,100}'
+
+
+class RoomNameConverter:
+    regex = ROOM_NAME
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return value
+
+
+def get_guest_user():
+    # Используем гостевого пользователя для всех
+    try:
+        return User.objects.get(username='guest')
+    except User.DoesNotExist:
+        # Если пользователя нет - создаем
+        return User.objects.create_user(
+            username='guest',
+            email='guest@test.ru',
+            password='123'
+        )
+
+
+def create_message(room, text, user=None):
+    return ChatMessage.objects.create(
+        user=user or get_guest_user(),
+        room=room,
+        message=text[:MAX_MESSAGE_LENGTH],
+    )
+
+
+def serialize_message(message, username=None):
+    return {
+        'id': message.id,
+        'room': message.room,
+        'user': username or message.user.username,
+        'message': message.message,
+        'timestamp': message.timestamp.isoformat(),
+    }
+
+
+def _cursor_filter(room, cursor_id, direction):
+    """
+    Условие keyset-пагинации по (timestamp, id) относительно сообщения cursor_id.
+
+    Если курсора нет в комнате, сравниваем только по id — он растёт вместе со временем.
+    """
+    timestamp = ChatMessage.objects.filter(room=room, pk=cursor_id).values_list('timestamp', flat=True).first()
+    if timestamp is None:
+        return Q(**{f'id__{direction}': cursor_id})
+    # ведущее timestamp >= / <= даёт SQLite диапазон по индексу, OR лишь уточняет границу
+    return Q(**{f'timestamp__{direction}e': timestamp}) & (
+        Q(**{f'timestamp__{direction}': timestamp}) | Q(**{f'id__{direction}': cursor_id})
+    )
+
+
+def fetch_history(room, after=None, before=None, limit=HISTORY_LIMIT):
+    """
+    Страница истории комнаты в хронологическом порядке.
+
+    after=X — сообщения новее X (опрос новых), before=Y — старше Y (прокрутка
+    назад), без курсоров — последние limit сообщений. Все варианты идут по
+    индексу (room, timestamp, id) и не зависят от размера комнаты.
+    Когда живая таблица заканчивается, страница дочитывается из архивных
+    сегментов (chat_archive) — для клиента это та же история.
+    Возвращает (messages, has_more).
+    """
+    from . import chat_archive
+
+    limit = max(1, min(limit, MAX_HISTORY_LIMIT))
+    qs = ChatMessage.objects.filter(room=room).select_related('user')
+    if after is not None:
+        rows, has_more = [], False
+        last_archived = chat_archive.last_archived_id(room)
+        if last_archived is not None and after < last_archived:
+            rows, has_more = chat_archive.archived_after(room, after, limit)
+            if has_more:
+                return rows, True
+        rows += list(qs.filter(_cursor_filter(room, after, 'gt')).order_by('timestamp', 'id')[:limit - len(rows) + 1])
+        return rows[:limit], len(rows) > limit
+
+    if before is not None:
+        qs = qs.filter(_cursor_filter(room, before, 'lt'))
+    rows = list(qs.order_by('-timestamp', '-id')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    if not has_more:
+        # живые сообщения кончились — продолжаем из архива
+        older_than = rows[0].id if rows else before
+        need = limit - len(rows)
+        if need:
+            older, has_more = chat_archive.archived_before(room, older_than, need)
+            rows = older + rows
+        else:
+            has_more = chat_archive.has_archive(room)
+    return rows, has_more
+
+
+def fetch_range(room, start, end, limit=HISTORY_LIMIT):
+    """
+    Сообщения комнаты за интервал времени [start, end) в хронологическом
+    порядке: сначала архивные сегменты (их диапазоны времени в индексе
+    ChatArchiveSegment), затем живая таблица. Возвращает (messages, has_more).
+    """
+    from . import chat_archive
+
+    limit = max(1, min(limit, MAX_HISTORY_LIMIT))
+    rows, has_more = chat_archive.archived_between(room, start, end, limit)
+    if has_more:
+        return rows, True
+    live = (ChatMessage.objects.filter(room=room, timestamp__gte=start, timestamp__lt=end)
+            .select_related('user').order_by('timestamp', 'id'))
+    rows += list(live[:limit - len(rows) + 1])
+    return rows[:limit], len(rows) > limit
@@ -0,0 +1,187 @@
+"""
+Хранение и архивирование старых сообщений чата.
+
+Сообщения старше CHAT_RETENTION_DAYS уходят из горячей таблицы ChatMessage
+в сжатые сегменты по комнатам: CHAT_ARCHIVE_ROOT/<room>/<first_id>-<last_id>.ndjson.gz.
+Сегмент пишется один раз и больше не меняется (новые прогоны добавляют
+новые файлы), поэтому его содержимое можно кэшировать в памяти.
+Таблица ChatArchiveSegment — маленький индекс: диапазоны id и времени
+каждого сегмента, по нему история находит нужные файлы, не открывая остальные.
+"""
+import gzip
+import json
+import os
+from datetime import timedelta
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ChatArchiveSegment, ChatMessage
+
+
+def archive_root():
+    return Path(getattr(settings, 'CHAT_ARCHIVE_ROOT', Path(settings.BASE_DIR) / 'chat_archive'))
+
+
+def _room_dir(room):
+    # имя комнаты приходит из URL — экранируем, чтобы не выйти за пределы архива;
+    # quote() не трогает точки, поэтому «.» и «..» кодируем отдельно
+    name = quote(room, safe='')
+    if not name.strip('.'):
+        name = name.replace('.', '%2E')
+    return name or '_'
+
+
+def _segment_path(root, relative):
+    path = (root / relative).resolve()
+    if root.resolve() not in path.parents:
+        raise ValueError(f'сегмент {relative} вне архива {root}')
+    return path
+
+
+def _record(message):
+    return {
+        'id': message.id,
+        'room': message.room,
+        'user_id': message.user_id,
+        'user': message.user.username,
+        'message': message.message,
+        'timestamp': message.timestamp.isoformat(),
+    }
+
+
+def _write_segment(path, records):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as gz:
+            for record in records:
+                gz.write(json.dumps(record, ensure_ascii=False).encode('utf-8'))
+                gz.write(b'\n')
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, path)
+    return path.stat().st_size
+
+
+def archive_room(room, cutoff, segment_size=None):
+    """Переносит сообщения комнаты старше cutoff в сегменты. Возвращает (сообщений, сегментов, байт)."""
+    segment_size = segment_size or getattr(settings, 'CHAT_ARCHIVE_SEGMENT_SIZE', 5000)
+    root = archive_root()
+    archived = segments = size = 0
+    while True:
+        batch = list(
+            ChatMessage.objects.filter(room=room, timestamp__lt=cutoff)
+            .select_related('user').order_by('timestamp', 'id')[:segment_size]
+        )
+        if not batch:
+            break
+        records = [_record(m) for m in batch]
+        relative = Path(_room_dir(room)) / f'{batch[0].id}-{batch[-1].id}.ndjson.gz'
+        # сначала файл на диск (fsync + rename), потом в одной транзакции
+        # индекс сегмента и удаление строк: сбой между шагами оставит лишь
+        # файл, который следующий прогон перезапишет тем же содержимым
+        written = _write_segment(_segment_path(root, relative), records)
+        with transaction.atomic():
+            ChatArchiveSegment.objects.update_or_create(path=str(relative), defaults={
+                'room': room,
+                'first_id': min(m.id for m in batch),
+                'last_id': max(m.id for m in batch),
+                'first_timestamp': batch[0].timestamp,
+                'last_timestamp': batch[-1].timestamp,
+                'message_count': len(batch),
+                'size_bytes': written,
+            })
+            ChatMessage.objects.filter(pk__in=[m.id for m in batch]).delete()
+        archived += len(batch)
+        segments += 1
+        size += written
+    return archived, segments, size
+
+
+def archive_old_messages(older_than=None, rooms=None, segment_size=None):
+    if older_than is None:
+        older_than = timedelta(days=getattr(settings, 'CHAT_RETENTION_DAYS', 30))
+    cutoff = timezone.now() - older_than
+    if rooms is None:
+        rooms = ChatMessage.objects.filter(timestamp__lt=cutoff).values_list('room', flat=True).distinct()
+    result = {}
+    for room in list(rooms):
+        result[room] = archive_room(room, cutoff, segment_size)
+    return result
+
+
+@lru_cache(maxsize=64)
+def _load_segment(path):
+    # сегменты неизменяемы — распакованное содержимое можно держать в памяти
+    with gzip.open(archive_root() / path, 'rb') as gz:
+        return tuple(json.loads(line) for line in gz if line.strip())
+
+
+def _to_message(record):
+    message = ChatMessage(
+        id=record['id'],
+        room=record['room'],
+        user_id=record['user_id'],
+        message=record['message'],
+        timestamp=parse_datetime(record['timestamp']),
+    )
+    message.user = User(id=record['user_id'], username=record['user'])
+    return message
+
+
+def has_archive(room):
+    return ChatArchiveSegment.objects.filter(room=room).exists()
+
+
+def archived_before(room, before=None, limit=50):
+    """Последние limit архивных сообщений с id < before (в хронологическом порядке) и флаг has_more."""
+    segments = ChatArchiveSegment.objects.filter(room=room)
+    if before is not None:
+        segments = segments.filter(first_id__lt=before)
+    rows = []
+    for segment in segments.order_by('-last_id').iterator():
+        records = _load_segment(segment.path)
+        if before is not None:
+            records = [r for r in records if r['id'] < before]
+        rows[:0] = records
+        if len(rows) > limit:
+            return [_to_message(r) for r in rows[-limit:]], True
+    return [_to_message(r) for r in rows], False
+
+
+def archived_after(room, after, limit=50):
+    """Первые limit архивных сообщений с id > after и флаг has_more (в пределах архива)."""
+    rows = []
+    for segment in ChatArchiveSegment.objects.filter(room=room, last_id__gt=after).order_by('first_id').iterator():
+        rows.extend(r for r in _load_segment(segment.path) if r['id'] > after)
+        if len(rows) > limit:
+            return [_to_message(r) for r in rows[:limit]], True
+    return [_to_message(r) for r in rows], False
+
+
+def archived_between(room, start, end, limit=50):
+    """
+    Первые limit архивных сообщений за интервал времени [start, end) и флаг
+    has_more (в пределах архива) — сегменты отбираются по индексу времени.
+    """
+    segments = ChatArchiveSegment.objects.filter(room=room, first_timestamp__lt=end, last_timestamp__gte=start)
+    rows = []
+    for segment in segments.order_by('first_id').iterator():
+        for record in _load_segment(segment.path):
+            timestamp = parse_datetime(record['timestamp'])
+            if start <= timestamp < end:
+                rows.append(_to_message(record))
+        if len(rows) > limit:
+            return rows[:limit], True
+    return rows, False
+
+
+def last_archived_id(room):
+    return ChatArchiveSegment.objects.filter(room=room).order_by('-last_id').values_list('last_id', flat=True).first()
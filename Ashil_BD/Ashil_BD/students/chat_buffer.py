@@ -0,0 +1,204 @@
+"""
+Отложенная пакетная запись сообщений чата (write-behind).
+
+Вместо INSERT на каждое сообщение submit() кладёт его в очередь в памяти,
+а фоновый поток сбрасывает очередь одним bulk_create в одной транзакции,
+когда набралось batch_size сообщений или самое старое ждёт flush_interval.
+
+Гарантии:
+* задержка — сообщение попадает в БД не позже чем через flush_interval
+  плюс время самой записи пакета; пакет пишется атомарно целиком;
+* долговечность — submit() возвращается ДО записи в БД. При аварийном
+  завершении процесса теряются сообщения, ещё не сброшенные на диск (не
+  больше чем за flush_interval / max_pending штук). При штатной остановке
+  очередь дописывается через atexit. Кому нужно «записано» — ждёт
+  возвращённый Event (так делает обычный POST чата перед редиректом);
+* ошибки БД — запись пакета повторяется до max_retries раз, после чего
+  пакет выбрасывается с записью в лог;
+* порядок — внутри комнаты сохраняется порядок submit(); timestamp
+  проставляется в момент записи пакета (auto_now_add).
+
+Отправитель (гостевой пользователь) определяется один раз на процесс.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import chat
+from .models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+
+class ChatWriteBuffer:
+    def __init__(self, batch_size=100, flush_interval=0.2, max_pending=10000, max_retries=3,
+                 on_flush=None, autostart=True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.on_flush = on_flush
+        self.autostart = autostart
+
+        self._pending = deque()  # (message, done_event, submitted_at)
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self._sender = None
+        self.stats = {'submitted': 0, 'flushed': 0, 'batches': 0, 'dropped': 0, 'max_latency': 0.0}
+
+    def _sender_id(self):
+        if self._sender is None:
+            user = chat.get_guest_user()
+            self._sender = (user.pk, user.username)
+        return self._sender
+
+    def submit(self, room, text, user=None):
+        """Ставит сообщение в очередь и сразу возвращает Event, который сработает после записи."""
+        if self._closed:
+            raise RuntimeError('буфер чата закрыт')
+        if user is not None:
+            message = ChatMessage(user=user, room=room, message=text[:chat.MAX_MESSAGE_LENGTH])
+        else:
+            user_id, username = self._sender_id()
+            message = ChatMessage(user_id=user_id, room=room, message=text[:chat.MAX_MESSAGE_LENGTH])
+            message._username = username
+        done = threading.Event()
+        with self._condition:
+            # обратное давление: очередь переполнена — ждём, пока фоновый поток её разгрузит
+            while len(self._pending) >= self.max_pending and self._thread is not None:
+                self._condition.notify_all()
+                self._condition.wait(self.flush_interval)
+            self._pending.append((message, done, time.monotonic()))
+            self.stats['submitted'] += 1
+            # будим поток, когда очередь стала непустой (пора заводить таймер) или набрался пакет
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._condition.notify_all()
+        if self.autostart:
+            self.start()
+        return done
+
+    def pending_count(self):
+        with self._condition:
+            return len(self._pending)
+
+    def flush(self):
+        """Сбрасывает всё, что накопилось, пакетами по batch_size. Возвращает записанные сообщения."""
+        written = []
+        with self._flush_lock:
+            while True:
+                with self._condition:
+                    if not self._pending:
+                        break
+                    batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                    self._condition.notify_all()
+                written.extend(self._write(batch))
+        return written
+
+    def _write(self, batch, attempt=1):
+        messages = [item[0] for item in batch]
+        try:
+            with transaction.atomic():
+                ChatMessage.objects.bulk_create(messages)
+        except Exception:
+            if attempt < self.max_retries:
+                logger.exception('Не удалось записать пакет чата (%s сообщений), попытка %s', len(batch), attempt)
+                time.sleep(min(self.flush_interval, 1.0))
+                return self._write(batch, attempt + 1)
+            logger.exception('Пакет чата из %s сообщений потерян после %s попыток', len(batch), attempt)
+            self.stats['dropped'] += len(batch)
+            for _, done, _ in batch:
+                done.set()
+            return []
+
+        now = time.monotonic()
+        self.stats['flushed'] += len(batch)
+        self.stats['batches'] += 1
+        self.stats['max_latency'] = max(self.stats['max_latency'], now - batch[0][2])
+        for _, done, _ in batch:
+            done.set()
+        if self.on_flush is not None:
+            self.on_flush(messages)
+        return messages
+
+    def _due(self):
+        if not self._pending:
+            return None
+        if len(self._pending) >= self.batch_size:
+            return 0
+        return max(0.0, self._pending[0][2] + self.flush_interval - time.monotonic())
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    due = self._due()
+                    if due == 0 or (self._closed and self._pending):
+                        break
+                    if self._closed:
+                        return
+                    self._condition.wait(due)
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._condition:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name='chat-write-buffer', daemon=True)
+                self._thread.start()
+
+    def close(self, timeout=5.0):
+        """Останавливает фоновый поток, дописав очередь."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+
+def _publish(messages):
+    # bulk_create не шлёт post_save — рассылаем подписчикам WebSocket сами
+    from . import realtime
+    for message in messages:
+        realtime.publish_message(message, getattr(message, '_username', None))
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                options = getattr(settings, 'CHAT_WRITE_BUFFER', {})
+                _buffer = ChatWriteBuffer(
+                    batch_size=options.get('BATCH_SIZE', 100),
+                    flush_interval=options.get('FLUSH_INTERVAL', 0.2),
+                    max_pending=options.get('MAX_PENDING', 10000),
+                    on_flush=_publish,
+                )
+                atexit.register(_buffer.close)
+    return _buffer
+
+
+def submit_message(room, text):
+    """Точка входа для view и WebSocket: буфер, если включён, иначе обычная запись."""
+    if getattr(settings, 'CHAT_WRITE_BUFFER', {}).get('ENABLED', False):
+        return get_buffer().submit(room, text)
+    chat.create_message(room, text)
+    done = threading.Event()
+    done.set()
+    return done
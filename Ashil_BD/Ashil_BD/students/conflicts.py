@@ -0,0 +1,106 @@
+"""
+Накладки в расписании: одна аудитория или один преподаватель в один день
+в пересекающееся время. Интервалы полуоткрытые [start, end) — пара,
+закончившаяся в 10:30, не мешает паре с 10:30.
+
+Проверка одной записи (Schedule.clean — админка и формы) — O(log n) по
+индексу (day_of_week, classroom, start_time). Если в группе накладок нет,
+интервалы, упорядоченные по началу, упорядочены и по концу, поэтому хватает
+одного соседа — последнего занятия, начавшегося раньше конца нового.
+Для преподавателя то же по индексу (course, day_of_week, start_time) для
+каждого его курса.
+
+Полный аудит (python manage.py audit_schedule) — один проход заметающей
+прямой по группам (день, аудитория) и (день, преподаватель): O(n log n + k),
+где k — число найденных пар. Он же находит накладки, внесённые в обход
+проверки (bulk-запись, старые данные).
+"""
+import heapq
+
+from django.core.exceptions import ValidationError
+
+from . import timetable
+from .models import Course, Schedule
+
+KINDS = {'classroom': 'аудитория', 'teacher': 'преподаватель'}
+
+
+def _previous(queryset, schedule):
+    """Последнее активное занятие группы, начавшееся до конца schedule, если оно ещё идёт."""
+    queryset = queryset.filter(is_active=True, start_time__lt=schedule.end_time)
+    if schedule.pk is not None:
+        queryset = queryset.exclude(pk=schedule.pk)
+    previous = queryset.select_related('course').order_by('-start_time').first()
+    if previous is not None and previous.end_time > schedule.start_time:
+        return previous
+    return None
+
+
+def find_conflicts(schedule):
+    """{'classroom': Schedule, 'teacher': Schedule} — с чем пересекается занятие (пустой dict, если ни с чем)."""
+    if not schedule.is_active or schedule.course_id is None:
+        return {}
+    day = Schedule.objects.filter(day_of_week=schedule.day_of_week)
+    found = {}
+    if schedule.classroom:
+        clash = _previous(day.filter(classroom=schedule.classroom), schedule)
+        if clash is not None:
+            found['classroom'] = clash
+    teacher_id = Course.objects.filter(pk=schedule.course_id).values_list('teacher_id', flat=True).first()
+    if teacher_id is not None:
+        # по списку курсов, а не JOIN: так SQLite идёт по schedule_course_day_idx, а не по всему дню
+        courses = list(Course.objects.filter(teacher_id=teacher_id).values_list('pk', flat=True))
+        clash = _previous(day.filter(course_id__in=courses), schedule)
+        if clash is not None:
+            found['teacher'] = clash
+    return found
+
+
+def validate(schedule):
+    if schedule.start_time is None or schedule.end_time is None:
+        return
+    if schedule.start_time >= schedule.end_time:
+        raise ValidationError({'end_time': ['Занятие должно заканчиваться позже, чем начинается']})
+    found = find_conflicts(schedule)
+    errors = {}
+    if 'classroom' in found:
+        errors['classroom'] = [f'Аудитория {schedule.classroom} уже занята: {found["classroom"]}']
+    if 'teacher' in found:
+        errors['course'] = [f'Преподаватель курса уже ведёт занятие: {found["teacher"]}']
+    if errors:
+        raise ValidationError(errors)
+
+
+def audit(entries=None):
+    """
+    Все накладки расписания за один проход. entries — как timetable.load_entries().
+    Возвращает список {'kind', 'day', 'key', 'first', 'second'} в порядке день → время.
+    """
+    if entries is None:
+        entries = timetable.load_entries()
+    groups = {}
+    for entry in entries:
+        if entry['classroom']:
+            groups.setdefault(('classroom', entry['day'], entry['classroom']), []).append(entry)
+        if entry['teacher_id'] is not None:
+            groups.setdefault(('teacher', entry['day'], entry['teacher_id']), []).append(entry)
+
+    found = []
+    for (kind, day, _), items in groups.items():
+        items.sort(key=lambda e: (e['start'], e['end'], e['id']))
+        running = []  # куча (конец, id, занятие) — занятия, ещё идущие в момент начала текущего
+        for entry in items:
+            while running and running[0][0] <= entry['start']:
+                heapq.heappop(running)
+            for _, _, other in running:
+                found.append({
+                    'kind': kind,
+                    'day': day,
+                    'key': entry['classroom'] if kind == 'classroom' else entry['teacher'],
+                    'first': other,
+                    'second': entry,
+                })
+            heapq.heappush(running, (entry['end'], entry['id'], entry))
+    found.sort(key=lambda c: (timetable.DAY_INDEX.get(c['day'], len(timetable.DAYS)),
+                              c['second']['start'], c['first']['id'], c['kind']))
+    return found
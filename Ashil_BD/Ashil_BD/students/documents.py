@@ -0,0 +1,78 @@
+"""
+Метаданные загруженных документов.
+
+Размер, расширение, MIME-тип и SHA-256 содержимого считаются один раз при
+сохранении (сигнал pre_save, пока загруженный файл ещё в памяти/во временном
+файле) и лежат в колонках Document — список документов больше не трогает
+хранилище на каждую строку и сортируется по индексам.
+Для старых записей: python manage.py backfill_document_metadata.
+"""
+import hashlib
+import mimetypes
+import posixpath
+
+HASH_CHUNK = 1024 * 1024
+
+ICONS = {
+    'pdf': '📕',
+    'doc': '📄',
+    'docx': '📄',
+    'xls': '📊',
+    'xlsx': '📊',
+    'ppt': '📽️',
+    'pptx': '📽️',
+    'jpg': '🖼️',
+    'png': '🖼️',
+    'zip': '📦',
+}
+
+# сортировки списка документов: ?sort= → order_by (id — для стабильного порядка страниц)
+SORTS = {
+    'new': ('-uploaded_at', '-id'),
+    'old': ('uploaded_at', 'id'),
+    'title': ('title', 'id'),
+    'size': ('-file_size', '-id'),
+    'size_asc': ('file_size', 'id'),
+    'ext': ('file_ext', 'title', 'id'),
+}
+DEFAULT_SORT = 'new'
+
+
+def file_extension(name):
+    ext = posixpath.splitext(name or '')[1]
+    return ext[1:].lower()[:16]
+
+
+def format_size(size):
+    if size is None:
+        return 'Unknown'
+    if size < 1024:
+        return f'{size} B'
+    if size < 1024 * 1024:
+        return f'{size / 1024:.1f} KB'
+    return f'{size / (1024 * 1024):.1f} MB'
+
+
+def file_metadata(field_file):
+    """{'file_size', 'file_ext', 'mime_type', 'content_hash'} — один проход по содержимому."""
+    digest = hashlib.sha256()
+    size = 0
+    field_file.open('rb')
+    try:
+        if hasattr(field_file, 'seek'):
+            field_file.seek(0)
+        for chunk in field_file.chunks(HASH_CHUNK):
+            digest.update(chunk)
+            size += len(chunk)
+        if hasattr(field_file, 'seek'):
+            field_file.seek(0)  # файл ещё будут сохранять в хранилище
+    finally:
+        if field_file._committed:
+            field_file.close()
+    name = field_file.name
+    return {
+        'file_size': size,
+        'file_ext': file_extension(name),
+        'mime_type': mimetypes.guess_type(name)[0] or 'application/octet-stream',
+        'content_hash': digest.hexdigest(),
+    }
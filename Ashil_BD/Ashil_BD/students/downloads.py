@@ -0,0 +1,171 @@
+"""
+Отдача файлов документов.
+
+GET /documents/<id>/download/ вместо прямой ссылки на MEDIA_URL:
+* доступ — по курсу документа (can_access);
+* ETag (SHA-256 содержимого) и Last-Modified → 304 на If-None-Match /
+  If-Modified-Since, 412 на If-Match / If-Unmodified-Since;
+* Range: bytes=a-b | a- | -n (одиночный диапазон, с учётом If-Range) → 206,
+  несколько диапазонов отдаются целым файлом (так разрешает RFC 9110);
+* файл не читается в память Python: FileResponse отдаёт открытый файл, и
+  WSGI-сервер с wsgi.file_wrapper (gunicorn) шлёт его через sendfile() —
+  для диапазона тоже, т.к. дескриптор уже спозиционирован на начало;
+* DOCUMENT_DOWNLOADS['MODE'] = 'x-accel' | 'x-sendfile' — после проверки
+  доступа отдачу целиком берёт на себя nginx / Apache (включая Range).
+  Имена старых документов бывают не ASCII (documents/2025/11/Лекция_1.pdf):
+  Django закодировал бы такой заголовок как =?utf-8?b?…?=, а его не понимает
+  ни nginx, ни mod_xsendfile. Поэтому URI для X-Accel-Redirect кодируется
+  процентами (nginx раскодирует), а путь не ASCII для X-Sendfile не
+  передаётся — такой файл отдаём сами через FileResponse.
+"""
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+from .models import Enrollment
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def options():
+    defaults = {'MODE': 'direct', 'X_ACCEL_PREFIX': '/protected-media/', 'MAX_AGE': 3600}
+    defaults.update(getattr(settings, 'DOCUMENT_DOWNLOADS', {}))
+    return defaults
+
+
+def can_access(user, document):
+    """
+    Общие документы (без курса) — любому вошедшему пользователю. Документы
+    курса — персоналу, загрузившему, преподавателю курса и записанным на курс
+    студентам (студент сопоставляется с пользователем по email).
+    """
+    if not user.is_authenticated:
+        return False
+    if user.is_staff or document.course_id is None or document.uploaded_by_id == user.pk:
+        return True
+    course = document.course
+    if course.teacher_id and course.teacher.user_id == user.pk:
+        return True
+    return bool(user.email) and Enrollment.objects.filter(
+        course_id=document.course_id, student__email__iexact=user.email,
+    ).exists()
+
+
+def _etag(document, stat):
+    if document.content_hash:
+        return f'"{document.content_hash}"'
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header, size):
+    """(start, end) включительно; None — отдать файл целиком; ValueError — диапазон вне файла."""
+    match = RANGE.match(header.strip()) if header else None
+    if not match:
+        return None  # нет заголовка, несколько диапазонов или чужие единицы
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise ValueError
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    value = request.headers.get('If-Range')
+    if not value:
+        return True
+    if value.startswith('"') or value.startswith('W/'):
+        return value == etag  # If-Range допускает только сильное сравнение
+    date = parse_http_date_safe(value)
+    return date is not None and int(last_modified) <= date
+
+
+class _FileRange:
+    """Окно [start, start+length) файла: read() не выходит за границу, fileno() — для sendfile."""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def _common_headers(response, document, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    patch_cache_control(response, private=True, max_age=options()['MAX_AGE'])
+    return response
+
+
+def serve(request, document):
+    path = document.file.path
+    stat = os.stat(path)
+    etag = _etag(document, stat)
+    last_modified = int(stat.st_mtime)
+    filename = document.original_name or os.path.basename(document.file.name)
+    content_type = document.mime_type or 'application/octet-stream'
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        return _common_headers(conditional, document, etag, last_modified)
+
+    mode = options()['MODE']
+    if mode == 'x-sendfile' and not path.isascii():
+        mode = 'direct'
+    if mode in ('x-accel', 'x-sendfile'):
+        response = HttpResponse(content_type=content_type)
+        if mode == 'x-accel':
+            response['X-Accel-Redirect'] = quote(options()['X_ACCEL_PREFIX'].rstrip('/') + '/' + document.file.name)
+        else:
+            response['X-Sendfile'] = path
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+        return _common_headers(response, document, etag, last_modified)
+
+    size = stat.st_size
+    byte_range = None
+    if _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return _common_headers(response, document, etag, last_modified)
+
+    source = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(source, as_attachment=True, filename=filename, content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(_FileRange(source, start, length), status=206,
+                                as_attachment=True, filename=filename, content_type=content_type)
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return _common_headers(response, document, etag, last_modified)
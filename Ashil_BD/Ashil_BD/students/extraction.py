@@ -0,0 +1,162 @@
+"""
+Фоновое извлечение текста документов для полнотекстового поиска.
+
+После сохранения Document (on_commit) файл уходит в пул процессов
+(text_extract.extract), результат по мере готовности пишется в
+DocumentText и сразу попадает в индекс поиска (колонка content таблицы
+FTS документов). Текст привязан к хэшу файла: неизменённый документ не
+извлекается повторно, а одинаковые файлы (общий blob, см. storage.py)
+извлекаются один раз — текст копируется.
+
+Метрики процесса — metrics(): документы, байты, символы и время работы
+воркеров с производными скоростями. Переизвлечь всё параллельно:
+python manage.py extract_document_text --all.
+"""
+import logging
+import threading
+import time
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import search, text_extract
+from .models import Document, DocumentText
+from .pools import LazyProcessPool
+
+logger = logging.getLogger(__name__)
+
+
+def _options():
+    return getattr(settings, 'DOCUMENT_TEXT', {})
+
+
+_dependencies_checked = False
+
+
+def check_dependencies():
+    """
+    Один раз на процесс предупреждает в лог о форматах без нужного пакета
+    (PDF без pypdf) — иначе это видно только по строкам «не поддерживается».
+    """
+    global _dependencies_checked
+    if _dependencies_checked:
+        return
+    _dependencies_checked = True
+    for ext, package in text_extract.missing_dependencies():
+        logger.warning('Текст из .%s не извлекается: не установлен пакет %s (см. requirements.txt)', ext, package)
+
+
+pool = LazyProcessPool(lambda: _options().get('WORKERS', 2), on_start=check_dependencies)
+
+_stats_lock = threading.Lock()
+_stats = {'documents': 0, 'reused': 0, 'unsupported': 0, 'failed': 0, 'bytes': 0, 'chars': 0, 'worker_seconds': 0.0}
+_started = time.monotonic()
+
+
+def record(status, size=0, chars=0, seconds=0.0):
+    with _stats_lock:
+        key = {'done': 'documents', 'reused': 'reused'}.get(status, status)
+        _stats[key] += 1
+        _stats['bytes'] += size
+        _stats['chars'] += chars
+        _stats['worker_seconds'] += seconds
+
+
+def metrics():
+    with _stats_lock:
+        result = dict(_stats)
+    busy = result['worker_seconds']
+    result['uptime_seconds'] = round(time.monotonic() - _started, 1)
+    result['worker_seconds'] = round(busy, 3)
+    # скорость на секунду работы воркера (без простоя пула)
+    result['documents_per_worker_second'] = round(result['documents'] / busy, 2) if busy else None
+    result['mb_per_worker_second'] = round(result['bytes'] / busy / 1024 / 1024, 2) if busy else None
+    return result
+
+
+def save_result(document_id, content_hash, status, text='', error='', seconds=0.0):
+    """Пишет результат, если файл документа не сменился за время извлечения, и обновляет индекс."""
+    if not Document.objects.filter(pk=document_id, content_hash=content_hash).exists():
+        return False
+    # сразу запись (upsert), без предварительного чтения в транзакции: на SQLite
+    # чтение с последующей записью из фонового потока ловит «database is locked»
+    with transaction.atomic():
+        DocumentText.objects.bulk_create([DocumentText(
+            document_id=document_id,
+            status=status,
+            content_hash=content_hash,
+            text=text,
+            char_count=len(text),
+            error=error[:255],
+            duration_ms=int(seconds * 1000),
+        )], update_conflicts=True, unique_fields=['document'],
+            update_fields=['status', 'content_hash', 'text', 'char_count', 'error', 'duration_ms', 'extracted_at'])
+        search.index_objects(Document, [document_id])
+    return True
+
+
+def _reuse(document):
+    """Текст того же файла уже извлечён для другого документа — копируем."""
+    donor = (DocumentText.objects.filter(content_hash=document.content_hash)
+             .exclude(document_id=document.pk).exclude(status='failed')
+             .values_list('status', 'text', 'error').first())
+    if donor is None:
+        return False
+    status, text, error = donor
+    if save_result(document.pk, document.content_hash, status, text, error):
+        record('reused', chars=len(text))
+    return True
+
+
+def needs_extraction(document):
+    current = DocumentText.objects.filter(document_id=document.pk).values_list('content_hash', flat=True).first()
+    return bool(document.file) and current != document.content_hash
+
+
+def store_outcome(document_id, content_hash, size, outcome):
+    """outcome — (текст, секунд) или исключение из text_extract.extract."""
+    if isinstance(outcome, text_extract.Unsupported):
+        status, text, error, seconds = 'unsupported', '', str(outcome), 0.0
+    elif isinstance(outcome, Exception):
+        status, text, error, seconds = 'failed', '', f'{type(outcome).__name__}: {outcome}', 0.0
+        logger.warning('Не удалось извлечь текст документа %s: %s', document_id, error)
+    else:
+        status, error = 'done', ''
+        text, seconds = outcome
+    if save_result(document_id, content_hash, status, text, error, seconds):
+        record(status, size, len(text), seconds)
+
+
+def _finished(document_id, content_hash, size, future):
+    # вызывается в служебном потоке пула
+    try:
+        try:
+            outcome = future.result()
+        except Exception as exc:
+            outcome = exc
+        store_outcome(document_id, content_hash, size, outcome)
+    except Exception:
+        logger.exception('Не удалось сохранить текст документа %s', document_id)
+    finally:
+        close_old_connections()
+
+
+def schedule(document_id):
+    """Ставит извлечение в пул (или выполняет сразу при DOCUMENT_TEXT['ASYNC'] = False)."""
+    document = Document.objects.filter(pk=document_id).first()
+    if document is None or not needs_extraction(document) or _reuse(document):
+        return None
+    path = document.file.path
+    size = document.file_size or 0
+    if not _options().get('ASYNC', True):
+        check_dependencies()
+        try:
+            outcome = text_extract.extract(path, document.file_ext)
+        except Exception as exc:
+            outcome = exc
+        store_outcome(document.pk, document.content_hash, size, outcome)
+        return None
+    future = pool.submit(text_extract.extract, path, document.file_ext)
+    future.add_done_callback(partial(_finished, document.pk, document.content_hash, size))
+    return future
@@ -0,0 +1,64 @@
+"""
+Журнал курса: матрица студенты × задания.
+
+Страница строится постоянным числом запросов, сколько бы студентов ни было
+записано: задания курса, число записей (пагинатор), страница записей со
+студентом и итоговой оценкой (JOIN), оценки за задания только для студентов
+страницы и средние по заданиям. Ячейки собираются в Python по словарю
+(студент, задание) → балл.
+"""
+from django.core.paginator import Paginator
+from django.db.models import Avg
+
+from .models import AssignmentScore, score_color
+
+PAGE_SIZE = 50
+
+
+def _percent(score, max_score):
+    return score * 100 / max_score if max_score else score
+
+
+def matrix(course, page_number=1, page_size=PAGE_SIZE):
+    assignments = list(course.assignments.order_by('due_date', 'id').values('id', 'title', 'due_date', 'max_score'))
+    enrollments = (course.enrollments.select_related('student', 'grade')
+                   .order_by('student__name', 'id'))
+    page = Paginator(enrollments, page_size).get_page(page_number)
+
+    assignment_ids = [a['id'] for a in assignments]
+    scores = {}
+    if assignment_ids and page.object_list:
+        scores = {
+            (student_id, assignment_id): score
+            for student_id, assignment_id, score in AssignmentScore.objects.filter(
+                assignment_id__in=assignment_ids, student_id__in=[e.student_id for e in page.object_list],
+            ).values_list('student_id', 'assignment_id', 'score')
+        }
+
+    averages = {}
+    if assignment_ids:
+        averages = dict(AssignmentScore.objects.filter(assignment__course=course)
+                        .values('assignment_id').annotate(avg=Avg('score')).values_list('assignment_id', 'avg'))
+
+    rows = []
+    for enrollment in page.object_list:
+        cells = []
+        for assignment in assignments:
+            score = scores.get((enrollment.student_id, assignment['id']))
+            cells.append({
+                'score': score,
+                'color': score_color(None if score is None else _percent(score, assignment['max_score'])),
+            })
+        rows.append({
+            'enrollment': enrollment,
+            'student': enrollment.student,
+            # select_related: отсутствующая оценка даёт исключение без запроса
+            'grade': getattr(enrollment, 'grade', None),
+            'cells': cells,
+        })
+
+    for assignment in assignments:
+        average = averages.get(assignment['id'])
+        assignment['average'] = average
+        assignment['color'] = score_color(None if average is None else _percent(average, assignment['max_score']))
+    return {'assignments': assignments, 'rows': rows, 'page': page}
@@ -0,0 +1,208 @@
+"""
+Календарные ленты (.ics) расписания студента, преподавателя и курса.
+
+Лента — еженедельные повторяющиеся занятия из Schedule (RRULE) плюс сроки
+сдачи заданий (Assignment.due_date). Календарные клиенты не умеют входить на
+сайт, поэтому адрес ленты содержит подписанный токен (feed_url) — знающий
+ссылку видит ленту, подделать её для другого студента нельзя.
+
+Клиенты опрашивают ленты часто, поэтому готовый текст и его ETag лежат в
+версионированном кэше страниц (cache.py) и пересобираются только после
+записи в таблицы, из которых лента строится. Повторный запрос — это
+несколько обращений к кэшу без SQL, а с If-None-Match — ответ 304 без тела.
+
+Время занятий (TimeField) — «плавающее» местное время без часового пояса,
+сроки заданий — в UTC.
+"""
+import hashlib
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from .cache import cached_context
+from .models import Assignment, Course, Enrollment, Schedule, Student, Teacher
+from .timetable import DAY_INDEX
+
+SALT = 'students.ical'
+RRULE_DAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+FEED_MODELS = {
+    'student': (Schedule, Course, Teacher, Assignment, Enrollment, Student),
+    'teacher': (Schedule, Course, Teacher, Assignment),
+    'course': (Schedule, Course, Teacher, Assignment),
+}
+
+
+def options():
+    defaults = {'MAX_AGE': 900, 'TERM_START': None, 'TERM_END': None, 'DOMAIN': 'ashil-bd'}
+    defaults.update(getattr(settings, 'CALENDAR_FEEDS', {}))
+    return defaults
+
+
+def feed_token(kind, pk):
+    return signing.Signer(salt=SALT).sign(f'{kind}-{pk}')
+
+
+def parse_token(token):
+    """(kind, pk) или None, если подпись не сходится."""
+    try:
+        kind, _, pk = signing.Signer(salt=SALT).unsign(token).partition('-')
+    except signing.BadSignature:
+        return None
+    if kind not in FEED_MODELS or not pk.isdigit():
+        return None
+    return kind, int(pk)
+
+
+def feed_url(kind, pk):
+    return reverse('calendar_feed', args=[feed_token(kind, pk)])
+
+
+def _as_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def term_start():
+    start = _as_date(options()['TERM_START'])
+    if start is None:
+        # по умолчанию — 1 сентября текущего учебного года
+        today = timezone.localdate()
+        start = date(today.year if today.month >= 9 else today.year - 1, 9, 1)
+    return start
+
+
+def escape(text):
+    return (str(text).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold(line):
+    """Строки длиннее 75 октетов переносятся (RFC 5545, 3.1), не разрывая символы UTF-8."""
+    parts = []
+    current = ''
+    size = 0
+    for char in line:
+        width = len(char.encode('utf-8'))
+        if size + width > 75:
+            parts.append(current)
+            current, size = ' ', 1
+        current += char
+        size += width
+    parts.append(current)
+    return '\r\n'.join(parts)
+
+
+def _utc(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _lesson(row, first_day, stamp, until, domain):
+    day = first_day + timedelta(days=(DAY_INDEX[row.day_of_week] - first_day.weekday()) % 7)
+    rule = f'FREQ=WEEKLY;BYDAY={RRULE_DAYS[DAY_INDEX[row.day_of_week]]}'
+    if until is not None:
+        rule += f';UNTIL={until:%Y%m%d}T235959'
+    teacher = row.course.teacher
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:schedule-{row.pk}@{domain}',
+        f'DTSTAMP:{stamp}',
+        f'DTSTART:{datetime.combine(day, row.start_time):%Y%m%dT%H%M%S}',
+        f'DTEND:{datetime.combine(day, row.end_time):%Y%m%dT%H%M%S}',
+        f'RRULE:{rule}',
+        f'SUMMARY:{escape(row.course.title)}',
+    ]
+    if row.classroom:
+        lines.append(f'LOCATION:{escape(row.classroom)}')
+    if teacher is not None:
+        lines.append(f'DESCRIPTION:{escape("Преподаватель: " + teacher.name)}')
+    lines.append('END:VEVENT')
+    return lines
+
+
+def _deadline(assignment, stamp, domain):
+    due = _utc(assignment.due_date)
+    return [
+        'BEGIN:VEVENT',
+        f'UID:assignment-{assignment.pk}@{domain}',
+        f'DTSTAMP:{stamp}',
+        f'DTSTART:{due}',
+        f'DTEND:{due}',
+        f'SUMMARY:{escape(f"Срок сдачи: {assignment.title} ({assignment.course.title})")}',
+        f'DESCRIPTION:{escape(assignment.description)}',
+        'END:VEVENT',
+    ]
+
+
+def _subject(kind, pk):
+    """(название календаря, id курсов) или None, если объекта нет."""
+    if kind == 'student':
+        student = Student.objects.filter(pk=pk).values_list('name', flat=True).first()
+        if student is None:
+            return None
+        return f'Расписание: {student}', list(Enrollment.objects.filter(student_id=pk).values_list('course_id', flat=True))
+    if kind == 'teacher':
+        teacher = Teacher.objects.filter(pk=pk).values_list('name', flat=True).first()
+        if teacher is None:
+            return None
+        return f'Расписание: {teacher}', list(Course.objects.filter(teacher_id=pk).values_list('pk', flat=True))
+    course = Course.objects.filter(pk=pk).values_list('title', flat=True).first()
+    if course is None:
+        return None
+    return f'Курс: {course}', [pk]
+
+
+def build_feed(kind, pk):
+    subject = _subject(kind, pk)
+    if subject is None:
+        return None
+    name, course_ids = subject
+    config = options()
+    domain = config['DOMAIN']
+    stamp = _utc(timezone.now())
+    first_day = term_start()
+    until = _as_date(config['TERM_END'])
+
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Ashil_BD//Schedule//RU',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape(name)}',
+        f'REFRESH-INTERVAL;VALUE=DURATION:PT{config["MAX_AGE"] // 60 or 1}M',
+        f'X-PUBLISHED-TTL:PT{config["MAX_AGE"] // 60 or 1}M',
+    ]
+    lessons = (Schedule.objects.filter(course_id__in=course_ids, is_active=True)
+               .select_related('course__teacher').order_by('pk'))
+    for row in lessons:
+        lines.extend(_lesson(row, first_day, stamp, until, domain))
+    deadlines = Assignment.objects.filter(course_id__in=course_ids).select_related('course').order_by('due_date', 'pk')
+    for assignment in deadlines:
+        lines.extend(_deadline(assignment, stamp, domain))
+    lines.append('END:VCALENDAR')
+
+    body = ('\r\n'.join(fold(line) for line in lines) + '\r\n').encode('utf-8')
+    # ETag — по данным без DTSTAMP: пересборка после истечения кэша не должна
+    # менять его, пока не изменились сами занятия и задания
+    data = '\n'.join(line for line in lines if not line.startswith('DTSTAMP:')).encode('utf-8')
+    return {'body': body, 'etag': f'"{hashlib.sha256(data).hexdigest()[:32]}"'}
+
+
+def feed(kind, pk):
+    """{'body', 'etag'} из кэша или заново собранная лента; None — объекта нет."""
+    return cached_context('ical', FEED_MODELS[kind], lambda: build_feed(kind, pk), kind, pk)
+
+
+def serve(request, feed):
+    """Ответ с лентой или 304, если у клиента та же версия (If-None-Match)."""
+    response = get_conditional_response(request, etag=feed['etag'])
+    if response is None:
+        response = HttpResponse(feed['body'], content_type='text/calendar; charset=utf-8')
+        response['Content-Disposition'] = 'inline; filename="schedule.ics"'
+    response['ETag'] = feed['etag']
+    patch_cache_control(response, private=True, max_age=options()['MAX_AGE'])
+    return response
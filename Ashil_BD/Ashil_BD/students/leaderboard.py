@@ -0,0 +1,212 @@
+"""
+Рейтинг студентов по среднему баллу (StudentStats.score_avg).
+
+Средний балл округляется до сотых в ключ rank_key (0..10000, хранится в
+StudentStats, индекс по убыванию). Над ключами — дерево Фенвика, узлы
+которого лежат в таблице LeaderboardNode: узел i хранит число студентов в
+своём диапазоне ключей, позиция ключа — MAX_KEY + 1 - key (лучшие впереди).
+
+* место студента = 1 + число студентов со строго большим ключом — сумма
+  не больше 14 узлов, один запрос; равные баллы делят место (1, 2, 2, 4);
+* страница рейтинга — спуск по дереву (по узлу на уровень, один
+  рекурсивный запрос) находит ключ, на котором начинается страница,
+  дальше чтение по индексу rank_key;
+* топ-N — просто начало индекса.
+
+Дерево всегда соответствует колонке rank_key: sync() переводит score_avg
+в rank_key для данных студентов и поправляет те же ≤ 28 узлов одним
+UPDATE. Её вызывает stats.py после каждого изменения score_avg, так что
+рейтинг обновляется вместе со статистикой, в той же транзакции.
+"""
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Cast, Greatest, Least
+
+from .models import LeaderboardNode, StudentStats
+
+MAX_KEY = 10000  # 100.00 балла
+SIZE = MAX_KEY + 1
+REMOVED = -1  # строка вот-вот удалится и уже вычтена из дерева
+
+
+def rank_key(score_avg):
+    """Средний балл, округлённый до сотых, целым 0..MAX_KEY; то же считает rank_key_sql()."""
+    return None if score_avg is None else min(MAX_KEY, max(0, int(score_avg * 100 + 0.5)))
+
+
+def rank_key_sql():
+    return Least(Greatest(Cast(F('score_avg') * 100 + 0.5, IntegerField()), Value(0)), Value(MAX_KEY))
+
+
+def _position(key):
+    return SIZE - key
+
+
+def _update_path(position):
+    while position <= SIZE:
+        yield position
+        position += position & -position
+
+
+def _query_path(position):
+    while position > 0:
+        yield position
+        position -= position & -position
+
+
+def _add(deltas):
+    """deltas: {key: +-n}. Все затронутые узлы меняются одним UPDATE."""
+    nodes = {}
+    for key, delta in deltas.items():
+        if delta:
+            for position in _update_path(_position(key)):
+                nodes[position] = nodes.get(position, 0) + delta
+    nodes = {pos: delta for pos, delta in nodes.items() if delta}
+    if not nodes:
+        return
+    updated = LeaderboardNode.objects.filter(pk__in=list(nodes)).update(count=F('count') + Case(
+        *[When(pk=pos, then=delta) for pos, delta in nodes.items()], output_field=IntegerField(),
+    ))
+    if updated < len(nodes):
+        # узлов нет (таблицу очистили, например flush) — rank_key уже верны, собираем дерево по ним
+        rebuild()
+
+
+def count_above(key):
+    """Сколько студентов со строго большим ключом."""
+    positions = list(_query_path(_position(key) - 1))
+    if not positions:
+        return 0
+    return LeaderboardNode.objects.filter(pk__in=positions).aggregate(total=Sum('count'))['total'] or 0
+
+
+def total():
+    return count_above(-1)
+
+
+def sync(student_ids):
+    """Переносит изменения score_avg данных студентов в rank_key и дерево."""
+    deltas = {}
+    rows = (StudentStats.objects.filter(student_id__in=list(student_ids)).exclude(rank_key=REMOVED)
+            .values_list('student_id', 'score_avg', 'rank_key'))
+    for student_id, score_avg, old in rows:
+        new = rank_key(score_avg)
+        if new == old:
+            continue
+        # условный UPDATE: параллельный sync того же студента не посчитает переход дважды
+        if not StudentStats.objects.filter(student_id=student_id, rank_key=old).update(rank_key=new):
+            continue
+        if old is not None:
+            deltas[old] = deltas.get(old, 0) - 1
+        if new is not None:
+            deltas[new] = deltas.get(new, 0) + 1
+    _add(deltas)
+
+
+def withdraw(student_id):
+    """
+    Убирает студента из рейтинга перед удалением его строки StudentStats.
+    Ключ помечается REMOVED, чтобы sync() при каскадном удалении оценок
+    того же студента не вернул его в дерево.
+    """
+    key = StudentStats.objects.filter(student_id=student_id).values_list('rank_key', flat=True).first()
+    if key is None or key == REMOVED:
+        return
+    if StudentStats.objects.filter(student_id=student_id, rank_key=key).update(rank_key=REMOVED):
+        _add({key: -1})
+
+
+def rebuild():
+    """Пересчёт rank_key и дерева с нуля по всей таблице (миграция 0020 делает то же своей копией)."""
+    with transaction.atomic():
+        live = StudentStats.objects.exclude(rank_key=REMOVED)
+        live.filter(score_avg__isnull=True, rank_key__isnull=False).update(rank_key=None)
+        live.filter(score_avg__isnull=False).update(rank_key=rank_key_sql())
+        tree = [0] * (SIZE + 1)
+        histogram = (StudentStats.objects.filter(rank_key__gte=0).order_by()
+                     .values_list('rank_key').annotate(n=Count('pk')))
+        for key, count in histogram:
+            tree[_position(key)] += count
+        for position in range(1, SIZE + 1):  # построение за O(N): каждый узел добавляется к родителю
+            parent = position + (position & -position)
+            if parent <= SIZE:
+                tree[parent] += tree[position]
+        LeaderboardNode.objects.all().delete()
+        LeaderboardNode.objects.bulk_create(
+            [LeaderboardNode(position=p, count=tree[p]) for p in range(1, SIZE + 1)], batch_size=2000,
+        )
+
+
+def _key_at(index):
+    """
+    Ключ студента, стоящего в рейтинге index-м (с 0), или None, если студентов меньше.
+    Спуск по дереву: на каждом уровне шаг вперёд, если в узле меньше оставшихся.
+    Какой узел читать дальше, зависит от прочитанного, поэтому спуск идёт в базе
+    одним рекурсивным запросом (≤ 14 поисков по первичному ключу), а не запросом на уровень.
+    Узла за границей дерева нет — COALESCE(..., remaining) означает «не шагать».
+    """
+    qn = connection.ops.quote_name
+    table, count = qn(LeaderboardNode._meta.db_table), qn('count')
+    node = f'COALESCE((SELECT n.{count} FROM {table} n WHERE n.position = d.position + d.step), d.remaining)'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH RECURSIVE descent(position, remaining, step) AS ('
+            f'SELECT 0, %s, %s '
+            f'UNION ALL '
+            f'SELECT CASE WHEN {node} < d.remaining THEN d.position + d.step ELSE d.position END, '
+            f'CASE WHEN {node} < d.remaining THEN d.remaining - {node} ELSE d.remaining END, '
+            f'd.step / 2 '
+            f'FROM descent d WHERE d.step > 0'
+            f') SELECT position FROM descent WHERE step = 0',
+            [index + 1, 1 << (SIZE.bit_length() - 1)],
+        )
+        position = cursor.fetchone()[0]
+    return None if position >= SIZE else SIZE - (position + 1)
+
+
+def _ordered():
+    return (StudentStats.objects.filter(rank_key__gte=0).select_related('student')
+            .order_by('-rank_key', 'student_id'))
+
+
+def page(offset=0, limit=50):
+    """
+    Строки рейтинга с offset (с 0) по offset + limit:
+    [{'rank', 'student_id', 'name', 'score_avg'}, ...].
+    """
+    if offset == 0:
+        key, above = None, 0
+        rows = list(_ordered()[:limit])
+    else:
+        key = _key_at(offset)
+        if key is None:
+            return []
+        above = count_above(key)
+        # начало страницы — внутри группы ключа key, дальше — следующие ключи по индексу
+        rows = list(_ordered().filter(rank_key=key)[offset - above:offset - above + limit])
+        if len(rows) < limit:
+            rows += _ordered().filter(rank_key__lt=key)[:limit - len(rows)]
+    result = []
+    for index, row in enumerate(rows, start=offset):
+        if row.rank_key != key:
+            # первый студент новой группы: перед ним ровно index студентов с большим ключом
+            key, above = row.rank_key, index
+        result.append({
+            'rank': above + 1,
+            'student_id': row.student_id,
+            'name': row.student.name,
+            'score_avg': row.score_avg,
+        })
+    return result
+
+
+def top(limit=5):
+    return page(0, limit)
+
+
+def rank(student_id):
+    """{'rank', 'total', 'score_avg'} или None, если у студента ещё нет оценок."""
+    row = StudentStats.objects.filter(student_id=student_id).values_list('rank_key', 'score_avg').first()
+    if row is None or row[0] is None or row[0] == REMOVED:
+        return None
+    return {'rank': count_above(row[0]) + 1, 'total': total(), 'score_avg': row[1]}
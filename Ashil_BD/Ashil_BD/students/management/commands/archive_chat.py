@@ -0,0 +1,42 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from students import chat_archive
+from students.models import ChatMessage
+
+
+class Command(BaseCommand):
+    help = 'Переносит старые сообщения чата из таблицы в сжатые архивные сегменты'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'CHAT_RETENTION_DAYS', 30),
+                            help='архивировать сообщения старше N дней')
+        parser.add_argument('--room', action='append', dest='rooms', help='только эта комната (можно несколько)')
+        parser.add_argument('--segment-size', type=int, default=None, help='сообщений в одном сегменте')
+        parser.add_argument('--dry-run', action='store_true', help='только показать, сколько будет перенесено')
+
+    def handle(self, *args, **options):
+        older_than = timedelta(days=options['days'])
+        if options['dry_run']:
+            cutoff = timezone.now() - older_than
+            qs = ChatMessage.objects.filter(timestamp__lt=cutoff)
+            if options['rooms']:
+                qs = qs.filter(room__in=options['rooms'])
+            for row in qs.values('room').annotate(n=Count('id')).order_by('room'):
+                self.stdout.write(f"{row['room']}: {row['n']}")
+            return
+
+        started = time.monotonic()
+        result = chat_archive.archive_old_messages(older_than, options['rooms'], options['segment_size'])
+        total = sum(r[0] for r in result.values())
+        for room, (messages, segments, size) in sorted(result.items()):
+            self.stdout.write(f'{room}: {messages} сообщений → {segments} сегментов, {size / 1024:.1f} KB')
+        self.stdout.write(self.style.SUCCESS(
+            f'Архивировано {total} сообщений за {time.monotonic() - started:.2f} с, '
+            f'в таблице осталось {ChatMessage.objects.count()}'
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from students import conflicts, timetable
+
+
+class Command(BaseCommand):
+    help = 'Ищет накладки в расписании: одна аудитория или один преподаватель в одно время'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fail', action='store_true',
+                            help='завершиться с ошибкой, если накладки найдены (для CI и cron)')
+
+    def handle(self, *args, **options):
+        entries = timetable.load_entries()
+        found = conflicts.audit(entries)
+        days = dict(timetable.DAYS)
+        for conflict in found:
+            first, second = conflict['first'], conflict['second']
+            self.stdout.write(
+                f'{days.get(conflict["day"], conflict["day"])}, {conflicts.KINDS[conflict["kind"]]} {conflict["key"]}: '
+                f'{first["course"]} {first["start"]:%H:%M}-{first["end"]:%H:%M} (#{first["id"]}) ↔ '
+                f'{second["course"]} {second["start"]:%H:%M}-{second["end"]:%H:%M} (#{second["id"]})'
+            )
+        by_kind = {kind: sum(1 for c in found if c['kind'] == kind) for kind in conflicts.KINDS}
+        summary = (f'Занятий: {len(entries)}, накладок: {len(found)} '
+                   f'(аудитории: {by_kind["classroom"]}, преподаватели: {by_kind["teacher"]})')
+        if found and options['fail']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.WARNING(summary) if found else self.style.SUCCESS(summary))
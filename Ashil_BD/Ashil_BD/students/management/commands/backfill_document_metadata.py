@@ -0,0 +1,50 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from students import cache as page_cache
+from students import documents
+from students.models import Document
+
+FIELDS = ['file_size', 'file_ext', 'mime_type', 'content_hash', 'original_name']
+
+
+class Command(BaseCommand):
+    help = 'Заполняет размер, расширение, MIME-тип и хэш для документов, загруженных до появления этих колонок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='пересчитать метаданные всех документов')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        queryset = Document.objects.exclude(file='')
+        if not options['all']:
+            queryset = queryset.filter(file_size__isnull=True)
+        started = time.monotonic()
+        batch, updated, missing = [], 0, 0
+
+        for document in queryset.only('id', 'file', 'original_name').iterator(chunk_size=options['batch_size']):
+            try:
+                metadata = documents.file_metadata(document.file)
+            except OSError as exc:
+                missing += 1
+                self.stderr.write(f'Документ #{document.pk} ({document.file.name}): {exc}')
+                continue
+            for name, value in metadata.items():
+                setattr(document, name, value)
+            if not document.original_name:
+                document.original_name = os.path.basename(document.file.name)[:255]
+            batch.append(document)
+            if len(batch) >= options['batch_size']:
+                updated += Document.objects.bulk_update(batch, FIELDS)
+                batch.clear()
+        if batch:
+            updated += Document.objects.bulk_update(batch, FIELDS)
+        if updated:
+            page_cache.bump_version(Document)  # bulk_update не шлёт сигналы
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено документов: {updated}, файлов не найдено: {missing} '
+            f'за {time.monotonic() - started:.2f} с'
+        ))
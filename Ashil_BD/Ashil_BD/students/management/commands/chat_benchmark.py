@@ -0,0 +1,96 @@
+import asyncio
+import json
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+
+from students import chat_buffer, realtime
+from students.models import ChatMessage
+
+
+class FakeSocket:
+    """Клиент WebSocket в памяти: ASGI receive/send без сети."""
+
+    def __init__(self, expected):
+        self.inbox = asyncio.Queue()
+        self.expected = expected
+        self.received = 0
+        self.accepted = asyncio.Event()
+        self.finished = asyncio.Event()
+        if not expected:
+            self.finished.set()
+
+    async def receive(self):
+        return await self.inbox.get()
+
+    async def send(self, event):
+        if event['type'] == 'websocket.accept':
+            self.accepted.set()
+        elif event['type'] == 'websocket.send':
+            self.received += 1
+            if self.received >= self.expected:
+                self.finished.set()
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест живого чата: N подключений в одной комнате, M сообщений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=200)
+        parser.add_argument('--messages', type=int, default=100)
+        parser.add_argument('--broker-only', action='store_true',
+                            help='без записи в БД: меряем только рассылку по подписчикам')
+
+    def handle(self, *args, **options):
+        room = f'bench-{uuid.uuid4().hex[:8]}'
+        try:
+            result = asyncio.run(self.run(room, options['connections'], options['messages'], options['broker_only']))
+        finally:
+            ChatMessage.objects.filter(room=room).delete()
+
+        connections, messages, send_time, total_time = result
+        deliveries = connections * messages
+        self.stdout.write(f'Подключений в комнате:      {connections}')
+        self.stdout.write(f'Сообщений отправлено:       {messages}')
+        # отправитель получает своё сообщение последним из рассылки, поэтому
+        # это скорость приёма с учётом доставки всем подписчикам
+        self.stdout.write(f'Приём сообщений:            {messages / send_time:.0f} msg/s')
+        self.stdout.write(f'Доставка (все получатели):  {deliveries / total_time:.0f} deliveries/s')
+        self.stdout.write(f'Время до последней доставки: {total_time:.3f} с')
+
+    async def run(self, room, connections, messages, broker_only):
+        if broker_only:
+            counter = iter(range(1, messages + 1))
+
+            async def save(room_name, text):
+                payload = json.dumps({'id': next(counter), 'room': room_name, 'message': text})
+                realtime.broker.publish(room_name, payload)
+        else:
+            # тот же путь, что и у настоящих клиентов (с буфером, если он включён)
+            save = sync_to_async(chat_buffer.submit_message)
+
+        sockets = [FakeSocket(messages) for _ in range(connections)]
+        sender = FakeSocket(messages)
+        tasks = []
+        for socket in sockets + [sender]:
+            socket.inbox.put_nowait({'type': 'websocket.connect'})
+            tasks.append(asyncio.ensure_future(
+                realtime.chat_socket({'type': 'websocket'}, socket.receive, socket.send, room, save=save)
+            ))
+        await asyncio.gather(*(socket.accepted.wait() for socket in sockets + [sender]))
+        await asyncio.sleep(0)
+
+        started = time.perf_counter()
+        for i in range(messages):
+            sender.inbox.put_nowait({'type': 'websocket.receive', 'text': f'{{"message": "bench {i}"}}'})
+        await sender.finished.wait()
+        send_time = time.perf_counter() - started
+        await asyncio.gather(*(socket.finished.wait() for socket in sockets))
+        total_time = time.perf_counter() - started
+
+        for socket in sockets + [sender]:
+            socket.inbox.put_nowait({'type': 'websocket.disconnect'})
+        await asyncio.gather(*tasks)
+        return connections, messages, send_time, total_time
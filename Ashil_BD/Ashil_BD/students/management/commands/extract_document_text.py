@@ -0,0 +1,65 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from students import extraction, text_extract
+from students.models import Document
+
+
+class Command(BaseCommand):
+    help = 'Извлекает текст документов для поиска параллельно в нескольких процессах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='переизвлечь текст всех документов')
+        parser.add_argument('--workers', type=int, default=None, help='число процессов (по умолчанию — все ядра)')
+        parser.add_argument('--progress-every', type=int, default=100)
+
+    def handle(self, *args, **options):
+        documents = Document.objects.exclude(file='')
+        if not options['all']:
+            documents = documents.filter(Q(text__isnull=True) | ~Q(text__content_hash=F('content_hash')))
+        started = time.monotonic()
+        done = 0
+        total_bytes = 0
+        next_report = options['progress_every']
+
+        # одинаковые файлы (общий blob) извлекаем один раз
+        groups = {}
+        for pk, name, ext, content_hash, size in documents.values_list(
+                'pk', 'file', 'file_ext', 'content_hash', 'file_size').iterator(chunk_size=1000):
+            key = content_hash or name
+            groups.setdefault(key, {'path': Document._meta.get_field('file').storage.path(name), 'ext': ext,
+                                    'size': size or 0, 'documents': []})['documents'].append((pk, content_hash))
+
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {pool.submit(text_extract.extract, group['path'], group['ext']): group for group in groups.values()}
+            for future in as_completed(futures):
+                group = futures.pop(future)
+                try:
+                    outcome = future.result()
+                except Exception as exc:
+                    outcome = exc
+                # результат пишется сразу, не дожидаясь остальных файлов
+                for pk, content_hash in group['documents']:
+                    extraction.store_outcome(pk, content_hash, group['size'], outcome)
+                    done += 1
+                total_bytes += group['size']
+                if done >= next_report:
+                    self._progress(done, total_bytes, started)
+                    next_report += options['progress_every']
+
+        metrics = extraction.metrics()
+        self._progress(done, total_bytes, started)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: извлечено {metrics["documents"]}, формат не поддерживается {metrics["unsupported"]}, '
+            f'ошибок {metrics["failed"]}; символов {metrics["chars"]}'
+        ))
+
+    def _progress(self, done, total_bytes, started):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            f'{done} документов, {total_bytes / 1024 / 1024:.1f} МБ за {elapsed:.1f} с — '
+            f'{done / elapsed:.1f} док/с, {total_bytes / 1024 / 1024 / elapsed:.2f} МБ/с'
+        )
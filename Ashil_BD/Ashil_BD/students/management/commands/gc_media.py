@@ -0,0 +1,122 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from students import thumbnails, uploads
+from students.models import Document, Student, UploadSession
+
+# каталоги MEDIA_ROOT, файлами в которых владеют модели
+MANAGED_DIRS = ('documents', 'student_photos', thumbnails.THUMBNAIL_DIR)
+
+
+def _scan(root, top, recursive=True):
+    """Файлы под root/top: [(относительный путь, размер, mtime)]. Выполняется в потоке пула."""
+    found = []
+    stack = [os.path.join(root, top)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    found.append((os.path.relpath(entry.path, root).replace(os.sep, '/'), stat.st_size, stat.st_mtime))
+    return found
+
+
+def _remove(path, cutoff):
+    try:
+        stat = os.stat(path)
+        if stat.st_mtime >= cutoff:
+            return 0  # файл переиспользовали после обхода (storage.reuse_blob) — не трогаем
+        os.remove(path)
+        return stat.st_size
+    except FileNotFoundError:
+        return 0
+
+
+def expire_uploads(dry_run=False):
+    """Брошенные загрузки частями: строки UploadSession и их .part-файлы. Возвращает (сессий, байт)."""
+    cutoff = timezone.now() - timedelta(hours=uploads.options()['EXPIRE_HOURS'])
+    # только незавершённые: у завершённых .part-файла нет, а строка связывает загрузку с документом;
+    # условие по status ведёт запрос по индексу (status, updated_at)
+    stale = list(UploadSession.objects.filter(status='active', updated_at__lt=cutoff))
+    reclaimed = 0
+    for session in stale:
+        path = uploads.part_path(session)
+        if os.path.exists(path):
+            reclaimed += os.path.getsize(path)
+        if not dry_run:
+            uploads.discard(session)
+    return len(stale), reclaimed
+
+
+def referenced_files():
+    referenced = set(Document.objects.exclude(file='').values_list('file', flat=True).iterator(chunk_size=5000))
+    photos = Student.objects.exclude(photo='').exclude(photo__isnull=True).values_list('photo', 'thumbnail_source')
+    for photo, thumbnail_source in photos.iterator(chunk_size=5000):
+        referenced.add(photo)
+        if thumbnail_source:
+            for px in set(thumbnails.sizes().values()):
+                referenced.update(thumbnails.thumbnail_name(thumbnail_source, px, fmt) for fmt in thumbnails.FORMATS)
+    return referenced
+
+
+class Command(BaseCommand):
+    help = 'Удаляет из MEDIA_ROOT файлы документов, фото и миниатюр, на которые не ссылается ни одна запись'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='только показать, что было бы удалено')
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='не трогать файлы моложе N часов (загрузки, которые ещё не записаны в БД)')
+        parser.add_argument('--workers', type=int, default=8, help='потоков для обхода и удаления')
+        parser.add_argument('--verbose-files', action='store_true', help='печатать каждый удаляемый файл')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        root = str(settings.MEDIA_ROOT)
+        cutoff = time.time() - options['grace_hours'] * 3600
+
+        # подкаталоги (documents/ab/, ...) обходятся параллельно — обход в основном ждёт диск
+        jobs = []
+        for top in MANAGED_DIRS:
+            path = os.path.join(root, top)
+            if os.path.isdir(path):
+                jobs.append((top, False))
+                jobs.extend((f'{top}/{e.name}', True) for e in os.scandir(path) if e.is_dir(follow_symlinks=False))
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            scanned = [f for part in pool.map(lambda job: _scan(root, *job), jobs) for f in part]
+
+            referenced = referenced_files()
+            orphans = [(name, size) for name, size, mtime in scanned if name not in referenced and mtime < cutoff]
+            young = sum(1 for name, _, mtime in scanned if name not in referenced and mtime >= cutoff)
+
+            if options['verbose_files'] or options['dry_run']:
+                for name, size in orphans:
+                    self.stdout.write(f'  {name} ({size} B)')
+            if options['dry_run']:
+                reclaimed = sum(size for _, size in orphans)
+            else:
+                reclaimed = sum(pool.map(lambda name: _remove(os.path.join(root, name), cutoff),
+                                         (name for name, _ in orphans)))
+
+        sessions, upload_bytes = expire_uploads(options['dry_run'])
+        reclaimed += upload_bytes
+
+        verb = 'Можно освободить' if options['dry_run'] else 'Освобождено'
+        self.stdout.write(self.style.SUCCESS(
+            f'Просмотрено файлов: {len(scanned)}, без ссылок: {len(orphans)} '
+            f'(моложе {options["grace_hours"]:g} ч, пропущено: {young}), брошенных загрузок: {sessions}. '
+            f'{verb}: {reclaimed} байт ({reclaimed / (1024 * 1024):.1f} МБ) за {time.monotonic() - started:.2f} с'
+        ))
@@ -0,0 +1,52 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from students import imaging, thumbnails
+from students.models import Student
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры (JPEG + WebP) для фото студентов, у которых их ещё нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='перестроить и уже готовые миниатюры')
+        parser.add_argument('--workers', type=int, default=None, help='число процессов (по умолчанию — все ядра)')
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='сколько отметок о готовности писать одним заходом')
+
+    def handle(self, *args, **options):
+        students = Student.objects.exclude(photo='').exclude(photo__isnull=True)
+        if not options['all']:
+            students = students.exclude(thumbnail_source=F('photo'))
+        storage = Student._meta.get_field('photo').storage
+        started = time.monotonic()
+        done, failed, written = [], 0, 0
+        ready = 0
+
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {}
+            for pk, photo_name in students.values_list('pk', 'photo').iterator(chunk_size=1000):
+                job = pool.submit(imaging.render_thumbnails, storage.path(photo_name), thumbnails.targets(photo_name, storage))
+                futures[job] = (pk, photo_name)
+            for job in as_completed(futures):
+                pk, photo_name = futures.pop(job)
+                try:
+                    sizes = job.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'Студент #{pk} ({photo_name}): {exc}')
+                    continue
+                written += sum(jpeg + webp for jpeg, webp in sizes.values())
+                done.append((pk, photo_name))
+                if len(done) >= options['batch_size']:
+                    ready += thumbnails.mark_ready(done)
+                    done.clear()
+        ready += thumbnails.mark_ready(done)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {ready} фото, ошибок {failed}, записано {written / 1024:.0f} КБ '
+            f'за {time.monotonic() - started:.2f} с'
+        ))
@@ -0,0 +1,64 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from students import sis_import
+
+
+class Command(BaseCommand):
+    help = 'Потоковый импорт студентов, курсов, записей на курсы и оценок из CSV/NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(sis_import.IMPORTERS))
+        parser.add_argument('path', help="путь к файлу или '-' для stdin")
+        parser.add_argument('--format', choices=['csv', 'ndjson'], default=None,
+                            help='по умолчанию определяется по расширению файла')
+        parser.add_argument('--batch-size', type=int, default=1000, help='строк в одной транзакции')
+        parser.add_argument('--rejects', help='записать отклонённые строки в этот NDJSON-файл')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+
+        rejects = open(options['rejects'], 'w', encoding='utf-8') if options['rejects'] else None
+        shown = 0
+
+        def on_reject(number, errors):
+            nonlocal shown
+            if rejects is not None:
+                rejects.write(json.dumps({'line': number, 'errors': errors}, ensure_ascii=False) + '\n')
+            elif shown < 20:
+                self.stderr.write(f'строка {number}: {errors}')
+            shown += 1
+
+        started = time.monotonic()
+
+        def on_batch(totals):
+            done = sum(totals.values())
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'… {done} строк, {done / elapsed:.0f} строк/с', ending='\r')
+
+        try:
+            totals = sis_import.run_import(
+                options['kind'], sis_import.read_rows(path, fmt),
+                batch_size=options['batch_size'], on_reject=on_reject, on_batch=on_batch,
+            )
+        except FileNotFoundError:
+            raise CommandError(f'файл не найден: {path}')
+        finally:
+            if rejects is not None:
+                rejects.close()
+
+        elapsed = time.monotonic() - started
+        processed = sum(totals.values())
+        self.stdout.write('')
+        self.stdout.write(
+            f"Создано {totals['created']}, обновлено {totals['updated']}, "
+            f"без изменений {totals['unchanged']}, отклонено {totals['error']}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{processed} строк за {elapsed:.2f} с ({processed / elapsed if elapsed else 0:.0f} строк/с)'
+        ))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from students import search
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс FTS5 по курсам, документам, объявлениям и преподавателям'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kinds', nargs='*', help=f'какие индексы: {", ".join(search.INDEXES)} (по умолчанию все)')
+
+    def handle(self, *args, **options):
+        if not search.available():
+            raise CommandError('FTS5 недоступен: нужен SQLite с FTS5 и применённая миграция 0015_search_index')
+        unknown = set(options['kinds']) - set(search.INDEXES)
+        if unknown:
+            raise CommandError(f'Неизвестные индексы: {", ".join(sorted(unknown))}')
+        started = time.monotonic()
+        with transaction.atomic():
+            counts = search.rebuild(options['kinds'] or None)
+        for kind, count in counts.items():
+            self.stdout.write(f'{kind}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Индекс пересобран за {time.monotonic() - started:.2f} с'))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from students import stats
+from students.models import CourseStats, StudentStats
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает таблицы статистики дашборда и сверяет их с живыми агрегатами'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='после пересборки сверить таблицы с агрегатами по Enrollment/Grade')
+        parser.add_argument('--verify-only', action='store_true',
+                            help='только сверка, без пересборки')
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            started = time.monotonic()
+            with transaction.atomic():
+                CourseStats.objects.all().delete()
+                # без ключей рейтинга строки удаляются без поправок дерева:
+                # refresh_student_stats() всё равно собирает его заново
+                StudentStats.objects.update(rank_key=None)
+                StudentStats.objects.all().delete()
+                courses = stats.refresh_course_stats()
+                students = stats.refresh_student_stats()
+            self.stdout.write(
+                f'Пересобрано: курсов {courses}, студентов {students} '
+                f'за {time.monotonic() - started:.2f} с'
+            )
+
+        if options['verify'] or options['verify_only']:
+            failed = False
+            for model in (CourseStats, StudentStats):
+                problems = stats.verify_stats(model)
+                for pk, problem in problems[:20]:
+                    self.stderr.write(f'{model.__name__} #{pk}: {problem}')
+                if problems:
+                    failed = True
+                    self.stderr.write(f'{model.__name__}: расхождений {len(problems)}')
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'{model.__name__}: совпадает с живыми данными'))
+            if failed:
+                raise CommandError('Статистика расходится с живыми агрегатами')
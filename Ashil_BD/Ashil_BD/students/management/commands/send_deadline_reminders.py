@@ -0,0 +1,39 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from students import reminders
+
+
+class Command(BaseCommand):
+    help = 'Рассылает напоминания о сроках сдачи заданий пачками по курсам'
+
+    def add_arguments(self, parser):
+        config = reminders.options()
+        parser.add_argument('--lead-hours', type=float, default=config['LEAD_HOURS'],
+                            help='за сколько часов до срока напоминать')
+        parser.add_argument('--loop', action='store_true',
+                            help='работать постоянно: спать до ближайшего срока, но не дольше --poll секунд')
+        parser.add_argument('--poll', type=float, default=config['POLL_SECONDS'],
+                            help='как часто проверять новые задания в режиме --loop')
+
+    def handle(self, *args, **options):
+        lead = timedelta(hours=options['lead_hours'])
+        while True:
+            result = reminders.tick(lead=lead)
+            if result['assignments'] or result['skipped'] or not options['loop']:
+                self.stdout.write(
+                    f'{timezone.localtime():%Y-%m-%d %H:%M:%S} напоминаний: {result["assignments"]} '
+                    f'(курсов: {result["courses"]}), пропущено просроченных: {result["skipped"]}'
+                )
+            if not options['loop']:
+                return
+            wakeup = reminders.next_wakeup(lead)
+            close_old_connections()
+            delay = options['poll']
+            if wakeup is not None:
+                delay = min(delay, max(0.0, (wakeup - timezone.now()).total_seconds()))
+            time.sleep(delay)
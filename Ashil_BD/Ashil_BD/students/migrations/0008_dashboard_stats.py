@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Avg, Count, Max, Min, Sum
+
+
+def fill_stats(apps, schema_editor):
+    # первичное заполнение по уже существующим оценкам
+    Course = apps.get_model('students', 'Course')
+    Student = apps.get_model('students', 'Student')
+    CourseStats = apps.get_model('students', 'CourseStats')
+    StudentStats = apps.get_model('students', 'StudentStats')
+
+    aggregates = dict(
+        grade_count=Count('enrollments__grade__score'),
+        score_sum=Sum('enrollments__grade__score'),
+        score_avg=Avg('enrollments__grade__score'),
+        score_min=Min('enrollments__grade__score'),
+        score_max=Max('enrollments__grade__score'),
+    )
+    for model, stats_model, key, count_field in (
+        (Course, CourseStats, 'course_id', 'enrollment_count'),
+        (Student, StudentStats, 'student_id', 'course_count'),
+    ):
+        rows = []
+        for row in model.objects.annotate(**{count_field: Count('enrollments')}, **aggregates).values(
+                'pk', count_field, *aggregates):
+            pk = row.pop('pk')
+            row['score_sum'] = row['score_sum'] or 0
+            if row['score_avg'] is not None:
+                row['score_avg'] = float(row['score_avg'])
+            rows.append(stats_model(**{key: pk}, **row))
+        stats_model.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0007_chatmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseStats',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='students.course')),
+                ('enrollment_count', models.PositiveIntegerField(default=0)),
+                ('grade_count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('score_avg', models.FloatField(blank=True, null=True)),
+                ('score_min', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('score_max', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StudentStats',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='students.student')),
+                ('course_count', models.PositiveIntegerField(default=0)),
+                ('grade_count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('score_avg', models.FloatField(blank=True, db_index=True, null=True)),
+                ('score_min', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('score_max', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+            ],
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0009_chatmessage_room_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('room', models.CharField(max_length=100)),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('first_id', models.BigIntegerField()),
+                ('last_id', models.BigIntegerField()),
+                ('first_timestamp', models.DateTimeField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('message_count', models.PositiveIntegerField()),
+                ('size_bytes', models.PositiveBigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['room', 'first_id'],
+                'indexes': [models.Index(fields=['room', 'last_id'], name='chat_archive_room_last_idx'), models.Index(fields=['room', 'first_timestamp', 'last_timestamp'], name='chat_archive_room_time_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0010_chat_archive_segment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='thumbnail_source',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+    ]
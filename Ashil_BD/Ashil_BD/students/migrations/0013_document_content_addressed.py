@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:23
+
+import students.storage
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0012_document_metadata'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='original_name',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Имя файла при загрузке'),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='file',
+            field=models.FileField(storage=students.storage.ContentAddressedStorage(), upload_to=students.storage.document_upload_to, verbose_name='Файл'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['file'], name='document_file_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Полнотекстовый индекс FTS5 (students/search.py). Только для SQLite с FTS5 —
+# на других СУБД миграция ничего не делает, а поиск работает через icontains.
+
+from django.db import migrations
+
+TABLES = {
+    'students_search_course': ('students_course', ('title', 'code', 'description'), ''),
+    'students_search_document': ('students_document', ('title', 'description'), ''),
+    'students_search_announcement': ('students_announcement', ('title', 'content'), 'WHERE visible'),
+    'students_search_teacher': ('students_teacher', ('name', 'bio'), ''),
+}
+
+
+def _has_fts5(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_index(apps, schema_editor):
+    if not _has_fts5(schema_editor.connection):
+        return
+    for table, (source, columns, where) in TABLES.items():
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+            f"{', '.join(columns)}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4 5 6')"
+        )
+        values = ', '.join(f"COALESCE({c}, '')" for c in columns)
+        schema_editor.execute(
+            f"INSERT INTO {table} (rowid, {', '.join(columns)}) SELECT id, {values} FROM {source} {where}"
+        )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in TABLES:
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0014_upload_session'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# FTS-таблица документов получает колонку content — текст из файла (students/search.py).
+# FTS5 не умеет ALTER TABLE ADD COLUMN, поэтому таблица пересоздаётся.
+FTS_COLUMNS = {
+    'old': ('title', 'description'),
+    'new': ('title', 'description', 'content'),
+}
+
+
+def _recreate_document_index(schema_editor, columns):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or 'students_search_document' not in connection.introspection.table_names():
+        return
+    schema_editor.execute('DROP TABLE students_search_document')
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE students_search_document USING fts5("
+        f"{', '.join(columns)}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4 5 6')"
+    )
+    values = ["COALESCE(d.title, '')", "COALESCE(d.description, '')", "COALESCE(t.text, '')"][:len(columns)]
+    join = ' LEFT JOIN students_documenttext t ON t.document_id = d.id' if 'content' in columns else ''
+    schema_editor.execute(
+        f"INSERT INTO students_search_document (rowid, {', '.join(columns)}) "
+        f"SELECT d.id, {', '.join(values)} FROM students_document d{join}"
+    )
+
+
+def add_content_column(apps, schema_editor):
+    _recreate_document_index(schema_editor, FTS_COLUMNS['new'])
+
+
+def drop_content_column(apps, schema_editor):
+    _recreate_document_index(schema_editor, FTS_COLUMNS['old'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0015_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentText',
+            fields=[
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='text', serialize=False, to='students.document')),
+                ('status', models.CharField(choices=[('done', 'Извлечён'), ('unsupported', 'Формат не поддерживается'), ('failed', 'Ошибка')], max_length=12)),
+                ('content_hash', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('text', models.TextField(blank=True)),
+                ('char_count', models.PositiveIntegerField(default=0)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('duration_ms', models.PositiveIntegerField(default=0)),
+                ('extracted_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(add_content_column, drop_content_column),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0016_document_text'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['day_of_week', 'classroom', 'start_time'], name='schedule_room_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['course', 'day_of_week', 'start_time'], name='schedule_course_day_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0017_schedule_conflict_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='reminder_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['course', 'due_date'], name='assignment_course_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['due_date'], name='assignment_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(condition=models.Q(('reminder_sent_at__isnull', True)), fields=['due_date', 'id'], name='assignment_reminder_queue_idx'),
+        ),
+    ]
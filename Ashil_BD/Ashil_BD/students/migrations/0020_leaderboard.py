@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:47
+
+from django.db import migrations, models
+from django.db.models import Count, F, Value
+from django.db.models.functions import Cast, Greatest, Least
+
+# копия students.leaderboard на момент миграции: миграция не зависит от живого кода
+MAX_KEY = 10000
+SIZE = MAX_KEY + 1
+
+
+def build_leaderboard(apps, schema_editor):
+    # дерево рейтинга по уже посчитанной статистике
+    StudentStats = apps.get_model('students', 'StudentStats')
+    LeaderboardNode = apps.get_model('students', 'LeaderboardNode')
+    StudentStats.objects.filter(score_avg__isnull=False).update(rank_key=Least(
+        Greatest(Cast(F('score_avg') * 100 + 0.5, models.IntegerField()), Value(0)), Value(MAX_KEY),
+    ))
+    tree = [0] * (SIZE + 1)
+    histogram = (StudentStats.objects.filter(rank_key__gte=0).order_by()
+                 .values_list('rank_key').annotate(n=Count('pk')))
+    for key, count in histogram:
+        tree[SIZE - key] += count
+    for position in range(1, SIZE + 1):
+        parent = position + (position & -position)
+        if parent <= SIZE:
+            tree[parent] += tree[position]
+    LeaderboardNode.objects.bulk_create([LeaderboardNode(position=p, count=tree[p]) for p in range(1, SIZE + 1)],
+                                        batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0019_assignment_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardNode',
+            fields=[
+                ('position', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='studentstats',
+            name='rank_key',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='studentstats',
+            index=models.Index(fields=['-rank_key', 'student'], name='student_stats_rank_idx'),
+        ),
+        migrations.RunPython(build_leaderboard, migrations.RunPython.noop),
+    ]
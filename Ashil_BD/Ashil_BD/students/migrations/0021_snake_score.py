@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0020_leaderboard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnakeScore',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snake_score', serialize=False, to='students.student')),
+                ('best', models.PositiveIntegerField(default=0)),
+                ('games', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-best', 'student'], name='snake_score_best_idx')],
+            },
+        ),
+    ]
@@ -1,15 +1,27 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .storage import document_storage, document_upload_to
 
 class Student(models.Model):
     name = models.CharField(max_length=100)
     age = models.IntegerField()
     email = models.EmailField()
     photo = models.ImageField(upload_to='student_photos/', blank=True, null=True)
+    # имя фото, для которого готовы миниатюры (students/thumbnails.py)
+    thumbnail_source = models.CharField(max_length=255, blank=True, editable=False)
 
     def __str__(self):
         return self.name
 
+    @property
+    def thumbnails(self):
+        from .thumbnails import urls
+        return urls(self)
+
 class Teacher(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
     name = models.CharField(max_length=100)
@@ -29,17 +41,7 @@ class Course(models.Model):
 
     def get_avg_color(self):
         # Этот метод будет использоваться в дашборде для цвета среднего балла
-        avg = self.avg_grade  # это поле создается аннотацией в views.py
-        if avg is None:
-            return 'secondary'
-        elif avg >= 90:
-            return 'success'
-        elif avg >= 70:
-            return 'info'
-        elif avg >= 50:
-            return 'warning'
-        else:
-            return 'danger'
+        return score_color(self.avg_grade)  # avg_grade создается аннотацией в views.py
 
     def __str__(self):
         return self.title
@@ -55,23 +57,27 @@ class Enrollment(models.Model):
     def __str__(self):
         return f"{self.student} → {self.course}"
 
+def score_color(score):
+    """Цвет бейджа Bootstrap для оценки по 100-балльной шкале."""
+    if score is None:
+        return 'secondary'  # серый если нет оценки
+    score_float = float(score)  # конвертируем Decimal в float для сравнения
+    if score_float >= 90:
+        return 'success'    # темно-зеленый (90-100)
+    elif score_float >= 70:
+        return 'info'       # светло-зеленый/голубой (70-89) 
+    elif score_float >= 50:
+        return 'warning'    # желтый (50-69)
+    else:
+        return 'danger'     # красный (0-49)
+
 class Grade(models.Model):
     enrollment = models.OneToOneField(Enrollment, on_delete=models.CASCADE, related_name='grade')
     score = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
     comment = models.TextField(blank=True)
 
     def get_score_color(self):
-        if self.score is None:
-            return 'secondary'  # серый если нет оценки
-        score_float = float(self.score)  # конвертируем Decimal в float для сравнения
-        if score_float >= 90:
-            return 'success'    # темно-зеленый (90-100)
-        elif score_float >= 70:
-            return 'info'       # светло-зеленый/голубой (70-89) 
-        elif score_float >= 50:
-            return 'warning'    # желтый (50-69)
-        else:
-            return 'danger'     # красный (0-49)
+        return score_color(self.score)
 
     def __str__(self):
         return f"{self.enrollment.student} - {self.enrollment.course} : {self.score}"
@@ -107,10 +113,33 @@ class Schedule(models.Model):
 
     class Meta:
         ordering = ['day_of_week', 'start_time']
+        indexes = [
+            # поиск соседнего занятия при проверке накладок (conflicts.py)
+            models.Index(fields=['day_of_week', 'classroom', 'start_time'], name='schedule_room_idx'),
+            models.Index(fields=['course', 'day_of_week', 'start_time'], name='schedule_course_day_idx'),
+        ]
 
     def __str__(self):
         return f"{self.course.title} - {self.get_day_of_week_display()} {self.start_time}"
 
+    def clean(self):
+        from .conflicts import validate
+        validate(self)
+
+class AssignmentQuerySet(models.QuerySet):
+    """Отбор по сроку сдачи одним запросом по индексу, без перебора в Python."""
+
+    def overdue(self, now=None):
+        return self.filter(due_date__lt=now or timezone.now())
+
+    def upcoming(self, now=None):
+        return self.filter(due_date__gte=now or timezone.now())
+
+    def due_within(self, delta, now=None):
+        now = now or timezone.now()
+        return self.filter(due_date__gte=now, due_date__lt=now + delta)
+
+
 class Assignment(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='assignments')
     title = models.CharField(max_length=200)
@@ -118,13 +147,38 @@ class Assignment(models.Model):
     due_date = models.DateTimeField()
     max_score = models.IntegerField(default=100)
     created_at = models.DateTimeField(auto_now_add=True)
+    # когда ушло напоминание о сроке (reminders.py); при переносе срока сбрасывается
+    reminder_sent_at = models.DateTimeField(null=True, blank=True)
+
+    objects = AssignmentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['course', 'due_date'], name='assignment_course_due_idx'),
+            models.Index(fields=['due_date'], name='assignment_due_idx'),
+            # очередь напоминаний: в индексе только задания, о которых ещё не напомнили
+            models.Index(fields=['due_date', 'id'], name='assignment_reminder_queue_idx',
+                         condition=models.Q(reminder_sent_at__isnull=True)),
+        ]
 
     def __str__(self):
         return self.title
 
     def is_overdue(self):
-        from django.utils import timezone
         return timezone.now() > self.due_date
+
+class AssignmentScore(models.Model):
+    """Оценка студента за задание — ячейка журнала курса (gradebook.py)."""
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='scores')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='assignment_scores')
+    score = models.DecimalField(max_digits=6, decimal_places=2)
+    graded_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('assignment', 'student')
+
+    def __str__(self):
+        return f"{self.student} - {self.assignment} : {self.score}"
     
 class Document(models.Model):
     DOCUMENT_TYPES = [
@@ -136,41 +190,44 @@ class Document(models.Model):
     
     title = models.CharField(max_length=200, verbose_name="Название")
     description = models.TextField(blank=True, verbose_name="Описание")
-    file = models.FileField(upload_to='documents/', verbose_name="Файл")
+    # файл по хэшу содержимого, одинаковые загрузки делят один файл (storage.py)
+    file = models.FileField(upload_to=document_upload_to, storage=document_storage, verbose_name="Файл")
+    original_name = models.CharField(max_length=255, blank=True, editable=False, verbose_name="Имя файла при загрузке")
     file_type = models.CharField(max_length=20, choices=DOCUMENT_TYPES, default='other', verbose_name="Тип файла")
     course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Курс")
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата загрузки")
+    # заполняются при сохранении (signals.py → documents.file_metadata)
+    file_size = models.BigIntegerField(null=True, blank=True, editable=False, verbose_name="Размер, байт")
+    file_ext = models.CharField(max_length=16, blank=True, editable=False, verbose_name="Расширение")
+    mime_type = models.CharField(max_length=100, blank=True, editable=False, verbose_name="MIME-тип")
+    content_hash = models.CharField(max_length=64, blank=True, editable=False, db_index=True, verbose_name="SHA-256")
+
+    class Meta:
+        indexes = [
+            # сортировки списка документов (documents.SORTS)
+            models.Index(fields=['uploaded_at', 'id'], name='document_uploaded_idx'),
+            models.Index(fields=['title', 'id'], name='document_title_idx'),
+            models.Index(fields=['file_size', 'id'], name='document_size_idx'),
+            models.Index(fields=['file_ext', 'title', 'id'], name='document_ext_idx'),
+            # счётчик ссылок на общий файл (storage.release_blob, gc_media)
+            models.Index(fields=['file'], name='document_file_idx'),
+        ]
     
     def __str__(self):
         return self.title
     
     def get_file_icon(self):
-        icons = {
-            'pdf': '📕',
-            'doc': '📄',
-            'docx': '📄',
-            'xls': '📊',
-            'xlsx': '📊',
-            'ppt': '📽️',
-            'pptx': '📽️',
-            'jpg': '🖼️',
-            'png': '🖼️',
-            'zip': '📦',
-        }
-        ext = self.file.name.split('.')[-1].lower()
-        return icons.get(ext, '📁')
+        from .documents import ICONS, file_extension
+        return ICONS.get(self.file_ext or file_extension(self.file.name), '📁')
     
     def get_file_size(self):
+        from .documents import format_size
+        if self.file_size is not None:
+            return format_size(self.file_size)
         try:
-            size = self.file.size
-            if size < 1024:
-                return f"{size} B"
-            elif size < 1024 * 1024:
-                return f"{size / 1024:.1f} KB"
-            else:
-                return f"{size / (1024 * 1024):.1f} MB"
-        except:
+            return format_size(self.file.size)  # старая запись без метаданных
+        except Exception:
             return "Unknown"
 
 class ChatMessage(models.Model):
@@ -178,6 +235,148 @@ class ChatMessage(models.Model):
     message = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
     room = models.CharField(max_length=100, default='general')  # можно по курсам
+
+    class Meta:
+        indexes = [
+            # курсорная пагинация истории комнаты (см. chat.fetch_history)
+            models.Index(fields=['room', 'timestamp', 'id'], name='chat_room_ts_id_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.user.username}: {self.message[:20]}"
\ No newline at end of file
+        return f"{self.user.username}: {self.message[:20]}"
+
+# 📊 МАТЕРИАЛИЗОВАННАЯ СТАТИСТИКА ДЛЯ ДАШБОРДА
+# Строки обновляются инкрементально сигналами (см. signals.py и stats.py),
+# полная пересборка и сверка: python manage.py rebuild_stats --verify
+class CourseStats(models.Model):
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    enrollment_count = models.PositiveIntegerField(default=0)
+    grade_count = models.PositiveIntegerField(default=0)
+    score_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    score_avg = models.FloatField(null=True, blank=True)
+    score_min = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    score_max = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.course}: {self.grade_count} оценок, ср. {self.score_avg}"
+
+class StudentStats(models.Model):
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    course_count = models.PositiveIntegerField(default=0)
+    grade_count = models.PositiveIntegerField(default=0)
+    score_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    score_avg = models.FloatField(null=True, blank=True, db_index=True)  # индекс для топа студентов
+    score_min = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    score_max = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    # score_avg, округлённый до сотых, целым (leaderboard.rank_key); по нему строится рейтинг
+    rank_key = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-rank_key', 'student'], name='student_stats_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student}: {self.grade_count} оценок, ср. {self.score_avg}"
+
+
+class LeaderboardNode(models.Model):
+    # Узел дерева Фенвика над rank_key: число студентов в диапазоне ключей узла (см. leaderboard.py)
+    position = models.PositiveIntegerField(primary_key=True)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"#{self.position}: {self.count}"
+
+class ChatArchiveSegment(models.Model):
+    # Индекс архивных сегментов чата: сами сообщения лежат в сжатых файлах
+    # CHAT_ARCHIVE_ROOT/<room>/<first_id>-<last_id>.ndjson.gz (см. chat_archive.py)
+    room = models.CharField(max_length=100)
+    path = models.CharField(max_length=255, unique=True)
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    message_count = models.PositiveIntegerField()
+    size_bytes = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['room', 'first_id']
+        indexes = [
+            models.Index(fields=['room', 'last_id'], name='chat_archive_room_last_idx'),
+            models.Index(fields=['room', 'first_timestamp', 'last_timestamp'], name='chat_archive_room_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.room}: {self.first_id}–{self.last_id} ({self.message_count})"
+
+class UploadSession(models.Model):
+    # Докачиваемая загрузка документа частями (см. uploads.py): байты копятся
+    # во временном файле CHUNKED_UPLOAD['ROOT']/<id>.part, received — сколько уже на диске
+    STATUS_CHOICES = [
+        ('active', 'Идёт загрузка'),
+        ('complete', 'Завершена'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    received = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
+    # поля будущего документа
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    file_type = models.CharField(max_length=20, choices=Document.DOCUMENT_TYPES, default='other')
+    course = models.ForeignKey(Course, on_delete=models.SET_NULL, null=True, blank=True)
+    document = models.ForeignKey(Document, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # поиск брошенных загрузок (gc_media)
+            models.Index(fields=['status', 'updated_at'], name='upload_status_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.filename}: {self.received}/{self.size}"
+
+class DocumentText(models.Model):
+    # Извлечённый из файла документа текст для поиска (см. extraction.py).
+    # content_hash — хэш файла, из которого извлекали: по нему видно, устарел ли текст
+    STATUS_CHOICES = [
+        ('done', 'Извлечён'),
+        ('unsupported', 'Формат не поддерживается'),
+        ('failed', 'Ошибка'),
+    ]
+
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, primary_key=True, related_name='text')
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    text = models.TextField(blank=True)
+    char_count = models.PositiveIntegerField(default=0)
+    error = models.CharField(max_length=255, blank=True)
+    duration_ms = models.PositiveIntegerField(default=0)
+    extracted_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.document}: {self.get_status_display()} ({self.char_count} симв.)"
+
+class SnakeScore(models.Model):
+    # Рекорд студента в «Змейке»: пишется пакетами из буфера snake.ScoreBuffer
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, primary_key=True, related_name='snake_score')
+    best = models.PositiveIntegerField(default=0)
+    games = models.PositiveIntegerField(default=0)
+    total = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-best', 'student'], name='snake_score_best_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student}: {self.best} ({self.games} игр)"
@@ -0,0 +1,10 @@
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    # Курсор по первичному ключу: страница стоит одинаково на любой глубине,
+    # в отличие от OFFSET, и не «плывёт» при вставке новых строк
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -0,0 +1,48 @@
+"""
+Ленивые пулы процессов для фоновой работы вне потока запроса
+(миниатюры фото, извлечение текста документов).
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class LazyProcessPool:
+    """
+    ProcessPoolExecutor, который создаётся при первой задаче. Контекст spawn,
+    а не fork: родитель многопоточный (буфер чата, ASGI). Упавший пул
+    пересоздаётся при следующей отправке. on_start() вызывается перед
+    созданием пула.
+    """
+
+    def __init__(self, get_workers, on_start=None):
+        self._get_workers = get_workers
+        self._on_start = on_start
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self._on_start is not None:
+                        self._on_start()
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self._get_workers(),
+                        mp_context=multiprocessing.get_context('spawn'),
+                    )
+        return self._executor
+
+    def reset(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, fn, *args):
+        try:
+            return self._get().submit(fn, *args)
+        except (BrokenProcessPool, RuntimeError):
+            self.reset()
+            return self._get().submit(fn, *args)
@@ -0,0 +1,150 @@
+"""
+Доставка сообщений чата в реальном времени через ASGI WebSocket.
+
+RoomBroker — pub/sub внутри процесса: у каждого подключения своя очередь,
+publish() раскладывает сообщение по очередям подписчиков комнаты.
+publish() можно вызывать из любого потока (обработчики сигналов работают
+в потоках sync_to_async), сама доставка идёт в event loop подписчика.
+
+Брокер живёт в одном процессе: при нескольких ASGI-воркерах каждый видит
+только сообщения, записанные через него самого. Пропущенное клиент
+дочитывает через API истории.
+"""
+import asyncio
+import json
+import re
+import threading
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+
+from . import chat, chat_buffer
+
+# path в ASGI уже раскодирован — то же правило, что у HTTP-маршрута чата
+ROOM_PATH = re.compile(rf'^/ws/chat/(?P<room>{chat.ROOM_NAME})/$')
+
+
+class RoomBroker:
+    def __init__(self, queue_size=256):
+        self.queue_size = queue_size
+        self._rooms = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, room):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._rooms[room].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, room, subscriber):
+        with self._lock:
+            subscribers = self._rooms.get(room)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._rooms[room]
+
+    def connection_count(self, room=None):
+        with self._lock:
+            if room is not None:
+                return len(self._rooms.get(room, ()))
+            return sum(len(s) for s in self._rooms.values())
+
+    def publish(self, room, payload):
+        with self._lock:
+            subscribers = list(self._rooms.get(room, ()))
+        if not subscribers:
+            return 0
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        for loop, queue in subscribers:
+            if loop is current:
+                _put(queue, payload)
+            else:
+                loop.call_soon_threadsafe(_put, queue, payload)
+        return len(subscribers)
+
+
+def _put(queue, payload):
+    # медленный клиент: выбрасываем самое старое, догонит через историю
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(payload)
+
+
+broker = RoomBroker()
+
+
+def publish_message(message, username=None):
+    # кодируем JSON один раз на сообщение, а не на каждого подписчика
+    payload = json.dumps(chat.serialize_message(message, username), ensure_ascii=False)
+    return broker.publish(message.room, payload)
+
+
+def _parse_text(event):
+    text = event.get('text')
+    if text is None and event.get('bytes'):
+        text = event['bytes'].decode('utf-8', 'replace')
+    if not text:
+        return ''
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return text.strip()
+    if isinstance(data, dict):
+        return str(data.get('message', '')).strip()
+    return ''
+
+
+async def chat_socket(scope, receive, send, room, save=None):
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+    await send({'type': 'websocket.accept'})
+
+    save = save or sync_to_async(chat_buffer.submit_message)
+    subscriber = broker.subscribe(room)
+    queue = subscriber[1]
+    incoming = asyncio.ensure_future(receive())
+    outgoing = asyncio.ensure_future(queue.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait({incoming, outgoing}, return_when=asyncio.FIRST_COMPLETED)
+            if outgoing in done:
+                payload = outgoing.result()
+                if not isinstance(payload, str):
+                    payload = json.dumps(payload, ensure_ascii=False)
+                await send({'type': 'websocket.send', 'text': payload})
+                outgoing = asyncio.ensure_future(queue.get())
+            if incoming in done:
+                event = incoming.result()
+                if event['type'] == 'websocket.disconnect':
+                    break
+                if event['type'] == 'websocket.receive':
+                    text = _parse_text(event)
+                    if text:
+                        # рассылка идёт после записи пакета, отправитель получит своё сообщение тоже
+                        await save(room, text)
+                incoming = asyncio.ensure_future(receive())
+    finally:
+        incoming.cancel()
+        outgoing.cancel()
+        broker.unsubscribe(room, subscriber)
+
+
+def websocket_router(http_application):
+    """Оборачивает ASGI-приложение Django: /ws/chat/<room>/ обслуживаем сами."""
+    async def application(scope, receive, send):
+        if scope['type'] == 'websocket':
+            match = ROOM_PATH.match(scope['path'])
+            if match is None:
+                await receive()
+                await send({'type': 'websocket.close', 'code': 4404})
+                return
+            await chat_socket(scope, receive, send, match.group('room'))
+            return
+        await http_application(scope, receive, send)
+    return application
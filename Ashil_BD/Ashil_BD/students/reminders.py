@@ -0,0 +1,110 @@
+"""
+Напоминания о сроках сдачи заданий.
+
+Очередь — частичный индекс assignment_reminder_queue_idx: в нём только
+задания без reminder_sent_at, упорядоченные по due_date. Шаг планировщика
+(tick) читает из начала очереди задания со сроком в пределах LEAD_HOURS,
+помечает их отправленными в той же транзакции и после коммита рассылает
+пачками по курсам. Отправленные задания уходят из индекса, так что каждый
+шаг трогает только то, о чём пора напомнить, а не всю таблицу.
+
+Доставка «не больше одного раза»: задание помечается до рассылки, сбой
+рассылки не приведёт к повтору. Срок, прошедший до напоминания
+(планировщик стоял), помечается без рассылки.
+
+Пачка — dict {'course_id', 'course', 'assignments': [...], 'emails': [...]}
+уходит в сигнал reminder_batch и, если DEADLINE_REMINDERS['EMAIL'], письмами
+записанным на курс студентам. Запуск: python manage.py send_deadline_reminders
+(--loop — постоянно, просыпаясь к ближайшему сроку).
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Assignment, Enrollment
+
+logger = logging.getLogger(__name__)
+
+reminder_batch = Signal()
+
+
+def options():
+    defaults = {'LEAD_HOURS': 24, 'POLL_SECONDS': 60, 'BATCH_SIZE': 500, 'EMAIL': False}
+    defaults.update(getattr(settings, 'DEADLINE_REMINDERS', {}))
+    return defaults
+
+
+def _queue():
+    return Assignment.objects.filter(reminder_sent_at__isnull=True).order_by('due_date', 'id')
+
+
+def claim(now, lead, limit):
+    """Забирает из очереди до limit заданий со сроком до now + lead. Возвращает (к рассылке, просроченных)."""
+    with transaction.atomic():
+        rows = list(_queue().filter(due_date__lte=now + lead)
+                    .values('id', 'course_id', 'course__title', 'title', 'due_date')[:limit])
+        Assignment.objects.filter(pk__in=[row['id'] for row in rows]).update(reminder_sent_at=now)
+    due = [row for row in rows if row['due_date'] > now]
+    return due, len(rows) - len(due)
+
+
+def batches(rows):
+    """Пачки по курсам с адресами записанных студентов — один запрос на все курсы шага."""
+    if not rows:
+        return []
+    by_course = {}
+    for row in rows:
+        batch = by_course.setdefault(row['course_id'], {
+            'course_id': row['course_id'], 'course': row['course__title'], 'assignments': [], 'emails': [],
+        })
+        batch['assignments'].append({'id': row['id'], 'title': row['title'], 'due_date': row['due_date']})
+    enrolled = (Enrollment.objects.filter(course_id__in=list(by_course)).exclude(student__email='')
+                .values_list('course_id', 'student__email').order_by('course_id', 'student__email'))
+    for course_id, email in enrolled:
+        by_course[course_id]['emails'].append(email)
+    return list(by_course.values())
+
+
+def _message(batch):
+    lines = [f'{a["title"]} — до {timezone.localtime(a["due_date"]):%d.%m.%Y %H:%M}' for a in batch['assignments']]
+    subject = f'Сроки сдачи по курсу «{batch["course"]}»'
+    return subject, 'Скоро срок сдачи заданий:\n\n' + '\n'.join(lines)
+
+
+def deliver(batch):
+    reminder_batch.send(sender=Assignment, batch=batch)
+    if options()['EMAIL'] and batch['emails']:
+        subject, body = _message(batch)
+        send_mass_mail([(subject, body, None, [email]) for email in batch['emails']], fail_silently=False)
+
+
+def tick(now=None, lead=None, limit=None):
+    """Один шаг планировщика. Возвращает {'assignments', 'courses', 'skipped'}."""
+    config = options()
+    now = now or timezone.now()
+    lead = lead if lead is not None else timedelta(hours=config['LEAD_HOURS'])
+    limit = limit or config['BATCH_SIZE']
+    result = {'assignments': 0, 'courses': 0, 'skipped': 0}
+    while True:
+        rows, skipped = claim(now, lead, limit)
+        result['skipped'] += skipped
+        for batch in batches(rows):
+            try:
+                deliver(batch)
+            except Exception:
+                logger.exception('Не удалось разослать напоминания по курсу %s', batch['course_id'])
+            result['courses'] += 1
+        result['assignments'] += len(rows)
+        if len(rows) + skipped < limit:
+            return result
+
+
+def next_wakeup(lead):
+    """Когда наступит ближайшее напоминание (начало очереди), или None, если очередь пуста."""
+    due = _queue().values_list('due_date', flat=True).first()
+    return None if due is None else due - lead
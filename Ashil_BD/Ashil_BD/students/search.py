@@ -0,0 +1,277 @@
+"""
+Полнотекстовый поиск по курсам, документам, объявлениям и преподавателям.
+
+На SQLite — виртуальные таблицы FTS5 (по одной на модель, rowid = pk
+исходной строки), созданные миграцией 0015_search_index и обновляемые
+сигналами в той же транзакции, что и сама строка (signals.py); bulk-запись
+в обход сигналов вызывает index_objects() сама. Ранжирование — bm25 с
+весами колонок (заголовок важнее описания). Полная пересборка:
+python manage.py rebuild_search_index.
+
+Чтобы частые слова на миллионе строк не стоили сотни миллисекунд, запрос
+идёт в два шага: граница по rowid отсекает CANDIDATES самых новых
+совпадений (обход списка позиций без ранжирования), bm25 считается только
+для них; подсветка и сниппеты — только для строк итоговой страницы.
+Если совпадений больше, результат помечается как неполный (truncated) —
+вызывающий код сообщает об этом пользователю, а не выдаёт выборку за всё.
+Слова до PREFIX_MAX символов ищутся как префиксы через префиксный индекс
+FTS5, более длинные — целиком (и префиксом, если целиком не нашлось).
+
+На других СУБД (FTS5 нет) search() деградирует до icontains по тем же полям.
+"""
+import re
+from dataclasses import dataclass
+
+from django.db import connection
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Announcement, Course, Document, Teacher
+
+MAX_TOKENS = 10
+CANDIDATES = 2000
+PREFIX_MAX = 6  # совпадает с prefix = '2 3 4 5 6' в миграции 0015_search_index
+MAX_OFFSET = 1000  # глубже 51 страницы по 20 не листаем — ранжирование дорожает с глубиной
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+@dataclass(frozen=True)
+class SearchIndex:
+    kind: str
+    label: str
+    model: type
+    table: str
+    columns: tuple
+    weights: tuple
+    url_name: str = ''
+    condition: str = ''  # SQL-условие на исходную таблицу: какие строки индексировать
+    source: str = ''  # свой SELECT id, <колонки> — если данные не только из таблицы модели
+    id_column: str = 'id'
+
+    def url(self, pk):
+        return reverse(self.url_name, args=[pk]) if self.url_name else ''
+
+
+INDEXES = {
+    index.kind: index for index in (
+        SearchIndex('course', 'Курс', Course, 'students_search_course',
+                    ('title', 'code', 'description'), (10.0, 8.0, 1.0), 'course_detail'),
+        SearchIndex('document', 'Документ', Document, 'students_search_document',
+                    ('title', 'description', 'content'), (10.0, 2.0, 1.0), 'download_document',
+                    # content — текст из файла (DocumentText, см. extraction.py)
+                    source="SELECT d.id, COALESCE(d.title, ''), COALESCE(d.description, ''), COALESCE(t.text, '') "
+                           "FROM students_document d LEFT JOIN students_documenttext t ON t.document_id = d.id",
+                    id_column='d.id'),
+        SearchIndex('announcement', 'Объявление', Announcement, 'students_search_announcement',
+                    ('title', 'content'), (10.0, 1.0), condition='visible'),
+        SearchIndex('teacher', 'Преподаватель', Teacher, 'students_search_teacher',
+                    ('name', 'bio'), (10.0, 1.0)),
+    )
+}
+INDEX_BY_MODEL = {index.model: index for index in INDEXES.values()}
+
+_available = None
+
+
+def available():
+    """FTS5 есть только на SQLite, собранном с ним (стандартные сборки Python — да)."""
+    global _available
+    if _available is None:
+        _available = False
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = %s",
+                               [INDEXES['course'].table])
+                _available = cursor.fetchone() is not None
+    return _available
+
+
+def _source_select(index, where=''):
+    if index.source:
+        sql = index.source
+    else:
+        columns = ', '.join(f"COALESCE({connection.ops.quote_name(c)}, '')" for c in index.columns)
+        sql = f'SELECT id, {columns} FROM {index.model._meta.db_table}'
+    conditions = [c for c in (index.condition, where) if c]
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(f'({c})' for c in conditions)
+    return sql
+
+
+def index_objects(model, ids):
+    """Переиндексирует строки модели с данными pk (удалённые/скрытые просто исчезнут из индекса)."""
+    index = INDEX_BY_MODEL[model]
+    ids = [int(pk) for pk in ids]
+    if not ids or not available():
+        return
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            marks = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'DELETE FROM {index.table} WHERE rowid IN ({marks})', chunk)
+            cursor.execute(
+                f'INSERT INTO {index.table} (rowid, {", ".join(index.columns)}) '
+                + _source_select(index, f'{index.id_column} IN ({marks})'),
+                chunk,
+            )
+
+
+def remove_objects(model, ids):
+    index = INDEX_BY_MODEL[model]
+    ids = [int(pk) for pk in ids]
+    if not ids or not available():
+        return
+    with connection.cursor() as cursor:
+        marks = ', '.join(['%s'] * len(ids))
+        cursor.execute(f'DELETE FROM {index.table} WHERE rowid IN ({marks})', ids)
+
+
+def rebuild(kinds=None):
+    """Полная пересборка: {kind: строк в индексе}."""
+    result = {}
+    with connection.cursor() as cursor:
+        for kind in kinds or INDEXES:
+            index = INDEXES[kind]
+            cursor.execute(f'DELETE FROM {index.table}')
+            cursor.execute(f'INSERT INTO {index.table} (rowid, {", ".join(index.columns)}) ' + _source_select(index))
+            # слить сегменты b-дерева в один — быстрее последующие запросы
+            cursor.execute(f"INSERT INTO {index.table} ({index.table}) VALUES ('optimize')")
+            cursor.execute(f'SELECT COUNT(*) FROM {index.table}')
+            result[kind] = cursor.fetchone()[0]
+    return result
+
+
+def tokens(text):
+    return re.findall(r'\w+', text.lower())[:MAX_TOKENS]
+
+
+def fts_query(words, prefix_long=False):
+    """
+    Слова → запрос FTS5 (все слова обязательны). Длинное слово ищется целиком,
+    а при prefix_long — префиксом из первых PREFIX_MAX букв: префикс длиннее
+    префиксного индекса FTS5 разворачивает списки позиций всех подходящих слов.
+    """
+    parts = []
+    for word in words:
+        if len(word) <= PREFIX_MAX:
+            parts.append(f'"{word}"*')
+        elif prefix_long:
+            parts.append(f'"{word[:PREFIX_MAX]}"*')
+        else:
+            parts.append(f'"{word}"')
+    return ' '.join(parts)
+
+
+def _marked_html(text):
+    html = escape(text).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+    return mark_safe(html)
+
+
+def _ranked(cursor, index, match, limit):
+    """(строки, truncated): truncated — совпадений больше CANDIDATES и ранжированы не все."""
+    table = index.table
+    # CANDIDATES-е и следующее за ним совпадение: первое — граница, второе — признак усечения
+    cursor.execute(
+        f'SELECT rowid FROM {table} WHERE {table} MATCH %s ORDER BY rowid DESC LIMIT 2 OFFSET %s',
+        [match, CANDIDATES - 1],
+    )
+    beyond = cursor.fetchall()
+    weights = ', '.join(str(w) for w in index.weights)
+    cursor.execute(
+        f'SELECT rowid, bm25({table}, {weights}) AS score FROM {table} '
+        f'WHERE {table} MATCH %s AND rowid >= %s ORDER BY score LIMIT %s',
+        [match, beyond[0][0] if beyond else 0, limit],
+    )
+    return cursor.fetchall(), len(beyond) > 1
+
+
+def _search_table(cursor, index, words, limit):
+    match = fts_query(words)
+    rows, truncated = _ranked(cursor, index, match, limit)
+    if not rows and any(len(word) > PREFIX_MAX for word in words):
+        match = fts_query(words, prefix_long=True)
+        rows, truncated = _ranked(cursor, index, match, limit)
+    return [(index, match, pk, score) for pk, score in rows], truncated
+
+
+def _decorate(cursor, hits):
+    """Подсветка заголовка и сниппет — только для строк, попавших на страницу."""
+    by_table = {}
+    for index, match, pk, score in hits:
+        by_table.setdefault((index, match), []).append(pk)
+    marked = {}
+    for (index, match), ids in by_table.items():
+        table = index.table
+        cursor.execute(
+            f"SELECT rowid, highlight({table}, 0, %s, %s), snippet({table}, -1, %s, %s, '…', 16) "
+            f"FROM {table} WHERE {table} MATCH %s AND rowid IN ({', '.join(['%s'] * len(ids))})",
+            [MARK_START, MARK_END, MARK_START, MARK_END, match, *ids],
+        )
+        marked.update(((index.kind, pk), (title, snippet)) for pk, title, snippet in cursor.fetchall())
+    result = []
+    for index, match, pk, score in hits:
+        title, snippet = marked.get((index.kind, pk), ('', ''))
+        result.append({'type': index.kind, 'label': index.label, 'id': pk, 'score': round(-score, 4),
+                       'title': _marked_html(title), 'snippet': _marked_html(snippet), 'url': index.url(pk)})
+    return result
+
+
+def _fallback(words, kinds, limit):
+    hits = []
+    for kind in kinds:
+        index = INDEXES[kind]
+        condition = Q()
+        for word in words:
+            any_column = Q()
+            for column in index.columns:
+                any_column |= Q(**{f'{column}__icontains': word})
+            condition &= any_column
+        queryset = index.model.objects.filter(condition)
+        if index.condition:
+            queryset = queryset.filter(**{index.condition: True})
+        for row in queryset.order_by('-pk').values('pk', *index.columns)[:limit]:
+            hits.append({'type': kind, 'label': index.label, 'id': row['pk'], 'score': 0,
+                         'title': row[index.columns[0]], 'snippet': row[index.columns[-1]][:200],
+                         'url': index.url(row['pk'])})
+    return hits
+
+
+def max_page(per_page):
+    """Последняя страница, которую можно запросить (offset не больше MAX_OFFSET)."""
+    return MAX_OFFSET // per_page + 1
+
+
+def search(text, kinds=None, offset=0, limit=20):
+    """
+    Возвращает (результаты, есть_ещё, truncated). Результаты разных типов
+    сливаются по bm25. truncated — показаны не все совпадения: ранжированы
+    только CANDIDATES самых новых или следующая страница глубже MAX_OFFSET.
+    offset больше MAX_OFFSET — ValueError: вызывающий код проверяет страницу сам.
+    """
+    if offset > MAX_OFFSET:
+        raise ValueError(f'offset больше {MAX_OFFSET}')
+    kinds = [k for k in (kinds or INDEXES) if k in INDEXES]
+    offset = max(0, offset)
+    words = tokens(text)
+    if not words or not kinds:
+        return [], False, False
+    want = offset + limit + 1
+    truncated = False
+    if not available():
+        hits = _fallback(words, kinds, want)
+        page = hits[offset:offset + limit]
+    else:
+        with connection.cursor() as cursor:
+            hits = []
+            for kind in kinds:
+                rows, kind_truncated = _search_table(cursor, INDEXES[kind], words, want)
+                hits += rows
+                truncated = truncated or kind_truncated
+            hits.sort(key=lambda hit: hit[3])  # bm25: меньше — релевантнее
+            page = _decorate(cursor, hits[offset:offset + limit])
+    has_more = len(hits) > offset + limit
+    if has_more and offset + limit > MAX_OFFSET:
+        has_more, truncated = False, True
+    return page, has_more, truncated
@@ -1,32 +1,120 @@
-from rest_framework import serializers
-from .models import Student, Course, Teacher, Enrollment, Grade, Document
+from rest_framework import permissions, serializers
+from .models import Student, Course, Teacher, Enrollment, Grade, Document, UploadSession
 
-class StudentSerializer(serializers.ModelSerializer):
+
+def query_list_param(request, name):
+    # ?fields=id,name или ?fields=id&fields=name → {'id', 'name'}
+    values = set()
+    for raw in request.query_params.getlist(name):
+        values.update(part.strip() for part in raw.split(',') if part.strip())
+    return values
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    Поддерживает ?fields= (только перечисленные поля) и ?expand= (вложенные
+    объекты вместо id). Параметры действуют только на верхний уровень ответа
+    и только на чтение: при записи они убрали бы обязательные поля или
+    подменили бы записываемую связь вложенным объектом только для чтения.
+    """
+    # имя в ?expand= → (класс сериализатора, source)
+    expandable_fields = {}
+
+    def _is_top_level(self):
+        parent = self.parent
+        return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in permissions.SAFE_METHODS or not self._is_top_level():
+            return fields
+
+        for name in query_list_param(request, 'expand') & set(self.expandable_fields):
+            serializer_class, source = self.expandable_fields[name]
+            options = {'source': source} if source != name else {}
+            fields[name] = serializer_class(read_only=True, **options)
+
+        requested = query_list_param(request, 'fields')
+        if requested:
+            for name in set(fields) - requested:
+                fields.pop(name)
+        return fields
+
+
+class StudentSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Student
         fields = '__all__'
 
-class CourseSerializer(serializers.ModelSerializer):
+class TeacherSerializer(DynamicFieldsModelSerializer):
     class Meta:
-        model = Course
+        model = Teacher
         fields = '__all__'
 
-class TeacherSerializer(serializers.ModelSerializer):
+class CourseSerializer(DynamicFieldsModelSerializer):
+    expandable_fields = {
+        'teacher': (TeacherSerializer, 'teacher'),
+    }
+
     class Meta:
-        model = Teacher
+        model = Course
         fields = '__all__'
 
-class EnrollmentSerializer(serializers.ModelSerializer):
+class EnrollmentSerializer(DynamicFieldsModelSerializer):
+    expandable_fields = {
+        'student': (StudentSerializer, 'student'),
+        'course': (CourseSerializer, 'course'),
+    }
+
     class Meta:
         model = Enrollment
         fields = '__all__'
 
-class GradeSerializer(serializers.ModelSerializer):
+class GradeSerializer(DynamicFieldsModelSerializer):
+    expandable_fields = {
+        'enrollment': (EnrollmentSerializer, 'enrollment'),
+        'student': (StudentSerializer, 'enrollment.student'),
+        'course': (CourseSerializer, 'enrollment.course'),
+    }
+
     class Meta:
         model = Grade
         fields = '__all__'
 
-class DocumentSerializer(serializers.ModelSerializer):
+class DocumentSerializer(DynamicFieldsModelSerializer):
+    expandable_fields = {
+        'course': (CourseSerializer, 'course'),
+    }
+
     class Meta:
         model = Document
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'filename', 'size', 'sha256', 'received', 'status', 'chunk_size',
+                  'title', 'description', 'file_type', 'course', 'document', 'created_at', 'updated_at']
+        read_only_fields = ['received', 'status', 'document', 'created_at', 'updated_at']
+
+    def get_chunk_size(self, obj):
+        from .uploads import options
+        return options()['CHUNK_SIZE']
+
+    def validate_sha256(self, value):
+        value = value.lower()
+        if len(value) != 64 or any(c not in '0123456789abcdef' for c in value):
+            raise serializers.ValidationError('ожидается SHA-256 в hex (64 символа)')
+        return value
+
+    def validate_size(self, value):
+        from .uploads import options
+        if value <= 0:
+            raise serializers.ValidationError('пустой файл')
+        if value > options()['MAX_FILE_SIZE']:
+            raise serializers.ValidationError(f'файл больше {options()["MAX_FILE_SIZE"]} байт')
+        return value
+
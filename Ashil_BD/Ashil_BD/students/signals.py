@@ -0,0 +1,198 @@
+import os
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import cache as page_cache
+from . import documents, extraction, leaderboard, realtime, search, stats, storage, thumbnails
+from .models import (
+    Announcement, Assignment, ChatMessage, Course, CourseStats, Document, Enrollment, Grade, Schedule, SnakeScore,
+    Student, StudentStats, Teacher,
+)
+
+
+def _enrollment_keys(enrollment_id):
+    # (student_id, course_id) или None, если запись уже удалена
+    return Enrollment.objects.filter(pk=enrollment_id).values_list('student_id', 'course_id').first()
+
+
+def _grade_keys(grade):
+    if Grade.enrollment.is_cached(grade):
+        return grade.enrollment.student_id, grade.enrollment.course_id
+    return _enrollment_keys(grade.enrollment_id)
+
+
+# 📊 Статистика дашборда
+@receiver(post_save, sender=Course)
+def create_course_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        CourseStats.objects.get_or_create(course=instance)
+
+
+@receiver(post_save, sender=Student)
+def create_student_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        StudentStats.objects.get_or_create(student=instance)
+
+
+@receiver(pre_delete, sender=StudentStats)
+def withdraw_from_leaderboard(sender, instance, **kwargs):
+    # до каскадного удаления оценок: их post_delete не должен вернуть студента в рейтинг
+    if instance.rank_key is not None:
+        leaderboard.withdraw(instance.student_id)
+
+
+@receiver(pre_save, sender=Enrollment)
+def remember_enrollment(sender, instance, raw=False, **kwargs):
+    instance._stats_previous = None
+    if instance.pk and not raw:
+        instance._stats_previous = _enrollment_keys(instance.pk)
+
+
+@receiver(post_save, sender=Enrollment)
+def enrollment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_stats_previous', None)
+    if created or previous is None:
+        stats.apply_enrollment_change(instance.course_id, instance.student_id, 1)
+    elif previous != (instance.student_id, instance.course_id):
+        # запись перенесли на другой курс/студента — пересчитываем затронутые строки
+        stats.refresh_student_stats({previous[0], instance.student_id})
+        stats.refresh_course_stats({previous[1], instance.course_id})
+
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, **kwargs):
+    stats.apply_enrollment_change(instance.course_id, instance.student_id, -1, create_missing=False)
+
+
+@receiver(pre_save, sender=Grade)
+def remember_grade(sender, instance, raw=False, **kwargs):
+    instance._stats_previous = None
+    if instance.pk and not raw:
+        instance._stats_previous = Grade.objects.filter(pk=instance.pk).values_list('enrollment_id', 'score').first()
+
+
+@receiver(post_save, sender=Grade)
+def grade_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_stats_previous', None)
+    old_enrollment_id, old_score = previous or (instance.enrollment_id, None)
+    if old_enrollment_id != instance.enrollment_id:
+        keys = _enrollment_keys(old_enrollment_id)
+        if keys:
+            stats.apply_score_change(keys[1], keys[0], old_score, None)
+        old_score = None
+    keys = _grade_keys(instance)
+    if keys:
+        stats.apply_score_change(keys[1], keys[0], old_score, instance.score)
+
+
+@receiver(post_delete, sender=Grade)
+def grade_deleted(sender, instance, **kwargs):
+    # при каскадном удалении Enrollment оценки удаляются раньше самой записи
+    keys = _enrollment_keys(instance.enrollment_id)
+    if keys:
+        stats.apply_score_change(keys[1], keys[0], instance.score, None, create_missing=False)
+
+
+# 🗄️ Версии моделей для кэша страниц (см. cache.py)
+CACHED_MODELS = (Student, Course, Teacher, Enrollment, Grade, Document, Schedule, Assignment, SnakeScore)
+
+
+def bump_cache_version(sender, **kwargs):
+    # после коммита: иначе параллельный запрос успеет закэшировать старые данные под новой версией
+    transaction.on_commit(lambda: page_cache.bump_version(sender))
+
+
+for _model in CACHED_MODELS:
+    post_save.connect(bump_cache_version, sender=_model, dispatch_uid=f'page_cache_save_{_model.__name__}')
+    post_delete.connect(bump_cache_version, sender=_model, dispatch_uid=f'page_cache_delete_{_model.__name__}')
+
+
+# 💬 Рассылка новых сообщений чата подключённым WebSocket-клиентам
+@receiver(post_save, sender=ChatMessage)
+def chat_message_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        transaction.on_commit(lambda: realtime.publish_message(instance))
+
+
+# 🖼️ Миниатюры фото студентов (см. thumbnails.py)
+@receiver(post_save, sender=Student)
+def student_photo_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    photo_name = instance.photo.name if instance.photo else ''
+    stale = instance.thumbnail_source
+    if stale and stale != photo_name:
+        Student.objects.filter(pk=instance.pk).update(thumbnail_source='')
+        instance.thumbnail_source = ''
+        transaction.on_commit(lambda: thumbnails.delete_thumbnails(stale))
+    if photo_name and photo_name != instance.thumbnail_source:
+        transaction.on_commit(lambda: thumbnails.schedule(instance.pk, photo_name))
+
+
+@receiver(post_delete, sender=Student)
+def student_photo_deleted(sender, instance, **kwargs):
+    if instance.thumbnail_source:
+        transaction.on_commit(lambda: thumbnails.delete_thumbnails(instance.thumbnail_source))
+
+
+# 📎 Метаданные документа (см. documents.py): считаются один раз, пока файл под рукой
+@receiver(pre_save, sender=Document)
+def fill_document_metadata(sender, instance, raw=False, **kwargs):
+    if raw or not instance.file:
+        return
+    # новый загруженный файл ещё не сохранён в хранилище (_committed=False)
+    if not instance.file._committed:
+        instance.original_name = os.path.basename(instance.file.name)[:255]
+    if not instance.file._committed or instance.file_size is None:
+        try:
+            metadata = documents.file_metadata(instance.file)
+        except OSError:
+            return
+        for name, value in metadata.items():
+            setattr(instance, name, value)
+
+
+@receiver(post_save, sender=Document)
+def extract_document_text(sender, instance, raw=False, **kwargs):
+    # текст для поиска — в пуле процессов после коммита (см. extraction.py)
+    if not raw and instance.file:
+        transaction.on_commit(lambda: extraction.schedule(instance.pk))
+
+
+@receiver(post_delete, sender=Document)
+def release_document_file(sender, instance, **kwargs):
+    # файл может быть общим с другими документами — удаляем только последнюю ссылку
+    name = instance.file.name
+    transaction.on_commit(lambda: storage.release_blob(name))
+
+
+# 🔎 Полнотекстовый индекс (см. search.py) — в той же транзакции, что и сама строка
+def update_search_index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_objects(sender, [instance.pk])
+
+
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove_objects(sender, [instance.pk])
+
+
+for _model in (Course, Document, Announcement, Teacher):
+    post_save.connect(update_search_index, sender=_model, dispatch_uid=f'search_save_{_model.__name__}')
+    post_delete.connect(remove_from_search_index, sender=_model, dispatch_uid=f'search_delete_{_model.__name__}')
+
+
+
+# ⏰ Перенос срока задания возвращает его в очередь напоминаний (см. reminders.py)
+@receiver(pre_save, sender=Assignment)
+def reset_deadline_reminder(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None or instance.reminder_sent_at is None:
+        return
+    old_due = Assignment.objects.filter(pk=instance.pk).values_list('due_date', flat=True).first()
+    if old_due is not None and old_due != instance.due_date:
+        instance.reminder_sent_at = None
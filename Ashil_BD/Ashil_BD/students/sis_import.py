@@ -0,0 +1,309 @@
+"""
+Потоковый импорт из SIS (команда import_sis).
+
+Файл читается построчно (CSV или NDJSON), строки копятся в пакет размера
+batch_size и пишутся одной транзакцией на пакет. Внешние ключи (студент по
+email или id, курс по коду или id, преподаватель по email или имени)
+разрешаются через словари, построенные один раз при старте импорта и
+пополняемые новыми строками, — без запроса на строку.
+"""
+import csv
+import json
+import sys
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from . import bulk
+from . import cache as page_cache
+from . import search, stats
+from .models import Course, Student, Teacher
+
+
+class RowError(Exception):
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def read_rows(path, fmt):
+    """Генератор (номер строки, dict) — весь файл в памяти не держим."""
+    stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+    try:
+        if fmt == 'csv':
+            for number, row in enumerate(csv.DictReader(stream), start=2):
+                yield number, {k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k}
+        else:
+            for number, line in enumerate(stream, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield number, json.loads(line)
+                except ValueError as exc:
+                    yield number, RowError({'json': [str(exc)]})
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def _required(record, name):
+    value = record.get(name)
+    if value in (None, ''):
+        raise RowError({name: ['обязательное поле']})
+    return value
+
+
+def _int(record, name, default=None):
+    value = record.get(name)
+    if value in (None, ''):
+        if default is not None:
+            return default
+        raise RowError({name: ['обязательное поле']})
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError({name: ['должно быть целым числом']})
+
+
+class Lookups:
+    """Словари внешних ключей, один проход по каждой таблице."""
+
+    def __init__(self):
+        self.student_ids = set()
+        self.student_by_email = {}
+        for pk, email in Student.objects.values_list('pk', 'email').iterator(chunk_size=5000):
+            self.student_ids.add(pk)
+            if email:
+                self.student_by_email.setdefault(email.lower(), pk)
+        self.course_ids = set()
+        self.course_by_code = {}
+        self.course_by_title = {}
+        for pk, code, title in Course.objects.values_list('pk', 'code', 'title').iterator(chunk_size=5000):
+            self.course_ids.add(pk)
+            if code:
+                self.course_by_code.setdefault(code, pk)
+            self.course_by_title.setdefault(title, pk)
+        self.teacher_by_email = {}
+        self.teacher_by_name = {}
+        for pk, email, name in Teacher.objects.values_list('pk', 'email', 'name'):
+            if email:
+                self.teacher_by_email.setdefault(email.lower(), pk)
+            self.teacher_by_name.setdefault(name, pk)
+
+    def student(self, value):
+        value = str(value).strip()
+        if value.isdigit() and int(value) in self.student_ids:
+            return int(value)
+        pk = self.student_by_email.get(value.lower())
+        if pk is None:
+            raise RowError({'student': [f'студент {value} не найден']})
+        return pk
+
+    def course(self, value):
+        value = str(value).strip()
+        pk = self.course_by_code.get(value)
+        if pk is None and value.isdigit() and int(value) in self.course_ids:
+            pk = int(value)
+        if pk is None:
+            raise RowError({'course': [f'курс {value} не найден']})
+        return pk
+
+    def teacher(self, value):
+        if value in (None, ''):
+            return None
+        value = str(value).strip()
+        pk = self.teacher_by_email.get(value.lower()) or self.teacher_by_name.get(value)
+        if pk is None:
+            raise RowError({'teacher': [f'преподаватель {value} не найден']})
+        return pk
+
+
+class StudentImporter:
+    """Ключ — email: существующие студенты обновляются, новые создаются."""
+
+    def __init__(self, lookups):
+        self.lookups = lookups
+
+    def prepare(self, record):
+        email = str(_required(record, 'email')).strip()
+        try:
+            validate_email(email)
+        except ValidationError:
+            raise RowError({'email': ['некорректный email']})
+        return {'name': str(_required(record, 'name'))[:100], 'age': _int(record, 'age'), 'email': email}
+
+    def write(self, rows):
+        lookups = self.lookups
+        latest = {}
+        for index, row in enumerate(rows):
+            latest[row['email'].lower()] = index  # повтор email в пакете — побеждает последняя строка
+        existing = []
+        new = []
+        for key, index in latest.items():
+            row = rows[index]
+            pk = lookups.student_by_email.get(key)
+            if pk is None:
+                new.append(Student(**row))
+            else:
+                existing.append(Student(pk=pk, **row))
+        with transaction.atomic():
+            Student.objects.bulk_update(existing, ['name', 'age'], batch_size=bulk.WRITE_BATCH)
+            created = Student.objects.bulk_create(new, batch_size=bulk.WRITE_BATCH)
+            stats.refresh_student_stats([s.pk for s in created])
+            transaction.on_commit(lambda: page_cache.bump_version(Student))
+        for student in created:
+            lookups.student_ids.add(student.pk)
+            lookups.student_by_email[student.email.lower()] = student.pk
+        created_keys = {s.email.lower() for s in created}
+        results = []
+        for index, row in enumerate(rows):
+            key = row['email'].lower()
+            if latest[key] != index:
+                results.append({'status': 'unchanged', 'id': lookups.student_by_email[key]})
+            else:
+                results.append({'status': 'created' if key in created_keys else 'updated',
+                                'id': lookups.student_by_email[key]})
+        return results
+
+
+class CourseImporter:
+    """Ключ — code (если пуст — title)."""
+
+    def __init__(self, lookups):
+        self.lookups = lookups
+
+    def prepare(self, record):
+        return {
+            'title': str(_required(record, 'title'))[:150],
+            'code': str(record.get('code') or '')[:20],
+            'description': str(record.get('description') or ''),
+            'teacher_id': self.lookups.teacher(record.get('teacher')),
+            'duration': _int(record, 'duration', default=0),
+        }
+
+    def _existing(self, row):
+        if row['code']:
+            return self.lookups.course_by_code.get(row['code'])
+        return self.lookups.course_by_title.get(row['title'])
+
+    def write(self, rows):
+        lookups = self.lookups
+        latest = {}
+        for index, row in enumerate(rows):
+            latest[row['code'] or ('title', row['title'])] = index
+        existing, new = [], []
+        for index in latest.values():
+            row = rows[index]
+            pk = self._existing(row)
+            (new if pk is None else existing).append(Course(pk=pk, **row))
+        with transaction.atomic():
+            Course.objects.bulk_update(existing, ['title', 'description', 'teacher', 'duration'],
+                                       batch_size=bulk.WRITE_BATCH)
+            created = Course.objects.bulk_create(new, batch_size=bulk.WRITE_BATCH)
+            stats.refresh_course_stats([c.pk for c in created])
+            # bulk-запись не шлёт сигналы — индекс поиска обновляем сами
+            search.index_objects(Course, [c.pk for c in existing] + [c.pk for c in created])
+            transaction.on_commit(lambda: page_cache.bump_version(Course))
+        for course in created:
+            lookups.course_ids.add(course.pk)
+            if course.code:
+                lookups.course_by_code[course.code] = course.pk
+            lookups.course_by_title.setdefault(course.title, course.pk)
+        created_ids = {c.pk for c in created}
+        results = []
+        for index, row in enumerate(rows):
+            pk = self._existing(row)
+            if latest[row['code'] or ('title', row['title'])] != index:
+                results.append({'status': 'unchanged', 'id': pk})
+            else:
+                results.append({'status': 'created' if pk in created_ids else 'updated', 'id': pk})
+        return results
+
+
+class EnrollmentImporter:
+    def __init__(self, lookups):
+        self.lookups = lookups
+
+    def prepare(self, record):
+        return {
+            'student': self.lookups.student(_required(record, 'student')),
+            'course': self.lookups.course(_required(record, 'course')),
+        }
+
+    def write(self, rows):
+        return bulk.upsert_enrollments(rows)
+
+
+class GradeImporter:
+    def __init__(self, lookups):
+        self.lookups = lookups
+
+    def prepare(self, record):
+        score = record.get('score')
+        if score not in (None, ''):
+            try:
+                score = Decimal(str(score))
+            except InvalidOperation:
+                raise RowError({'score': ['должно быть числом']})
+        return {
+            'student': self.lookups.student(_required(record, 'student')),
+            'course': self.lookups.course(_required(record, 'course')),
+            'score': score,
+            'comment': record.get('comment') or '',
+        }
+
+    def write(self, rows):
+        return bulk.upsert_grades(rows)
+
+
+IMPORTERS = {
+    'students': StudentImporter,
+    'courses': CourseImporter,
+    'enrollments': EnrollmentImporter,
+    'grades': GradeImporter,
+}
+
+
+def run_import(kind, rows, batch_size=1000, on_reject=None, on_batch=None):
+    """
+    rows — итератор (номер строки, dict | RowError).
+    Возвращает счётчики {'created', 'updated', 'unchanged', 'error'}.
+    """
+    importer = IMPORTERS[kind](Lookups())
+    totals = {'created': 0, 'updated': 0, 'unchanged': 0, 'error': 0}
+    batch, numbers = [], []
+
+    def reject(number, errors):
+        totals['error'] += 1
+        if on_reject is not None:
+            on_reject(number, errors)
+
+    def flush():
+        for number, result in zip(numbers, importer.write(batch)):
+            if result['status'] == 'error':
+                reject(number, result['errors'])
+            else:
+                totals[result['status']] += 1
+        batch.clear()
+        numbers.clear()
+        if on_batch is not None:
+            on_batch(totals)
+
+    for number, record in rows:
+        try:
+            if isinstance(record, RowError):
+                raise record
+            if not isinstance(record, dict):
+                raise RowError({'row': ['ожидается объект']})
+            batch.append(importer.prepare(record))
+            numbers.append(number)
+        except RowError as exc:
+            reject(number, exc.errors)
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return totals
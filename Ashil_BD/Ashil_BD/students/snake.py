@@ -0,0 +1,271 @@
+"""
+Общая таблица рекордов «Змейки».
+
+Страница игры копит результаты и отправляет их пачкой (POST
+snake-game/scores/), сервер не пишет их в БД по одному: ScoreBuffer
+сворачивает пачки в памяти до строки на студента — лучший счёт, число
+игр, сумма очков — и раз в FLUSH_INTERVAL (или когда набралось BATCH_SIZE
+студентов) прибавляет их к SnakeScore одним UPDATE с F()-выражениями —
+база сама складывает с текущими значениями, поэтому параллельные сбросы
+(несколько процессов) не теряют игр. Сотня игр за перемену от тридцати
+студентов — тридцать строк одной транзакцией.
+
+Играть за студента можно только по его личной ссылке: ?player=<подпись>
+(player_token, как ссылки календаря в ical.py). Её видит персонал на
+странице студента; результаты принимаются только с действующей подписью.
+
+Гарантии как у буфера чата (chat_buffer.py): результат попадает в БД не
+позже чем через FLUSH_INTERVAL; при аварийном завершении процесса теряется
+то, что не успели сбросить; при штатной остановке буфер дописывается через
+atexit; сбой записи повторяется до max_retries раз.
+
+Таблица (общая и по курсу) кэшируется в версионированном кэше страниц,
+версия SnakeScore поднимается после каждого сброса. Страница опрашивает
+её раз в POLL_SECONDS, ответ с ETag — неизменившаяся таблица отдаётся 304.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, IntegerField, When
+from django.db.models.functions import Greatest
+from django.urls import reverse
+from django.utils import timezone
+
+from . import cache as page_cache
+from .cache import cached_context
+from .models import Enrollment, SnakeScore, Student
+
+logger = logging.getLogger(__name__)
+
+SALT = 'students.snake'
+
+
+def options():
+    defaults = {
+        'BUFFERED': True,
+        'BATCH_SIZE': 500,
+        'FLUSH_INTERVAL': 2.0,
+        'MAX_BATCH': 50,  # результатов в одном запросе
+        'MAX_SCORE': 100000,
+        'TOP': 10,
+        'POLL_SECONDS': 10,
+    }
+    defaults.update(getattr(settings, 'SNAKE_LEADERBOARD', {}))
+    return defaults
+
+
+def player_token(student_id):
+    return signing.Signer(salt=SALT).sign(str(student_id))
+
+
+def parse_player(token):
+    """id студента или None, если подпись не сходится."""
+    try:
+        value = signing.Signer(salt=SALT).unsign(token)
+    except (signing.BadSignature, TypeError):
+        return None
+    return int(value) if value.isdigit() else None
+
+
+def play_url(student_id):
+    return f"{reverse('snake_game')}?player={player_token(student_id)}"
+
+
+def merge(pending, student_id, score):
+    """Добавляет одну игру к агрегату студента: [лучший счёт, игр, сумма]."""
+    row = pending.get(student_id)
+    if row is None:
+        pending[student_id] = [score, 1, score]
+    else:
+        row[0] = max(row[0], score)
+        row[1] += 1
+        row[2] += score
+
+
+def _per_student(known, rows, column):
+    return Case(*[When(student_id=pk, then=rows[pk][column]) for pk in known], output_field=IntegerField())
+
+
+def write(rows):
+    """
+    Прибавляет агрегаты {student_id: [best, games, total]} к SnakeScore.
+    Недостающие строки вставляются нулевыми (конфликт — пропуск), затем один
+    UPDATE на всю пачку: best = max(best, ...), games = games + ..., total = total + ....
+    Значения складывает сама база, без чтения текущих, — параллельный сброс
+    того же студента не затрёт чужие игры. Несуществующие студенты
+    отбрасываются. Возвращает число записанных строк.
+    """
+    with transaction.atomic():
+        known = sorted(Student.objects.filter(pk__in=list(rows)).values_list('pk', flat=True))
+        if not known:
+            return 0
+        SnakeScore.objects.bulk_create([SnakeScore(student_id=pk) for pk in known], ignore_conflicts=True)
+        written = SnakeScore.objects.filter(student_id__in=known).update(
+            best=Greatest(F('best'), _per_student(known, rows, 0)),
+            games=F('games') + _per_student(known, rows, 1),
+            total=F('total') + _per_student(known, rows, 2),
+            updated_at=timezone.now(),
+        )
+        # bulk_create и update() не шлют post_save — версию для кэша таблицы поднимаем сами
+        transaction.on_commit(lambda: page_cache.bump_version(SnakeScore))
+    return written
+
+
+class ScoreBuffer:
+    def __init__(self, batch_size=500, flush_interval=2.0, max_retries=3, autostart=True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.autostart = autostart
+
+        self._pending = {}  # student_id -> [best, games, total]
+        self._since = None  # когда пришёл самый старый несброшенный результат
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.stats = {'submitted': 0, 'flushed': 0, 'batches': 0, 'dropped': 0}
+
+    def submit(self, scores):
+        """Сворачивает пачку [(student_id, score), ...] в буфер и сразу возвращается."""
+        if self._closed:
+            raise RuntimeError('буфер рекордов закрыт')
+        with self._condition:
+            for student_id, score in scores:
+                merge(self._pending, student_id, score)
+                self.stats['submitted'] += 1
+            if self._pending and self._since is None:
+                self._since = time.monotonic()
+                self._condition.notify_all()
+            elif len(self._pending) >= self.batch_size:
+                self._condition.notify_all()
+        if self.autostart:
+            self.start()
+
+    def pending_count(self):
+        with self._condition:
+            return len(self._pending)
+
+    def flush(self):
+        """Сбрасывает накопленное пакетами по batch_size студентов. Возвращает число записанных строк."""
+        written = 0
+        with self._flush_lock:
+            with self._condition:
+                pending, self._pending, self._since = self._pending, {}, None
+            ids = list(pending)
+            for start in range(0, len(ids), self.batch_size):
+                written += self._write({pk: pending[pk] for pk in ids[start:start + self.batch_size]})
+        return written
+
+    def _write(self, rows, attempt=1):
+        try:
+            written = write(rows)
+        except Exception:
+            if attempt < self.max_retries:
+                logger.exception('Не удалось записать рекорды (%s студентов), попытка %s', len(rows), attempt)
+                time.sleep(min(self.flush_interval, 1.0))
+                return self._write(rows, attempt + 1)
+            logger.exception('Рекорды %s студентов потеряны после %s попыток', len(rows), attempt)
+            self.stats['dropped'] += sum(row[1] for row in rows.values())
+            return 0
+        self.stats['flushed'] += sum(row[1] for row in rows.values())
+        self.stats['batches'] += 1
+        return written
+
+    def _due(self):
+        if not self._pending:
+            return None
+        if len(self._pending) >= self.batch_size:
+            return 0
+        return max(0.0, self._since + self.flush_interval - time.monotonic())
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    due = self._due()
+                    if due == 0 or (self._closed and self._pending):
+                        break
+                    if self._closed:
+                        return
+                    self._condition.wait(due)
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._condition:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name='snake-score-buffer', daemon=True)
+                self._thread.start()
+
+    def close(self, timeout=5.0):
+        """Останавливает фоновый поток, дописав буфер."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                config = options()
+                _buffer = ScoreBuffer(batch_size=config['BATCH_SIZE'], flush_interval=config['FLUSH_INTERVAL'])
+                atexit.register(_buffer.close)
+    return _buffer
+
+
+def submit_scores(scores):
+    """Точка входа для view: буфер, если включён, иначе сразу одна запись на пачку."""
+    if options()['BUFFERED']:
+        get_buffer().submit(scores)
+        return
+    pending = {}
+    for student_id, score in scores:
+        merge(pending, student_id, score)
+    if pending:
+        write(pending)
+
+
+def build_table(course_id, limit):
+    scores = SnakeScore.objects.filter(best__gt=0)
+    if course_id is not None:
+        scores = scores.filter(student__in=Enrollment.objects.filter(course_id=course_id).values('student_id'))
+    rows = []
+    for index, (student_id, name, best, games) in enumerate(
+            scores.order_by('-best', 'student_id').values_list('student_id', 'student__name', 'best', 'games')[:limit]):
+        # равные рекорды делят место: 1, 2, 2, 4
+        rank = rows[-1]['rank'] if rows and rows[-1]['best'] == best else index + 1
+        rows.append({'rank': rank, 'student_id': student_id, 'name': name, 'best': best, 'games': games})
+    etag = hashlib.sha256(json.dumps(rows, ensure_ascii=False).encode('utf-8')).hexdigest()[:32]
+    return {'course_id': course_id, 'scores': rows, 'etag': f'"{etag}"'}
+
+
+def table(course_id=None, limit=None):
+    """Топ рекордов, общий или среди записанных на курс: {'course_id', 'scores', 'etag'}."""
+    limit = limit or options()['TOP']
+    models = (SnakeScore, Student) if course_id is None else (SnakeScore, Student, Enrollment)
+    return cached_context('snake', models, lambda: build_table(course_id, limit), course_id or 'all', limit)
+
+
+def personal_best(student_id):
+    return SnakeScore.objects.filter(student_id=student_id).values_list('best', flat=True).first() or 0
@@ -0,0 +1,205 @@
+"""
+Инкрементальное обновление таблиц CourseStats / StudentStats.
+
+Дашборд читает готовые строки вместо агрегатов по Enrollment/Grade.
+Каждое изменение оценки превращается в один UPDATE с F-выражениями
+(count/sum/avg/min/max), пересчёт по живым данным нужен только когда
+удаляется текущий минимум или максимум. Рейтинг студентов (leaderboard.py)
+поправляется здесь же, после каждого изменения StudentStats.score_avg.
+"""
+from decimal import Decimal
+
+from django.db import models
+from django.db.models import Avg, Case, Count, F, FloatField, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import Cast, Greatest, Least
+
+from . import leaderboard
+from .models import Course, CourseStats, Grade, Student, StudentStats
+
+
+def _stats_targets(course_id, student_id):
+    return (
+        (CourseStats, 'course_id', course_id),
+        (StudentStats, 'student_id', student_id),
+    )
+
+
+def _to_decimal(score):
+    if score is None or isinstance(score, Decimal):
+        return score
+    return Decimal(str(score))
+
+
+def _score_delta_updates(old_score, new_score):
+    count_delta = (new_score is not None) - (old_score is not None)
+    sum_delta = (new_score or Decimal(0)) - (old_score or Decimal(0))
+
+    updates = {}
+    if count_delta:
+        updates['grade_count'] = F('grade_count') + count_delta
+    if sum_delta:
+        updates['score_sum'] = F('score_sum') + sum_delta
+
+    # В UPDATE правая часть видит старые значения, поэтому среднее
+    # считаем сразу по новым count/sum
+    new_count = F('grade_count') + count_delta
+    new_sum = Cast(F('score_sum') + sum_delta, FloatField())
+    updates['score_avg'] = Case(
+        When(Q(grade_count__gt=-count_delta), then=new_sum / Cast(new_count, FloatField())),
+        default=Value(None),
+        output_field=FloatField(),
+    )
+
+    if new_score is not None:
+        value = Value(new_score, output_field=models.DecimalField(max_digits=5, decimal_places=2))
+        updates['score_min'] = Case(
+            When(score_min__isnull=True, then=value),
+            default=Least('score_min', value),
+        )
+        updates['score_max'] = Case(
+            When(score_max__isnull=True, then=value),
+            default=Greatest('score_max', value),
+        )
+    return updates
+
+
+def apply_score_change(course_id, student_id, old_score, new_score, create_missing=True):
+    """
+    Применяет изменение одной оценки old_score → new_score (None = нет оценки).
+
+    create_missing=False для удалений: при каскадном удалении курса или
+    студента строка статистики уже удалена, и создавать её заново нельзя.
+    """
+    old_score = _to_decimal(old_score)
+    new_score = _to_decimal(new_score)
+    if old_score == new_score:
+        return
+    updates = _score_delta_updates(old_score, new_score)
+    for model, key, pk in _stats_targets(course_id, student_id):
+        qs = model.objects.filter(**{key: pk})
+        if not qs.update(**updates):
+            # строки ещё нет (данные до миграции) — считаем её целиком
+            if create_missing:
+                _refresh(model, [pk])
+            continue
+        if old_score is not None:
+            row = qs.values('score_min', 'score_max').first()
+            if row and old_score in (row['score_min'], row['score_max']):
+                _refresh_extremes(model, key, pk)
+        if model is StudentStats:
+            leaderboard.sync([pk])
+
+
+def apply_enrollment_change(course_id, student_id, delta, create_missing=True):
+    for model, key, pk in _stats_targets(course_id, student_id):
+        field = 'enrollment_count' if model is CourseStats else 'course_count'
+        updated = model.objects.filter(**{key: pk}).update(**{field: F(field) + delta})
+        if not updated and create_missing:
+            _refresh(model, [pk])
+
+
+def _refresh_extremes(model, key, pk):
+    lookup = 'enrollment__course_id' if model is CourseStats else 'enrollment__student_id'
+    extremes = Grade.objects.filter(**{lookup: pk, 'score__isnull': False}).aggregate(
+        score_min=Min('score'), score_max=Max('score'),
+    )
+    model.objects.filter(**{key: pk}).update(**extremes)
+
+
+def live_course_stats(course_ids=None):
+    """Агрегаты по живым данным — то, что раньше считал дашборд на каждый запрос."""
+    qs = Course.objects.all()
+    if course_ids is not None:
+        qs = qs.filter(pk__in=course_ids)
+    return qs.annotate(
+        enrollment_count=Count('enrollments'),
+        grade_count=Count('enrollments__grade__score'),
+        score_sum=Sum('enrollments__grade__score'),
+        score_avg=Avg('enrollments__grade__score'),
+        score_min=Min('enrollments__grade__score'),
+        score_max=Max('enrollments__grade__score'),
+    ).values('pk', 'enrollment_count', 'grade_count', 'score_sum', 'score_avg', 'score_min', 'score_max')
+
+
+def live_student_stats(student_ids=None):
+    qs = Student.objects.all()
+    if student_ids is not None:
+        qs = qs.filter(pk__in=student_ids)
+    return qs.annotate(
+        course_count=Count('enrollments'),
+        grade_count=Count('enrollments__grade__score'),
+        score_sum=Sum('enrollments__grade__score'),
+        score_avg=Avg('enrollments__grade__score'),
+        score_min=Min('enrollments__grade__score'),
+        score_max=Max('enrollments__grade__score'),
+    ).values('pk', 'course_count', 'grade_count', 'score_sum', 'score_avg', 'score_min', 'score_max')
+
+
+STATS_FIELDS = {
+    CourseStats: ('course', live_course_stats,
+                  ['enrollment_count', 'grade_count', 'score_sum', 'score_avg', 'score_min', 'score_max']),
+    StudentStats: ('student', live_student_stats,
+                   ['course_count', 'grade_count', 'score_sum', 'score_avg', 'score_min', 'score_max']),
+}
+
+
+def _refresh(model, pks=None, batch_size=1000):
+    key, live, fields = STATS_FIELDS[model]
+    rows = []
+    total = 0
+    for row in live(pks).iterator(chunk_size=batch_size):
+        pk = row.pop('pk')
+        row['score_sum'] = row['score_sum'] or 0
+        if row['score_avg'] is not None:
+            row['score_avg'] = float(row['score_avg'])
+        rows.append(model(**{f'{key}_id': pk}, **row))
+        if len(rows) >= batch_size:
+            total += _upsert(model, key, fields, rows)
+            rows = []
+    if rows:
+        total += _upsert(model, key, fields, rows)
+    if model is StudentStats:
+        if pks is None:
+            leaderboard.rebuild()  # пересчёт всех строк — дерево дешевле собрать заново
+        else:
+            leaderboard.sync(pks)
+    return total
+
+
+def _upsert(model, key, fields, rows):
+    model.objects.bulk_create(rows, update_conflicts=True, unique_fields=[key], update_fields=fields)
+    return len(rows)
+
+
+def refresh_course_stats(course_ids=None):
+    """Пересчитывает строки CourseStats по живым данным (все, если course_ids=None)."""
+    return _refresh(CourseStats, course_ids)
+
+
+def refresh_student_stats(student_ids=None):
+    return _refresh(StudentStats, student_ids)
+
+
+def verify_stats(model):
+    """Возвращает список расхождений между таблицей статистики и живыми агрегатами."""
+    key, live, fields = STATS_FIELDS[model]
+    stored = {row['pk']: row for row in model.objects.values('pk', *fields)}
+    problems = []
+    for row in live().iterator(chunk_size=1000):
+        pk = row.pop('pk')
+        have = stored.pop(pk, None)
+        if have is None:
+            problems.append((pk, 'нет строки статистики'))
+            continue
+        for field in fields:
+            expected, actual = row[field], have[field]
+            if field == 'score_sum':
+                expected = expected or 0
+            if field == 'score_avg' and expected is not None and actual is not None:
+                if abs(float(expected) - actual) > 1e-6:
+                    problems.append((pk, f'{field}: {actual} != {expected}'))
+            elif expected != actual:
+                problems.append((pk, f'{field}: {actual} != {expected}'))
+    for pk in stored:
+        problems.append((pk, 'лишняя строка статистики'))
+    return problems
@@ -0,0 +1,105 @@
+"""
+Контентно-адресуемое хранение документов.
+
+Файл документа лежит по хэшу содержимого: documents/<2 символа>/<sha256>.<ext>.
+Одинаковые загрузки (та же лекция в десятке курсов) указывают на один файл;
+счётчик ссылок — число строк Document с этим именем файла (индекс
+document_file_idx), файл удаляется вместе с последней ссылкой.
+Всё, что осталось без ссылок (старые версии, сбои между шагами), убирает
+python manage.py gc_media.
+
+Переиспользование файла обновляет его mtime до записи строки Document.
+Поэтому файл моложе RELEASE_GRACE не удаляется сразу даже без ссылок:
+параллельная загрузка того же содержимого могла уже выбрать его, но ещё
+не записать свою строку. Такой файл убирает gc_media после grace-периода.
+"""
+import os
+import re
+import tempfile
+import time
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIR = 'documents'
+TEMP_PREFIX = '.upload-'
+RELEASE_GRACE = 3600  # секунды
+
+
+def blob_name(content_hash, ext):
+    ext = re.sub(r'[^a-z0-9]', '', ext.lower())
+    name = f'{BLOB_DIR}/{content_hash[:2]}/{content_hash}'
+    return f'{name}.{ext}' if ext else name
+
+
+def document_upload_to(instance, filename):
+    from . import documents
+    if not instance.content_hash:
+        # обычно уже посчитано в pre_save (signals.fill_document_metadata)
+        for name, value in documents.file_metadata(instance.file).items():
+            setattr(instance, name, value)
+    return blob_name(instance.content_hash, documents.file_extension(filename))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Имя файла уже уникально по содержимому: существующий файл не перезаписывается и не переименовывается."""
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if reuse_blob(full_path):
+            return name
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(directory, self.directory_permissions_mode)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=TEMP_PREFIX)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                if hasattr(content, 'temporary_file_path'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    out.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp, self.file_permissions_mode)
+            # две одновременные загрузки одного файла пишут одинаковое содержимое — замена безопасна
+            os.replace(tmp, full_path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return name
+
+
+def reuse_blob(path):
+    """
+    Переиспользует уже лежащий файл: обновляет mtime, чтобы ни release_blob,
+    ни gc_media его не удалили. False — файла нет (или его только что
+    удалили), содержимое нужно записать.
+    """
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+document_storage = ContentAddressedStorage()
+
+
+def release_blob(name, grace=RELEASE_GRACE):
+    """Удаляет файл, если на него больше не ссылается ни один документ и его давно не переиспользовали."""
+    from .models import Document
+    if not name or Document.objects.filter(file=name).exists():
+        return False
+    path = document_storage.path(name)
+    try:
+        if os.path.getmtime(path) > time.time() - grace:
+            return False  # свежий файл — мог быть выбран параллельной загрузкой; его уберёт gc_media
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    return True
@@ -1,3 +1,1708 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import time
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from . import storage
+from .chat_buffer import ChatWriteBuffer
+from .models import (
+    Announcement, Assignment, AssignmentScore, ChatMessage, Course, CourseStats, Document, Enrollment, Grade,
+    LeaderboardNode, Schedule, SnakeScore, Student, StudentStats, Teacher, UploadSession,
+)
+
+
+class ChatWriteBufferTests(TestCase):
+    def test_flush_writes_in_batches(self):
+        buffer = ChatWriteBuffer(batch_size=3, autostart=False)
+        events = [buffer.submit('general', f'сообщение {i}') for i in range(7)]
+        self.assertEqual(ChatMessage.objects.count(), 0)
+
+        written = buffer.flush()
+
+        self.assertEqual(len(written), 7)
+        self.assertEqual(buffer.stats['batches'], 3)
+        self.assertTrue(all(event.is_set() for event in events))
+        self.assertEqual(
+            list(ChatMessage.objects.order_by('id').values_list('message', flat=True)),
+            [f'сообщение {i}' for i in range(7)],
+        )
+
+    def test_sender_is_resolved_once(self):
+        buffer = ChatWriteBuffer(autostart=False)
+        buffer.submit('general', 'первое')
+        with self.assertNumQueries(0):
+            for i in range(10):
+                buffer.submit('general', f'ещё {i}')
+        buffer.flush()
+        self.assertEqual(ChatMessage.objects.filter(user__username='guest').count(), 11)
+
+    def test_flush_calls_on_flush_with_saved_rows(self):
+        published = []
+        buffer = ChatWriteBuffer(autostart=False, on_flush=published.extend)
+        buffer.submit('python', 'привет')
+        buffer.flush()
+        self.assertEqual(len(published), 1)
+        self.assertIsNotNone(published[0].pk)
+
+    def test_long_messages_are_truncated(self):
+        buffer = ChatWriteBuffer(autostart=False)
+        buffer.submit('general', 'x' * 5000)
+        buffer.flush()
+        self.assertEqual(len(ChatMessage.objects.get().message), 2000)
+
+
+class ChatWriteBufferThreadTests(TransactionTestCase):
+    def test_background_flush_within_interval(self):
+        buffer = ChatWriteBuffer(batch_size=100, flush_interval=0.05)
+        try:
+            written = buffer.submit('general', 'фон')
+            self.assertTrue(written.wait(5))
+            self.assertTrue(ChatMessage.objects.filter(message='фон').exists())
+            # поток уже спит на пустой очереди — новое сообщение должно его разбудить
+            written = buffer.submit('general', 'снова')
+            self.assertTrue(written.wait(5))
+            self.assertEqual(ChatMessage.objects.count(), 2)
+        finally:
+            buffer.close()
+
+    def test_close_flushes_pending_messages(self):
+        buffer = ChatWriteBuffer(batch_size=100, flush_interval=60)
+        for i in range(5):
+            buffer.submit('general', str(i))
+        buffer.close()
+        self.assertEqual(ChatMessage.objects.count(), 5)
+        with self.assertRaises(RuntimeError):
+            buffer.submit('general', 'после закрытия')
+
+    @override_settings(CHAT_WRITE_BUFFER={'ENABLED': True, 'FLUSH_INTERVAL': 0.05})
+    def test_chat_post_is_visible_after_redirect(self):
+        response = self.client.post('/chat/python/', {'message': 'через буфер'}, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'через буфер')
+
+
+class ChatHistoryTests(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        user = User.objects.create_user('talker')
+        now = timezone.now()
+        # 8 сообщений, по два с одинаковым временем; у пары 2/3 время «назад», чтобы
+        # порядок (timestamp, id) расходился с порядком id
+        minutes = [0, 1, 5, 5, 2, 2, 7, 7]
+        for i, minute in enumerate(minutes):
+            message = ChatMessage.objects.create(user=user, room='ties', message=f't{i}')
+            ChatMessage.objects.filter(pk=message.pk).update(timestamp=now + timedelta(minutes=minute))
+        ChatMessage.objects.create(user=user, room='other', message='чужая комната')
+        self.ordered = list(ChatMessage.objects.filter(room='ties').order_by('timestamp', 'id').values_list('id', flat=True))
+
+    def test_before_cursor_walks_back_through_ties(self):
+        from .chat import fetch_history
+        rows, has_more = fetch_history('ties', limit=3)
+        self.assertEqual([m.id for m in rows], self.ordered[-3:])
+        seen = [m.id for m in rows]
+        while has_more:
+            rows, has_more = fetch_history('ties', before=seen[0], limit=3)
+            seen[:0] = [m.id for m in rows]
+        self.assertEqual(seen, self.ordered)
+        # последняя (самая старая) страница неполная, и дальше ничего нет
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(fetch_history('ties', before=self.ordered[0], limit=3), ([], False))
+
+    def test_after_cursor_and_last_page(self):
+        from .chat import fetch_history
+        seen, cursor, has_more = [], self.ordered[0], True
+        while has_more:
+            rows, has_more = fetch_history('ties', after=cursor, limit=3)
+            seen += [m.id for m in rows]
+            cursor = seen[-1]
+        self.assertEqual(seen, self.ordered[1:])
+        self.assertEqual(fetch_history('ties', after=self.ordered[-1]), ([], False))
+
+    def test_history_view(self):
+        data = self.client.get('/chat/ties/messages/', {'before': self.ordered[4], 'limit': 2}).json()
+        self.assertEqual([m['id'] for m in data['messages']], self.ordered[2:4])
+        self.assertTrue(data['has_more'])
+        self.assertEqual(self.client.get('/chat/ties/messages/', {'after': 1, 'before': 2}).status_code, 400)
+
+
+class ChatArchiveTests(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from . import chat_archive
+        self.chat_archive = chat_archive
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings = override_settings(CHAT_ARCHIVE_ROOT=self.root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        chat_archive._load_segment.cache_clear()
+        self.addCleanup(chat_archive._load_segment.cache_clear)
+        self.user = User.objects.create_user('writer')
+        self.start = timezone.now() - timedelta(days=60)
+        # 10 старых сообщений (раз в час 60 дней назад) и 5 свежих
+        self.ids = []
+        for i in range(15):
+            message = ChatMessage.objects.create(user=self.user, room='python', message=f'm{i}')
+            age = self.start + timedelta(hours=i) if i < 10 else timezone.now() - timedelta(minutes=15 - i)
+            ChatMessage.objects.filter(pk=message.pk).update(timestamp=age)
+            self.ids.append(message.pk)
+
+    def archive(self):
+        from datetime import timedelta
+        return self.chat_archive.archive_old_messages(timedelta(days=30), segment_size=4)
+
+    def test_archive_moves_old_rows_and_reads_them_back(self):
+        archived, segments, size = self.archive()['python']
+        self.assertEqual((archived, segments), (10, 3))
+        self.assertGreater(size, 0)
+        self.assertEqual(ChatMessage.objects.count(), 5)
+        rows, has_more = self.chat_archive.archived_before('python', None, 100)
+        self.assertEqual([m.id for m in rows], self.ids[:10])
+        self.assertEqual([m.message for m in rows][:2], ['m0', 'm1'])
+        self.assertEqual(rows[0].user.username, 'writer')
+        self.assertFalse(has_more)
+
+    def test_history_pages_across_live_and_archive(self):
+        from .chat import fetch_history
+        self.archive()
+        rows, has_more = fetch_history('python', limit=4)
+        self.assertEqual([m.id for m in rows], self.ids[11:])
+        self.assertTrue(has_more)
+        # страница на стыке: последнее живое и три архивных
+        rows, has_more = fetch_history('python', before=self.ids[11], limit=4)
+        self.assertEqual([m.id for m in rows], self.ids[7:11])
+        self.assertTrue(has_more)
+        rows, has_more = fetch_history('python', before=self.ids[7], limit=10)
+        self.assertEqual([m.id for m in rows], self.ids[:7])
+        self.assertFalse(has_more)
+        # и вперёд: из архива в живую таблицу
+        rows, has_more = fetch_history('python', after=self.ids[8], limit=3)
+        self.assertEqual([m.id for m in rows], self.ids[9:12])
+        self.assertTrue(has_more)
+
+    def test_time_range_reads_archive(self):
+        from datetime import timedelta
+        self.archive()
+        response = self.client.get('/chat/python/messages/', {
+            'since': (self.start + timedelta(hours=2)).isoformat(),
+            'until': (self.start + timedelta(hours=6)).isoformat(),
+        })
+        self.assertEqual([m['id'] for m in response.json()['messages']], self.ids[2:6])
+        self.assertEqual(self.client.get('/chat/python/messages/', {'since': 'вчера'}).status_code, 400)
+
+    def test_dot_rooms_stay_inside_archive(self):
+        from pathlib import Path
+        from .models import ChatArchiveSegment
+        ChatMessage.objects.filter(room='python').update(room='..')
+        self.archive()
+        for path in ChatArchiveSegment.objects.values_list('path', flat=True):
+            self.assertTrue((Path(self.root) / path).resolve().is_relative_to(Path(self.root).resolve()))
+        self.assertEqual(len(os.listdir(self.root)), 1)
+        rows, _ = self.chat_archive.archived_before('..', None, 100)
+        self.assertEqual(len(rows), 10)
+
+
+class RealtimeChatTests(SimpleTestCase):
+    def test_broker_fans_out_per_room_and_drops_oldest(self):
+        import asyncio
+        from .realtime import RoomBroker
+
+        async def scenario():
+            broker = RoomBroker(queue_size=2)
+            first, second = broker.subscribe('python'), broker.subscribe('python')
+            other = broker.subscribe('web')
+            self.assertEqual(broker.connection_count(), 3)
+            self.assertEqual(broker.publish('python', '1'), 2)
+            # медленный клиент: в полной очереди вытесняется самое старое
+            broker.publish('python', '2')
+            broker.publish('python', '3')
+            self.assertEqual([first[1].get_nowait(), first[1].get_nowait()], ['2', '3'])
+            self.assertTrue(other[1].empty())
+
+            # из другого потока — через call_soon_threadsafe в loop подписчика
+            await asyncio.to_thread(broker.publish, 'web', 'из потока')
+            self.assertEqual(await asyncio.wait_for(other[1].get(), 1), 'из потока')
+
+            broker.unsubscribe('python', first)
+            broker.unsubscribe('python', second)
+            self.assertEqual(broker.connection_count('python'), 0)
+            self.assertEqual(broker.publish('python', '4'), 0)
+
+        asyncio.run(scenario())
+
+    def run_socket(self, path, messages):
+        """Подключается к ASGI-приложению, отправляет messages, возвращает отправленное сервером и сохранённое."""
+        import asyncio
+        import json
+        from unittest import mock
+        from . import realtime
+
+        saved, sent = [], []
+
+        def save(room, text):
+            saved.append((room, text))
+            realtime.broker.publish(room, {'room': room, 'message': text})
+
+        async def http(scope, receive, send):
+            raise AssertionError('WebSocket не должен уходить в Django')
+
+        async def scenario():
+            events = asyncio.Queue()
+            await events.put({'type': 'websocket.connect'})
+
+            async def send(event):
+                sent.append(event)
+                if event['type'] == 'websocket.send' and len([e for e in sent if 'text' in e]) == len(messages):
+                    await events.put({'type': 'websocket.disconnect', 'code': 1000})
+
+            for text in messages:
+                await events.put({'type': 'websocket.receive', 'text': json.dumps({'message': text})})
+            if not messages:
+                await events.put({'type': 'websocket.disconnect', 'code': 1000})
+            app = realtime.websocket_router(http)
+            await asyncio.wait_for(app({'type': 'websocket', 'path': path}, events.get, send), 5)
+
+        with mock.patch.object(realtime.chat_buffer, 'submit_message', save):
+            asyncio.run(scenario())
+        return sent, saved
+
+    def test_router_serves_rooms_the_http_route_accepts(self):
+        import json
+        from urllib.parse import quote
+        from django.urls import reverse
+        from . import realtime
+        for room in ('python', 'v2.0', 'курс по python', 'x' * 100):
+            # HTTP-маршрут и WebSocket понимают одни и те же имена
+            self.assertEqual(reverse('chat_room', args=[room]), f'/chat/{quote(room)}/')
+            sent, saved = self.run_socket(f'/ws/chat/{room}/', ['привет'])
+            self.assertEqual(sent[0], {'type': 'websocket.accept'})
+            self.assertEqual(json.loads(sent[1]['text']), {'room': room, 'message': 'привет'})
+            self.assertEqual(saved, [(room, 'привет')])
+        self.assertEqual(realtime.broker.connection_count(), 0)
+
+    def test_router_rejects_unknown_paths(self):
+        from django.urls import NoReverseMatch, reverse
+        for path in ('/ws/chat/', '/ws/chat/a/b/', f'/ws/chat/{"x" * 101}/', '/ws/other/'):
+            sent, saved = self.run_socket(path, [])
+            self.assertEqual(sent, [{'type': 'websocket.close', 'code': 4404}])
+        with self.assertRaises(NoReverseMatch):
+            reverse('chat_room', args=['x' * 101])
+
+    def test_http_goes_to_django(self):
+        import asyncio
+        from . import realtime
+        calls = []
+
+        async def http(scope, receive, send):
+            calls.append(scope['path'])
+
+        asyncio.run(realtime.websocket_router(http)({'type': 'http', 'path': '/chat/'}, None, None))
+        self.assertEqual(calls, ['/chat/'])
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        self.math = Course.objects.create(title='Математика')
+        self.physics = Course.objects.create(title='Физика')
+        self.students = [Student.objects.create(name=f'Студент {i}', age=20, email=f'st{i}@test.ru') for i in range(3)]
+
+    def assert_consistent(self):
+        from .stats import verify_stats
+        self.assertEqual(verify_stats(CourseStats), [])
+        self.assertEqual(verify_stats(StudentStats), [])
+
+    def enroll(self, student, course, score=None):
+        enrollment = Enrollment.objects.create(student=student, course=course)
+        grade = Grade.objects.create(enrollment=enrollment, score=score)
+        return enrollment, grade
+
+    def test_incremental_stats_match_live_aggregates(self):
+        first, first_grade = self.enroll(self.students[0], self.math, 60)
+        second, second_grade = self.enroll(self.students[1], self.math, 90)
+        self.enroll(self.students[0], self.physics, 75)
+        self.assert_consistent()
+        stats = CourseStats.objects.get(course=self.math)
+        self.assertEqual((stats.enrollment_count, stats.grade_count, stats.score_avg), (2, 2, 75))
+
+        # смена оценки, в том числе текущего максимума и минимума
+        second_grade.score = 40
+        second_grade.save()
+        first_grade.score = None
+        first_grade.save()
+        self.assert_consistent()
+        stats.refresh_from_db()
+        self.assertEqual((stats.grade_count, stats.score_min, stats.score_max), (1, 40, 40))
+
+        # перенос записи на другой курс
+        second.course = self.physics
+        second.save()
+        self.assert_consistent()
+
+        # удаление оценки, записи и повторная запись на курс
+        second_grade.delete()
+        first.delete()
+        self.assert_consistent()
+        self.enroll(self.students[0], self.math, 100)
+        self.assert_consistent()
+        self.assertEqual(StudentStats.objects.get(student=self.students[0]).score_avg, 87.5)
+
+        # каскадное удаление курса и студента
+        self.physics.delete()
+        self.students[2].delete()
+        self.assert_consistent()
+
+    def test_verify_reports_drift_and_rebuild_fixes_it(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        self.enroll(self.students[0], self.math, 80)
+        CourseStats.objects.filter(course=self.math).update(grade_count=5)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_stats', '--verify-only', stdout=io.StringIO(), stderr=io.StringIO())
+        call_command('rebuild_stats', '--verify', stdout=io.StringIO())
+        self.assert_consistent()
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return sorted(Student.objects.values_list('name', flat=True))
+
+    def cached(self, *parts):
+        from .cache import cached_context
+        return cached_context('students', (Student, Course), self.build, *parts)
+
+    def test_save_and_delete_bump_version_after_commit(self):
+        self.assertEqual(self.cached(), [])
+        self.assertEqual(self.cached(), [])
+        self.assertEqual(self.builds, 1)
+
+        # страница зависит только от Student и Course — запись в Teacher её не сбрасывает
+        with self.captureOnCommitCallbacks(execute=True):
+            Teacher.objects.create(name='Посторонний')
+        self.cached()
+        self.assertEqual(self.builds, 1)
+
+        # версия поднимается только после коммита, до него — прежняя страница
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            student = Student.objects.create(name='Анна', age=20, email='a@test.ru')
+            self.assertEqual(self.cached(), [])
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.cached(), ['Анна'])
+        self.assertEqual(self.builds, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            student.delete()
+        self.assertEqual(self.cached(), [])
+        self.assertEqual(self.builds, 3)
+
+        # части ключа разделяют варианты одной страницы
+        self.cached('page', 2)
+        self.assertEqual(self.builds, 4)
+
+    def test_evicted_version_does_not_revive_stale_page(self):
+        from unittest import mock
+        from django.core.cache import cache
+        from .cache import VERSION_KEY, get_versions
+        self.cached()
+        before = get_versions((Student,))
+        cache.delete(VERSION_KEY.format('students.student'))
+        with mock.patch('students.cache.time.time', return_value=time.time() + 1):
+            self.assertNotEqual(get_versions((Student,)), before)
+        self.cached()
+        self.assertEqual(self.builds, 2)
+
+    def test_version_bump_reaches_other_processes(self):
+        from unittest import mock
+        from django.core.cache.backends.filebased import FileBasedCache
+        from . import cache as page_cache
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        # два экземпляра бэкенда на одном каталоге — как два воркера gunicorn
+        worker, command = FileBasedCache(location, {}), FileBasedCache(location, {})
+        with mock.patch.object(page_cache, 'cache', worker):
+            self.cached()
+            self.cached()
+        with mock.patch.object(page_cache, 'cache', command):
+            page_cache.bump_version(Student)  # запись в другом процессе
+        with mock.patch.object(page_cache, 'cache', worker):
+            self.cached()
+        self.assertEqual(self.builds, 2)
+
+    def test_hit_and_miss_counters(self):
+        from .cache import cache_stats, reset_cache_stats
+        self.cached()
+        self.cached()
+        self.cached()
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.create(title='Курс')
+        self.cached()
+        self.assertEqual(cache_stats(), {'students': {'hits': 2, 'misses': 2, 'hit_rate': 0.5}})
+
+        staff = User.objects.create_user('staff', is_staff=True)
+        self.assertEqual(self.client.get('/cache/stats/').status_code, 302)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get('/cache/stats/').json()['pages']['students']['hits'], 2)
+
+        reset_cache_stats()
+        self.assertEqual(cache_stats(), {})
+
+    def test_student_list_view_sees_new_student(self):
+        self.client.get('/students/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.create(name='Новенький', age=19, email='n@test.ru')
+        self.assertContains(self.client.get('/students/'), 'Новенький')
+
+
+class ApiQueryCountTests(TestCase):
+    """Число запросов на страницу списка не зависит от числа строк и ?expand=."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('api', password='x')
+        cls.teacher = Teacher.objects.create(name='Преподаватель')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_rows(self, count):
+        start = Student.objects.count()
+        students = Student.objects.bulk_create(
+            [Student(name=f'Студент {start + i}', age=20, email=f's{start + i}@test.ru') for i in range(count)]
+        )
+        course = Course.objects.create(title=f'Курс {start}', teacher=self.teacher)
+        enrollments = Enrollment.objects.bulk_create([Enrollment(student=s, course=course) for s in students])
+        Grade.objects.bulk_create([Grade(enrollment=e, score=80) for e in enrollments])
+        Document.objects.create(title=f'Документ {start}', file='documents/test.pdf', course=course)
+
+    def assert_flat(self, url, queries):
+        for count in (3, 30):
+            self.make_rows(count)
+            with self.assertNumQueries(queries):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_students(self):
+        self.assert_flat('/api/students/', 1)
+
+    def test_teachers(self):
+        self.assert_flat('/api/teachers/', 1)
+
+    def test_courses_with_teacher(self):
+        data = self.assert_flat('/api/courses/?expand=teacher', 1)
+        self.assertEqual(data['results'][0]['teacher']['name'], 'Преподаватель')
+
+    def test_enrollments_with_student_and_course(self):
+        data = self.assert_flat('/api/enrollments/?expand=student,course', 1)
+        self.assertIn('name', data['results'][0]['student'])
+        self.assertIn('title', data['results'][0]['course'])
+
+    def test_grades_with_student_and_course(self):
+        data = self.assert_flat('/api/grades/?expand=student,course', 1)
+        self.assertIn('name', data['results'][0]['student'])
+
+    def test_documents_with_course(self):
+        self.assert_flat('/api/documents/?expand=course', 1)
+
+    def test_sparse_fieldset(self):
+        data = self.assert_flat('/api/students/?fields=id,name', 1)
+        self.assertEqual(set(data['results'][0]), {'id', 'name'})
+
+    def test_fields_and_expand_do_not_affect_writes(self):
+        response = self.client.post('/api/students/?fields=id', {'name': 'Новый', 'age': 19, 'email': 'new@test.ru'},
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Student.objects.get(pk=response.json()['id']).name, 'Новый')
+        response = self.client.post('/api/courses/?expand=teacher', {'title': 'Новый курс', 'teacher': self.teacher.pk},
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Course.objects.get(title='Новый курс').teacher, self.teacher)
+
+    def test_cursor_pagination(self):
+        self.make_rows(60)
+        data = self.client.get('/api/enrollments/?page_size=25').json()
+        self.assertEqual(len(data['results']), 25)
+        self.assertIsNotNone(data['next'])
+        second = self.client.get(data['next']).json()
+        self.assertEqual(len(second['results']), 25)
+        self.assertFalse({r['id'] for r in data['results']} & {r['id'] for r in second['results']})
+
+
+class BulkUpsertApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('bulk', password='x')
+        cls.course = Course.objects.create(title='Курс')
+        cls.students = Student.objects.bulk_create(
+            [Student(name=f'Студент {i}', age=20, email=f's{i}@test.ru') for i in range(3)]
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_enrollments_report_per_row_results(self):
+        rows = [{'student': s.id, 'course': self.course.id} for s in self.students]
+        rows.append({'student': 999999, 'course': self.course.id})
+        data = self.client.post('/api/enrollments/bulk/', rows, format='json').json()
+
+        self.assertEqual(data['summary'], {'created': 3, 'updated': 0, 'unchanged': 0, 'error': 1})
+        self.assertEqual([r['status'] for r in data['results']], ['created'] * 3 + ['error'])
+        self.assertEqual(CourseStats.objects.get(pk=self.course.pk).enrollment_count, 3)
+
+        again = self.client.post('/api/enrollments/bulk/', rows[:1], format='json').json()
+        self.assertEqual(again['results'][0]['status'], 'unchanged')
+
+    def test_grades_upsert_from_ndjson(self):
+        enrollments = Enrollment.objects.bulk_create([Enrollment(student=s, course=self.course) for s in self.students])
+        lines = [
+            f'{{"student": {self.students[0].id}, "course": {self.course.id}, "score": 90}}',
+            f'{{"enrollment": {enrollments[1].id}, "score": 70, "comment": "ok"}}',
+            f'{{"enrollment": {enrollments[2].id}, "score": 150}}',
+        ]
+        response = self.client.generic('POST', '/api/grades/bulk/', '\n'.join(lines),
+                                       content_type='application/x-ndjson')
+        self.assertEqual(response.json()['summary'], {'created': 2, 'updated': 0, 'unchanged': 0, 'error': 1})
+
+        response = self.client.post('/api/grades/bulk/', [{'enrollment': enrollments[1].id, 'score': 50}], format='json')
+        self.assertEqual(response.json()['results'][0]['status'], 'updated')
+        self.assertEqual(Grade.objects.get(enrollment=enrollments[1]).score, 50)
+        self.assertEqual(StudentStats.objects.get(pk=self.students[1].pk).score_avg, 50)
+        self.assertEqual(CourseStats.objects.get(pk=self.course.pk).score_avg, 70)
+
+
+class SisImportTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.teacher = Teacher.objects.create(name='Анна Смирнова', email='anna@test.ru')
+        self.old = Student.objects.create(name='Старое имя', age=18, email='Old@test.ru')
+
+    def write(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def run_import(self, kind, path, *args):
+        from django.core.management import call_command
+        out, err = io.StringIO(), io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_sis', kind, path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_students_upsert_by_email_and_reject_invalid_rows(self):
+        import json
+        path = self.write('students.csv', '\n'.join([
+            'name,age,email',
+            'Новое имя,19,old@test.ru',      # существующий студент, email без учёта регистра
+            'Пётр,20,petr@test.ru',
+            'Без почты,20,',
+            'Плохой возраст,двадцать,bad@test.ru',
+            'Плохая почта,21,not-an-email',
+            'Пётр Иванов,21,PETR@test.ru',   # повтор в пакете — побеждает последняя строка
+        ]) + '\n')
+        rejects = os.path.join(self.dir, 'rejects.ndjson')
+        out, _ = self.run_import('students', path, '--rejects', rejects)
+
+        self.assertIn('Создано 1, обновлено 1, без изменений 1, отклонено 3', out)
+        self.old.refresh_from_db()
+        self.assertEqual((self.old.name, self.old.age), ('Новое имя', 19))
+        petr = Student.objects.get(email__iexact='petr@test.ru')
+        self.assertEqual((petr.name, petr.age), ('Пётр Иванов', 21))
+        self.assertEqual(Student.objects.count(), 2)
+        self.assertTrue(StudentStats.objects.filter(pk=petr.pk).exists())
+        with open(rejects, encoding='utf-8') as f:
+            rejected = [json.loads(line) for line in f]
+        self.assertEqual([(r['line'], sorted(r['errors'])) for r in rejected],
+                         [(4, ['email']), (5, ['age']), (6, ['email'])])
+
+        # повторный импорт того же файла ничего не создаёт
+        out, _ = self.run_import('students', path, '--rejects', rejects)
+        self.assertIn('Создано 0, обновлено 2, без изменений 1, отклонено 3', out)
+
+    def test_courses_enrollments_and_grades_refresh_stats(self):
+        from . import search
+        from .stats import verify_stats
+        courses = self.write('courses.ndjson', '\n'.join([
+            '{"title": "Алгебра", "code": "MATH-1", "teacher": "ANNA@test.ru", "duration": 36}',
+            '{"title": "Физика", "code": "PHYS-1", "teacher": "Неизвестный"}',
+            '{"title": "Сломанная строка"',
+            '["не объект"]',
+        ]))
+        out, err = self.run_import('courses', courses)
+        self.assertIn('Создано 1, обновлено 0, без изменений 0, отклонено 3', out)
+        self.assertIn('строка 2', err)
+        course = Course.objects.get(code='MATH-1')
+        self.assertEqual((course.teacher, course.duration), (self.teacher, 36))
+        self.assertEqual(search.search('алгебра')[0][0]['id'], course.pk)
+
+        self.run_import('students', self.write('students.csv', 'name,age,email\nПётр,20,petr@test.ru\n'))
+        petr = Student.objects.get(email='petr@test.ru')
+        enrollments = self.write('enrollments.csv', '\n'.join([
+            'student,course',
+            'old@test.ru,MATH-1',
+            f'{petr.pk},{course.pk}',
+            'nobody@test.ru,MATH-1',
+            'old@test.ru,NOPE',
+        ]) + '\n')
+        out, _ = self.run_import('enrollments', enrollments)
+        self.assertIn('Создано 2, обновлено 0, без изменений 0, отклонено 2', out)
+        self.assertEqual(CourseStats.objects.get(pk=course.pk).enrollment_count, 2)
+
+        grades = self.write('grades.csv', '\n'.join([
+            'student,course,score,comment',
+            'old@test.ru,MATH-1,80,',
+            'petr@test.ru,MATH-1,60,зачёт',
+            'petr@test.ru,MATH-1,много,',
+        ]) + '\n')
+        out, _ = self.run_import('grades', grades)
+        self.assertIn('Создано 2, обновлено 0, без изменений 0, отклонено 1', out)
+        self.assertEqual(CourseStats.objects.get(pk=course.pk).score_avg, 70)
+        self.assertEqual(StudentStats.objects.get(pk=petr.pk).score_avg, 60)
+
+        self.run_import('grades', self.write('again.csv', 'student,course,score\npetr@test.ru,MATH-1,100\n'))
+        self.assertEqual(CourseStats.objects.get(pk=course.pk).score_avg, 90)
+        self.assertEqual(verify_stats(CourseStats), [])
+        self.assertEqual(verify_stats(StudentStats), [])
+
+    def test_missing_file(self):
+        from django.core.management import CommandError
+        with self.assertRaisesMessage(CommandError, 'файл не найден'):
+            self.run_import('students', os.path.join(self.dir, 'nope.csv'))
+
+
+class StudentThumbnailTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=self.media, STUDENT_THUMBNAILS={'ASYNC': False, 'SIZES': {'card': 160}})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def _photo(self, name='photo.jpg', size=(1200, 800)):
+        from PIL import Image
+        data = io.BytesIO()
+        Image.new('RGB', size, 'navy').save(data, 'JPEG')
+        return SimpleUploadedFile(name, data.getvalue(), content_type='image/jpeg')
+
+    def test_thumbnails_generated_after_upload(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            student = Student.objects.create(name='Аня', age=20, email='a@example.com', photo=self._photo())
+        student.refresh_from_db()
+
+        self.assertEqual(student.thumbnail_source, student.photo.name)
+        card = student.thumbnails['card']
+        self.assertTrue(card['jpg'].endswith('_160.jpg'))
+        self.assertTrue(card['webp'].endswith('_160.webp'))
+        from PIL import Image
+        with Image.open(os.path.join(self.media, 'thumbnails', 'student_photos', os.path.basename(card['jpg']))) as image:
+            self.assertEqual(image.size, (160, 160))
+
+        response = self.client.get('/students/')
+        self.assertContains(response, card['webp'])
+        self.assertNotContains(response, student.photo.url + '"')
+
+    def test_original_used_until_ready_and_stale_thumbnails_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            student = Student.objects.create(name='Боря', age=21, email='b@example.com', photo=self._photo('old.jpg'))
+        old_thumb = os.path.join(self.media, 'thumbnails', 'student_photos', 'old_160.jpg')
+        self.assertTrue(os.path.exists(old_thumb))
+
+        student.refresh_from_db()
+        student.photo = self._photo('new.jpg')
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            student.save()
+        self.assertEqual(student.thumbnails['card'], {'jpg': student.photo.url, 'webp': None})
+
+        for callback in callbacks:
+            callback()
+        student.refresh_from_db()
+        self.assertFalse(os.path.exists(old_thumb))
+        self.assertTrue(student.thumbnails['card']['jpg'].endswith('new_160.jpg'))
+
+    def test_admin_preview_without_admin_size(self):
+        from django.contrib.admin.sites import site
+        with self.captureOnCommitCallbacks(execute=True):
+            student = Student.objects.create(name='Вера', age=22, email='v@example.com', photo=self._photo())
+        student.refresh_from_db()
+        preview = site._registry[Student].photo_preview(student)  # в SIZES только 'card'
+        self.assertIn(f'src="{student.photo.url}"', preview)
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        self.assertContains(self.client.get('/admin/students/student/'), student.photo.url)
+        with override_settings(STUDENT_THUMBNAILS={'ASYNC': False, 'SIZES': {'card': 160, 'admin': 60}}):
+            self.assertNotIn(f'src="{student.photo.url}"', site._registry[Student].photo_preview(student))
+
+
+class DocumentMetadataTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=self.media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def _document(self, name, content):
+        return Document.objects.create(title=name, file=SimpleUploadedFile(name, content))
+
+    def test_metadata_filled_on_upload(self):
+        import hashlib
+        content = b'%PDF-1.4 ' + b'x' * 5000
+        document = self._document('Lecture.PDF', content)
+        document.refresh_from_db()
+
+        self.assertEqual(document.file_size, len(content))
+        self.assertEqual(document.file_ext, 'pdf')
+        self.assertEqual(document.mime_type, 'application/pdf')
+        self.assertEqual(document.content_hash, hashlib.sha256(content).hexdigest())
+        with document.file.open('rb') as stored:
+            self.assertEqual(stored.read(), content)  # хэширование не «съело» загружаемый файл
+        self.assertEqual(document.get_file_icon(), '📕')
+        self.assertEqual(document.get_file_size(), '4.9 KB')
+
+    def test_list_sorted_by_size_and_paginated(self):
+        for i in range(30):
+            self._document(f'doc{i}.txt', b'a' * (i + 1))
+
+        response = self.client.get('/documents/', {'sort': 'size'})
+        self.assertEqual(response.context['count'], 30)
+        self.assertEqual(response.context['num_pages'], 2)
+        sizes = [d.file_size for d in response.context['documents']]
+        self.assertEqual(sizes, sorted(sizes, reverse=True))
+        self.assertEqual(sizes[0], 30)
+
+        response = self.client.get('/documents/', {'sort': 'size', 'page': 2})
+        self.assertEqual(len(response.context['documents']), 6)
+
+    def test_out_of_range_pages_share_the_cached_page(self):
+        from django.core.cache import cache
+        from .cache import cache_stats
+        cache.clear()
+        for i in range(25):
+            self._document(f'doc{i}.txt', b'a' * (i + 1))
+
+        for page in (2, 99, '2', 'abc', 0, -3, 1):
+            response = self.client.get('/documents/', {'page': page})
+        self.assertEqual(response.context['number'], 1)
+        # любой ?page= сводится к номеру настоящей страницы — в кэше только страницы 1 и 2
+        self.assertEqual(cache_stats()['document_list']['misses'], 2)
+        self.assertEqual(cache_stats()['document_count']['misses'], 1)
+        with self.assertNumQueries(0):
+            self.client.get('/documents/', {'page': 1000})
+
+    def test_identical_uploads_share_one_file(self):
+        first = self._document('lecture.pdf', b'same lecture')
+        second = self._document('copy-of-lecture.pdf', b'same lecture')
+        other = self._document('other.pdf', b'another lecture')
+
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertNotEqual(first.file.name, other.file.name)
+        self.assertEqual(second.original_name, 'copy-of-lecture.pdf')
+        path = first.file.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))  # на файл ещё ссылается second
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        # свежий файл могла выбрать параллельная загрузка — сразу не удаляется
+        self.assertTrue(os.path.exists(path))
+        old = time.time() - 2 * storage.RELEASE_GRACE
+        os.utime(path, (old, old))
+        self.assertTrue(storage.release_blob(second.file.name))
+        self.assertFalse(os.path.exists(path))
+
+    def test_reused_blob_survives_release(self):
+        from .storage import reuse_blob
+        document = self._document('lecture.pdf', b'lecture')
+        path = document.file.path
+        old = time.time() - 2 * storage.RELEASE_GRACE
+        os.utime(path, (old, old))
+        Document.objects.filter(pk=document.pk).delete()  # как будто последняя ссылка только что ушла
+        self.assertTrue(reuse_blob(path))  # ... а параллельная загрузка уже выбрала этот файл
+        self.assertFalse(storage.release_blob(document.file.name))
+        self.assertTrue(os.path.exists(path))
+
+    def test_gc_media_removes_only_unreferenced_files(self):
+        from django.core.management import call_command
+        kept = self._document('kept.txt', b'kept')
+        orphan = os.path.join(self.media, 'documents', 'zz', 'orphan.txt')
+        os.makedirs(os.path.dirname(orphan))
+        with open(orphan, 'wb') as f:
+            f.write(b'x' * 100)
+
+        out = io.StringIO()
+        call_command('gc_media', '--grace-hours', '0', stdout=out)
+
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(kept.file.path))
+        self.assertIn('Освобождено: 100 байт', out.getvalue())
+
+
+class ChunkedUploadApiTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=self.media, CHUNKED_UPLOAD={'ROOT': os.path.join(self.media, 'tmp')})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('teacher'))
+        self.content = os.urandom(250000)
+
+    def _init(self, sha256=None):
+        import hashlib
+        response = self.client.post('/api/uploads/', {
+            'filename': 'Запись лекции.mp4', 'size': len(self.content),
+            'sha256': sha256 or hashlib.sha256(self.content).hexdigest(), 'title': 'Лекция 1',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+    def _put(self, upload_id, start, end):
+        return self.client.put(
+            f'/api/uploads/{upload_id}/chunk/', self.content[start:end], content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end - 1}/{len(self.content)}',
+        )
+
+    def test_resumable_upload_creates_document(self):
+        upload_id = self._init()
+        self.assertEqual(self._put(upload_id, 0, 100000).data['received'], 100000)
+
+        # повтор уже принятой части (клиент не дождался ответа) — 409 с местом продолжения
+        response = self._put(upload_id, 0, 100000)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['received'], 100000)
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').data['received'], 100000)
+
+        self._put(upload_id, 100000, len(self.content))
+        response = self.client.post(f'/api/uploads/{upload_id}/complete/')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        document = Document.objects.get(pk=response.data['id'])
+        self.assertEqual(document.original_name, 'Запись лекции.mp4')
+        self.assertEqual(document.file_size, len(self.content))
+        with document.file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.content)
+        self.assertEqual(os.listdir(os.path.join(self.media, 'tmp')), [])
+
+    def test_gc_expires_only_abandoned_uploads(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .management.commands.gc_media import expire_uploads
+        abandoned = self._init()
+        self._put(abandoned, 0, 100000)
+        finished = self._init()
+        self._put(finished, 0, len(self.content))
+        self.client.post(f'/api/uploads/{finished}/complete/')
+        fresh = self._init()
+        long_ago = timezone.now() - timedelta(days=30)
+        UploadSession.objects.exclude(pk=fresh).update(updated_at=long_ago)
+
+        self.assertEqual(expire_uploads(dry_run=True), (1, 100000))
+        self.assertEqual(expire_uploads(), (1, 100000))
+        self.assertEqual({str(pk) for pk in UploadSession.objects.values_list('pk', flat=True)}, {str(finished), str(fresh)})
+        self.assertEqual(os.listdir(os.path.join(self.media, 'tmp')), [])
+        plan = UploadSession.objects.filter(status='active', updated_at__lt=long_ago).explain()
+        self.assertIn('upload_status_updated_idx', plan)
+
+    def test_checksum_mismatch_resets_upload(self):
+        upload_id = self._init(sha256='0' * 64)
+        self._put(upload_id, 0, len(self.content))
+
+        response = self.client.post(f'/api/uploads/{upload_id}/complete/')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.data['received'], 0)
+        self.assertFalse(Document.objects.exists())
+
+
+class DocumentDownloadTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=self.media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.content = bytes(range(256)) * 40
+        self.course = Course.objects.create(title='Физика')
+        self.document = Document.objects.create(
+            title='Лекция', course=self.course, file=SimpleUploadedFile('lecture.pdf', self.content),
+        )
+        self.url = f'/documents/{self.document.pk}/download/'
+        self.user = User.objects.create_user('student', email='st@example.com')
+        student = Student.objects.create(name='Студент', age=19, email='st@example.com')
+        Enrollment.objects.create(student=student, course=self.course)
+        self.client.force_login(self.user)
+
+    def test_full_download_and_conditional_get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('lecture.pdf', response['Content-Disposition'])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_byte_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_course_access(self):
+        self.client.force_login(User.objects.create_user('outsider', email='out@example.com'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    @override_settings(DOCUMENT_DOWNLOADS={'MODE': 'x-accel', 'X_ACCEL_PREFIX': '/protected/'})
+    def test_x_accel_mode(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/' + self.document.file.name)
+        self.assertEqual(response.content, b'')
+
+    def _legacy_name(self):
+        # документ, загруженный до хранения по хэшу: исходное имя файла, кириллица
+        name = 'documents/2025/11/Лекция_1.pdf'
+        os.makedirs(os.path.join(self.media, 'documents', '2025', '11'))
+        with open(os.path.join(self.media, name), 'wb') as f:
+            f.write(self.content)
+        Document.objects.filter(pk=self.document.pk).update(file=name)
+        return name
+
+    def test_non_ascii_name_in_offload_modes(self):
+        from urllib.parse import unquote
+        name = self._legacy_name()
+        with override_settings(DOCUMENT_DOWNLOADS={'MODE': 'x-accel', 'X_ACCEL_PREFIX': '/protected/'}):
+            header = self.client.get(self.url)['X-Accel-Redirect']
+        self.assertTrue(header.isascii())
+        self.assertNotIn('=?utf-8?', header)
+        self.assertEqual(unquote(header), '/protected/' + name)
+
+        # mod_xsendfile не раскодирует путь — такой файл отдаётся напрямую
+        with override_settings(DOCUMENT_DOWNLOADS={'MODE': 'x-sendfile'}):
+            response = self.client.get(self.url)
+        self.assertNotIn('X-Sendfile', response)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    @override_settings(DOCUMENT_DOWNLOADS={'MODE': 'x-sendfile'})
+    def test_x_sendfile_mode(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], self.document.file.path)
+        self.assertEqual(response.content, b'')
+
+
+class SearchTests(TestCase):
+    def test_index_follows_saves_and_deletes(self):
+        from . import search
+        course = Course.objects.create(title='Линейная алгебра', code='MATH-201', description='Матрицы и определители')
+        Teacher.objects.create(name='Иван Петров', bio='Специалист по алгебре и геометрии')
+
+        hits, _, _ = search.search('алгеб')
+        self.assertEqual({(h['type'], h['label']) for h in hits}, {('course', 'Курс'), ('teacher', 'Преподаватель')})
+        self.assertEqual(hits[0]['type'], 'course')  # совпадение в заголовке весит больше, чем в био
+        self.assertIn('<mark>', hits[0]['title'])
+
+        course.title = 'Математический анализ'
+        course.save()
+        self.assertEqual(search.search('линейная')[0], [])
+        self.assertEqual(search.search('анализ', ['course'])[0][0]['id'], course.pk)
+
+        course.delete()
+        self.assertEqual(search.search('анализ')[0], [])
+
+    def test_hidden_announcements_and_markup_escaped(self):
+        from . import search
+        Announcement.objects.create(title='Экзамен <b>завтра</b>', content='Аудитория 101')
+        Announcement.objects.create(title='Экзамен перенесён', content='Тайное', visible=False)
+
+        hits, _, _ = search.search('экзамен')
+        self.assertEqual(len(hits), 1)
+        self.assertIn('&lt;b&gt;', hits[0]['title'])
+
+    def test_api_paginates(self):
+        for i in range(25):
+            Course.objects.create(title=f'Курс программирования {i}')
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('reader'))
+
+        first = client.get('/api/search/', {'q': 'программирование', 'type': 'course'}).data
+        second = client.get('/api/search/', {'q': 'программирование', 'type': 'course', 'page': 2}).data
+        self.assertEqual((len(first['results']), first['has_more']), (20, True))
+        self.assertEqual((len(second['results']), second['has_more']), (5, False))
+        self.assertFalse(first['truncated'])
+
+    def test_truncated_candidates_are_reported(self):
+        from unittest import mock
+        from . import search
+        for i in range(5):
+            Course.objects.create(title=f'Геометрия {i}')
+        with mock.patch.object(search, 'CANDIDATES', 5):
+            hits, has_more, truncated = search.search('геометрия')
+        self.assertEqual((len(hits), has_more, truncated), (5, False, False))
+        Course.objects.create(title='Геометрия 5')
+        with mock.patch.object(search, 'CANDIDATES', 5):
+            hits, has_more, truncated = search.search('геометрия')
+        # ранжированы только 5 самых новых — и об этом сказано
+        self.assertEqual((len(hits), truncated), (5, True))
+        self.assertNotIn(Course.objects.get(title='Геометрия 0').pk, [h['id'] for h in hits])
+
+    def test_pages_beyond_max_offset_are_not_clamped_silently(self):
+        from unittest import mock
+        from . import search
+        for i in range(45):
+            Course.objects.create(title=f'Курс истории {i}')
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('reader'))
+        with mock.patch.object(search, 'MAX_OFFSET', 20):
+            last = client.get('/api/search/', {'q': 'история', 'page': 2}).data
+            self.assertEqual((last['page'], len(last['results']), last['has_more'], last['truncated']),
+                             (2, 20, False, True))
+            self.assertEqual(client.get('/api/search/', {'q': 'история', 'page': 3}).status_code, 400)
+            with self.assertRaises(ValueError):
+                search.search('история', offset=40)
+
+            response = self.client.get('/search/', {'q': 'история', 'page': 9})
+            self.assertEqual(response.context['page'], 2)
+            self.assertContains(response, 'показаны не все')
+
+
+class DocumentTextExtractionTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=self.media, DOCUMENT_TEXT={'ASYNC': False})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def _docx(self, *paragraphs):
+        import zipfile
+        body = ''.join(f'<w:p><w:r><w:t>{p}</w:t></w:r></w:p>' for p in paragraphs)
+        xml = ('<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+               f'<w:body>{body}</w:body></w:document>')
+        data = io.BytesIO()
+        with zipfile.ZipFile(data, 'w') as archive:
+            archive.writestr('word/document.xml', xml)
+        return data.getvalue()
+
+    def _upload(self, name, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Document.objects.create(title='Материалы', file=SimpleUploadedFile(name, content))
+
+    def test_missing_pdf_dependency_logged_once_at_pool_start(self):
+        from unittest import mock
+        from . import extraction
+        from .pools import LazyProcessPool
+        self.assertEqual(extraction.text_extract.missing_dependencies(), [])  # pypdf из requirements.txt
+        pool = LazyProcessPool(lambda: 1, on_start=extraction.check_dependencies)
+        self.addCleanup(pool.reset)
+        with mock.patch.object(extraction, '_dependencies_checked', False), \
+                mock.patch('students.text_extract.importlib.util.find_spec', return_value=None), \
+                self.assertLogs('students.extraction', 'WARNING') as logs:
+            pool._get()
+            pool._get()
+            extraction.check_dependencies()
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('pypdf', logs.output[0])
+
+    def test_extracted_text_is_searchable(self):
+        from . import search
+        document = self._upload('lecture.docx', self._docx('Теорема Пифагора', 'Катеты и гипотенуза'))
+
+        self.assertEqual(document.text.status, 'done')
+        self.assertEqual(document.text.text, 'Теорема Пифагора\nКатеты и гипотенуза')
+        hits, _, _ = search.search('гипотенуза')
+        self.assertEqual([(h['type'], h['id']) for h in hits], [('document', document.pk)])
+        self.assertIn('<mark>гипотенуза</mark>', hits[0]['snippet'])
+
+    def test_same_file_extracted_once_and_unsupported_recorded(self):
+        from . import extraction
+        first = self._upload('notes.txt', 'Конспект по химии'.encode('utf-8'))
+        before = extraction.metrics()
+        second = self._upload('copy.txt', 'Конспект по химии'.encode('utf-8'))
+        after = extraction.metrics()
+
+        self.assertEqual(second.text.text, first.text.text)
+        self.assertEqual(after['reused'], before['reused'] + 1)
+        self.assertEqual(after['documents'], before['documents'])
+
+        archive = self._upload('data.bin', b'\x00\x01')
+        self.assertEqual(archive.text.status, 'unsupported')
+
+
+
+class TimetableTests(TestCase):
+    def setUp(self):
+        from datetime import time
+        self.teacher = Teacher.objects.create(name='Анна Смирнова')
+        self.math = Course.objects.create(title='Математика', teacher=self.teacher)
+        self.physics = Course.objects.create(title='Физика')
+        self.slot = {'start_time': time(9), 'end_time': time(10, 30)}
+        # версии кэша меняются после коммита — иначе сетка из прошлого теста останется актуальной
+        with self.captureOnCommitCallbacks(execute=True):
+            Schedule.objects.create(course=self.math, day_of_week='mon', classroom='101', **self.slot)
+            Schedule.objects.create(course=self.physics, day_of_week='mon', classroom='202', **self.slot)
+            Schedule.objects.create(course=self.physics, day_of_week='sat', classroom='202',
+                                    start_time=time(11), end_time=time(12, 30))
+            Schedule.objects.create(course=self.math, day_of_week='fri', is_active=False, **self.slot)
+
+    def test_grid_and_filters(self):
+        from . import timetable
+        grid = timetable.timetable()
+        self.assertEqual([code for code, _ in grid['days']], ['mon', 'tue', 'wed', 'thu', 'fri', 'sat'])
+        self.assertEqual([(r['start'], r['end']) for r in grid['rows']], [('09:00', '10:30'), ('11:00', '12:30')])
+        self.assertEqual([e['course'] for e in grid['rows'][0]['cells'][0]], ['Математика', 'Физика'])
+        self.assertEqual(grid['rows'][0]['cells'][4], [])  # неактивное занятие не попало
+
+        self.assertEqual(timetable.timetable(classroom='202')['count'], 2)
+        self.assertEqual(timetable.timetable(teacher_id=self.teacher.pk)['count'], 1)
+
+        student = Student.objects.create(name='Пётр', age=20, email='petr@example.com')
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.create(student=student, course=self.physics)
+        self.assertEqual(timetable.timetable(student_id=student.pk)['count'], 2)
+
+    def test_cached_until_schedule_changes(self):
+        from . import timetable
+        self.assertEqual(timetable.timetable()['count'], 3)
+        with self.assertNumQueries(0):
+            timetable.timetable()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Schedule.objects.create(course=self.math, day_of_week='wed', **self.slot)
+        self.assertEqual(timetable.timetable()['count'], 4)
+
+    def test_page_renders(self):
+        response = self.client.get('/schedule/', {'classroom': '101'})
+        self.assertContains(response, 'Математика')
+        self.assertNotContains(response, '>Физика<')
+
+    def test_zero_id_filter_does_not_share_unfiltered_key(self):
+        from . import timetable
+        self.assertEqual(timetable.timetable(teacher_id=0)['count'], 0)
+        self.assertEqual(timetable.timetable(student_id=0)['count'], 0)
+        self.assertEqual(timetable.timetable()['count'], 3)
+        self.assertEqual(self.client.get('/schedule/', {'teacher': 0}).status_code, 404)
+        self.assertEqual(self.client.get('/schedule/', {'teacher': self.teacher.pk}).status_code, 200)
+
+
+class ScheduleConflictTests(TestCase):
+    def setUp(self):
+        from datetime import time
+        self.time = time
+        self.teacher = Teacher.objects.create(name='Олег Иванов')
+        self.math = Course.objects.create(title='Математика', teacher=self.teacher)
+        self.algebra = Course.objects.create(title='Алгебра', teacher=self.teacher)
+        self.history = Course.objects.create(title='История')
+        Schedule.objects.create(course=self.math, day_of_week='mon', classroom='101',
+                                start_time=time(9), end_time=time(10, 30))
+
+    def _lesson(self, course, start, end, classroom='', day='mon'):
+        return Schedule(course=course, day_of_week=day, classroom=classroom,
+                        start_time=self.time(*start), end_time=self.time(*end))
+
+    def test_clean_rejects_room_and_teacher_overlaps(self):
+        from django.core.exceptions import ValidationError
+        with self.assertRaises(ValidationError) as room:
+            self._lesson(self.history, (10,), (11,), classroom='101').full_clean()
+        self.assertEqual(set(room.exception.message_dict), {'classroom'})
+
+        with self.assertRaises(ValidationError) as teacher:
+            self._lesson(self.algebra, (8,), (9, 15), classroom='202').full_clean()
+        self.assertEqual(set(teacher.exception.message_dict), {'course'})
+
+        # граница не пересечение, другой день и другая аудитория — без накладок
+        self._lesson(self.algebra, (10, 30), (12,), classroom='101').full_clean()
+        self._lesson(self.history, (9,), (10, 30), classroom='101', day='tue').full_clean()
+        self._lesson(self.history, (9,), (10, 30), classroom='202').full_clean()
+
+    def test_audit_reports_all_pairs(self):
+        from django.core.management import call_command
+        from . import conflicts
+        Schedule.objects.bulk_create([
+            self._lesson(self.history, (10,), (11,), classroom='101'),
+            self._lesson(self.algebra, (9, 30), (10, 15), classroom='202'),
+            self._lesson(self.history, (11,), (12,), classroom='101'),
+        ])
+        found = conflicts.audit()
+        self.assertEqual(
+            sorted((c['kind'], c['first']['course'], c['second']['course']) for c in found),
+            [('classroom', 'Математика', 'История'), ('teacher', 'Математика', 'Алгебра')],
+        )
+
+        out = io.StringIO()
+        call_command('audit_schedule', stdout=out)
+        self.assertIn('накладок: 2', out.getvalue())
+
+
+class CalendarFeedTests(TestCase):
+    def setUp(self):
+        from datetime import datetime, time, timezone
+        settings = override_settings(CALENDAR_FEEDS={'TERM_START': '2025-09-01'})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        with self.captureOnCommitCallbacks(execute=True):
+            teacher = Teacher.objects.create(name='Мария Ким')
+            self.course = Course.objects.create(title='Химия, органика', teacher=teacher)
+            self.student = Student.objects.create(name='Аня', age=19, email='anya@example.com')
+            Enrollment.objects.create(student=self.student, course=self.course)
+            self.lesson = Schedule.objects.create(course=self.course, day_of_week='wed', classroom='301',
+                                                  start_time=time(9), end_time=time(10, 30))
+            Assignment.objects.create(course=self.course, title='Лабораторная 1', description='Отчёт',
+                                      due_date=datetime(2025, 10, 1, 18, 0, tzinfo=timezone.utc))
+
+    def test_student_feed(self):
+        from . import ical
+        response = self.client.get(ical.feed_url('student', self.student.pk))
+        body = response.content.decode('utf-8')
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertIn('DTSTART:20250903T090000\r\nDTEND:20250903T103000\r\nRRULE:FREQ=WEEKLY;BYDAY=WE', body)
+        self.assertIn('SUMMARY:Химия\\, органика', body)
+        self.assertIn('DTSTART:20251001T180000Z', body)
+        self.assertTrue(all(len(line.encode('utf-8')) <= 75 for line in body.split('\r\n')))
+
+    def test_etag_and_regeneration(self):
+        from . import ical
+        url = ical.feed_url('course', self.course.pk)
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.classroom = '302'
+            self.lesson.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'LOCATION:302', response.content)
+
+    def test_etag_ignores_dtstamp(self):
+        from unittest import mock
+        from datetime import timedelta
+        from django.utils import timezone
+        from . import ical
+        first = ical.build_feed('course', self.course.pk)
+        with mock.patch('students.ical.timezone.now', return_value=timezone.now() + timedelta(hours=1)):
+            second = ical.build_feed('course', self.course.pk)
+        self.assertNotEqual(first['body'], second['body'])
+        self.assertEqual(first['etag'], second['etag'])
+
+    def test_forged_token_rejected(self):
+        self.assertEqual(self.client.get(f'/calendar/student-{self.student.pk}:forged.ics').status_code, 404)
+
+
+class DeadlineReminderTests(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        self.now = timezone.now()
+        self.hours = lambda h: self.now + timedelta(hours=h)
+        self.math = Course.objects.create(title='Математика')
+        self.physics = Course.objects.create(title='Физика')
+        student = Student.objects.create(name='Ира', age=20, email='ira@example.com')
+        Enrollment.objects.create(student=student, course=self.math)
+        self.late = Assignment.objects.create(course=self.math, title='ДЗ 0', description='', due_date=self.hours(-2))
+        self.soon = Assignment.objects.create(course=self.math, title='ДЗ 1', description='', due_date=self.hours(3))
+        self.also = Assignment.objects.create(course=self.physics, title='Лаба', description='', due_date=self.hours(5))
+        self.later = Assignment.objects.create(course=self.math, title='ДЗ 2', description='', due_date=self.hours(72))
+
+    def test_queryset_filters(self):
+        from datetime import timedelta
+        self.assertEqual(list(Assignment.objects.overdue(self.now)), [self.late])
+        self.assertEqual(set(Assignment.objects.due_within(timedelta(hours=6), self.now)), {self.soon, self.also})
+        self.assertEqual(Assignment.objects.upcoming(self.now).count(), 3)
+
+    def test_tick_batches_per_course_once(self):
+        from datetime import timedelta
+        from . import reminders
+        received = []
+        handler = lambda sender, batch, **kwargs: received.append(batch)
+        reminders.reminder_batch.connect(handler)
+        self.addCleanup(reminders.reminder_batch.disconnect, handler)
+
+        result = reminders.tick(self.now, timedelta(hours=24))
+        self.assertEqual(result, {'assignments': 2, 'courses': 2, 'skipped': 1})
+        by_course = {b['course']: b for b in received}
+        self.assertEqual([a['title'] for a in by_course['Математика']['assignments']], ['ДЗ 1'])
+        self.assertEqual(by_course['Математика']['emails'], ['ira@example.com'])
+
+        self.assertEqual(reminders.tick(self.now, timedelta(hours=24))['assignments'], 0)
+        self.assertEqual(reminders.next_wakeup(timedelta(hours=24)), self.hours(48))
+
+        # перенос срока — напоминание придёт ещё раз
+        self.soon.refresh_from_db()
+        self.soon.due_date = self.hours(4)
+        self.soon.save()
+        self.assertEqual(reminders.tick(self.now, timedelta(hours=24))['assignments'], 1)
+
+
+class GradebookQueryCountTests(TestCase):
+    """Журнал и страница курса — одинаковое число запросов на 10 и на 10 000 записей."""
+
+    def make_course(self, count):
+        from datetime import timedelta
+        from django.utils import timezone
+        start = Student.objects.count()
+        students = Student.objects.bulk_create(
+            [Student(name=f'Студент {start + i:05}', age=20, email=f's{start + i}@test.ru') for i in range(count)]
+        )
+        course = Course.objects.create(title=f'Курс {start}')
+        enrollments = Enrollment.objects.bulk_create([Enrollment(student=s, course=course) for s in students])
+        Grade.objects.bulk_create([Grade(enrollment=e, score=75) for e in enrollments[::2]])  # у половины нет итога
+        assignments = Assignment.objects.bulk_create([
+            Assignment(course=course, title=f'ДЗ {i}', description='', due_date=timezone.now() + timedelta(days=i))
+            for i in range(3)
+        ])
+        AssignmentScore.objects.bulk_create(
+            [AssignmentScore(assignment=a, student=s, score=90) for a in assignments for s in students], batch_size=5000,
+        )
+        return course
+
+    def count_queries(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_gradebook_flat(self):
+        small = self.make_course(10)
+        large = self.make_course(10000)
+        few, response = self.count_queries(f'/course/{small.pk}/gradebook/')
+        many, response = self.count_queries(f'/course/{large.pk}/gradebook/?page=3')
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.context['rows']), 50)
+        self.assertContains(response, '<span class="badge bg-success">90.00</span>', count=150)
+
+    def test_course_detail_flat(self):
+        small = self.make_course(10)
+        large = self.make_course(1000)
+        self.assertEqual(self.count_queries(f'/course/{small.pk}/')[0], self.count_queries(f'/course/{large.pk}/')[0])
+
+
+class GradebookExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        teacher = Teacher.objects.create(name='Анна Смирнова')
+        cls.math = Course.objects.create(title='Алгебра', code='MATH-1', teacher=teacher)
+        cls.art = Course.objects.create(title='Рисование, "акварель"')
+        students = Student.objects.bulk_create(
+            [Student(name=f'Студент {i}', age=20, email=f's{i}@test.ru') for i in range(3)]
+        )
+        cls.enrollments = Enrollment.objects.bulk_create(
+            [Enrollment(student=s, course=cls.math) for s in students] + [Enrollment(student=students[0], course=cls.art)]
+        )
+        Grade.objects.create(enrollment=cls.enrollments[0], score=87.5, comment='хорошо')
+        Grade.objects.create(enrollment=cls.enrollments[3], score=100)
+        cls.staff = User.objects.create_user('staff', is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_requires_staff(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/export/gradebook.csv').status_code, 302)
+        self.client.force_login(User.objects.create_user('student'))
+        self.assertEqual(self.client.get('/export/gradebook.csv').status_code, 302)
+
+    def test_csv(self):
+        import csv
+        response = self.client.get('/export/gradebook.csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="gradebook.csv"')
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        body = self.read(response)
+        self.assertTrue(body.startswith('﻿'))
+        rows = list(csv.reader(io.StringIO(body[1:])))
+        self.assertEqual(rows[0][:3], ['enrollment_id', 'student_id', 'student'])
+        self.assertEqual([row[0] for row in rows[1:]], [str(e.pk) for e in self.enrollments])
+        self.assertEqual(rows[1][-3:], ['Анна Смирнова', '87.50', 'хорошо'])
+        self.assertEqual(rows[2][-2:], ['', ''])  # запись без оценки тоже выгружается
+        self.assertEqual(rows[4][5:8], ['Рисование, "акварель"', '', ''])
+
+    def test_ndjson_and_course_filter(self):
+        import json
+        response = self.client.get('/export/gradebook.ndjson', {'course': self.art.pk})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        records = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(records), 1)
+        self.assertEqual((records[0]['enrollment_id'], records[0]['score'], records[0]['teacher']),
+                         (self.enrollments[3].pk, '100.00', None))
+
+        records = [json.loads(line) for line in self.read(self.client.get('/export/gradebook.ndjson')).splitlines()]
+        self.assertEqual([r['score'] for r in records], ['87.50', None, None, '100.00'])
+
+    def test_unknown_format_or_course(self):
+        self.assertEqual(self.client.get('/export/gradebook.xlsx').status_code, 404)
+        self.assertEqual(self.client.get('/export/gradebook.csv', {'course': 'abc'}).status_code, 404)
+
+    def test_rows_read_lazily_with_one_query(self):
+        response = self.client.get('/export/gradebook.csv')
+        # view только строит генератор — журнал читается, пока отдаётся ответ
+        with self.assertNumQueries(1):
+            chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 2 + len(self.enrollments))  # BOM, заголовок, строка за строкой
+
+
+class GradeAnalyticsTests(TestCase):
+    def setUp(self):
+        from datetime import datetime, timezone
+        self.teacher = Teacher.objects.create(name='Лев Орлов')
+        self.course = Course.objects.create(title='Алгоритмы', teacher=self.teacher)
+        other = Course.objects.create(title='Черчение')
+        scores = [40, 55, 75, 95, 100, 60]
+        students = Student.objects.bulk_create(
+            [Student(name=f'Студент {i}', age=20, email=f'a{i}@test.ru') for i in range(len(scores))]
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            for i, (student, score) in enumerate(zip(students, scores)):
+                enrollment = Enrollment.objects.create(student=student, course=self.course if i < 5 else other)
+                # первые три — весна 2024, остальные — осень 2024
+                Enrollment.objects.filter(pk=enrollment.pk).update(
+                    enrolled_at=datetime(2024, 3 if i < 3 else 10, 1, tzinfo=timezone.utc))
+                Grade.objects.create(enrollment=enrollment, score=score)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('analyst'))
+
+    def test_course_summary(self):
+        data = self.client.get(f'/api/analytics/courses/{self.course.pk}/').json()
+        self.assertEqual(data['count'], 5)
+        self.assertEqual(data['mean'], 73.0)
+        self.assertEqual(data['percentiles']['p50'], 75.0)
+        self.assertEqual([b['count'] for b in data['histogram']], [1, 1, 1, 2])
+        self.assertEqual([(t['term'], t['mean']) for t in data['trend']['terms']],
+                         [('2024 весна', 56.67), ('2024 осень', 97.5)])
+        self.assertEqual(data['trend']['slope'], 40.83)
+
+    def test_grouped_and_cached(self):
+        from . import analytics
+        courses = {row['course']: row['count'] for row in self.client.get('/api/analytics/courses/').json()}
+        self.assertEqual(courses, {'Алгоритмы': 5, 'Черчение': 1})
+        self.assertEqual(self.client.get('/api/analytics/teachers/').json()[0]['count'], 5)
+        self.assertEqual(len(self.client.get('/api/analytics/cohorts/').json()), 2)
+        self.assertEqual(analytics.overview()['count'], 6)
+        with self.assertNumQueries(0):
+            analytics.overview()
+        self.assertEqual(self.client.get('/api/analytics/courses/999999/').status_code, 404)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        from . import leaderboard
+        self.leaderboard = leaderboard
+        self.course = Course.objects.create(title='Физика')
+        self.scores = [70, 95, 80, 95, 60, 80, 80, 40]
+        self.students = []
+        self.grades = []
+        for i, score in enumerate(self.scores):
+            student = Student.objects.create(name=f'Студент {i}', age=20, email=f'l{i}@test.ru')
+            enrollment = Enrollment.objects.create(student=student, course=self.course)
+            self.grades.append(Grade.objects.create(enrollment=enrollment, score=score))
+            self.students.append(student)
+        Student.objects.create(name='Без оценок', age=20, email='none@test.ru')
+
+    def expected(self):
+        # места «1, 2, 2, 4» по живым данным, порядок как в индексе: балл ↓, id ↑
+        rows = sorted(StudentStats.objects.filter(score_avg__isnull=False).values_list('student_id', 'score_avg'),
+                      key=lambda row: (-row[1], row[0]))
+        return [(1 + sum(avg > score for _, avg in rows), pk) for pk, score in rows]
+
+    def test_pages_and_ranks_match_sorting(self):
+        expected = self.expected()
+        self.assertEqual([(row['rank'], row['student_id']) for row in self.leaderboard.page(0, 100)], expected)
+        for offset in range(len(expected)):
+            for limit in (1, 3):
+                page = self.leaderboard.page(offset, limit)
+                self.assertEqual([(row['rank'], row['student_id']) for row in page], expected[offset:offset + limit])
+        self.assertEqual(self.leaderboard.page(len(expected), 5), [])
+        for rank, pk in expected:
+            self.assertEqual(self.leaderboard.rank(pk)['rank'], rank)
+        self.assertEqual(self.leaderboard.total(), len(self.scores))
+        self.assertIsNone(self.leaderboard.rank(Student.objects.get(name='Без оценок').pk))
+
+    def test_incremental_updates(self):
+        grade = self.grades[7]
+        grade.score = 100
+        grade.save()
+        self.assertEqual(self.leaderboard.top(1)[0]['student_id'], self.students[7].pk)
+        self.assertEqual(self.leaderboard.rank(self.students[1].pk)['rank'], 2)
+
+        Enrollment.objects.create(student=self.students[1], course=Course.objects.create(title='Химия'))
+        Grade.objects.create(enrollment=self.students[1].enrollments.get(course__title='Химия'), score=85)
+        self.grades[0].delete()
+        self.students[4].delete()
+        self.assertEqual([(row['rank'], row['student_id']) for row in self.leaderboard.page(0, 100)], self.expected())
+
+        tree = dict(LeaderboardNode.objects.values_list('position', 'count'))
+        self.leaderboard.rebuild()
+        self.assertEqual(dict(LeaderboardNode.objects.values_list('position', 'count')), tree)
+
+    def test_rank_is_constant_queries(self):
+        with self.assertNumQueries(3):
+            self.leaderboard.rank(self.students[0].pk)
+        with self.assertNumQueries(1):
+            self.leaderboard.top(5)
+        # спуск по дереву — один запрос, а не по запросу на уровень
+        with self.assertNumQueries(1):
+            self.assertEqual(self.leaderboard._key_at(2), 8000)
+        with self.assertNumQueries(1):
+            self.assertIsNone(self.leaderboard._key_at(len(self.scores)))
+
+    def test_migration_builds_the_same_tree(self):
+        from importlib import import_module
+        from django.apps import apps
+        migration = import_module('students.migrations.0020_leaderboard')
+        tree = dict(LeaderboardNode.objects.values_list('position', 'count'))
+        LeaderboardNode.objects.all().delete()
+        StudentStats.objects.update(rank_key=None)
+        migration.build_leaderboard(apps, None)
+        self.assertEqual(dict(LeaderboardNode.objects.values_list('position', 'count')), tree)
+        self.assertEqual([(row['rank'], row['student_id']) for row in self.leaderboard.page(0, 100)], self.expected())
+
+    def test_api_and_dashboard(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('ranker'))
+        data = client.get('/api/leaderboard/', {'page': 2, 'page_size': 3}).json()
+        self.assertEqual(data['total'], 8)
+        self.assertEqual([row['rank'] for row in data['results']], [3, 3, 6])
+        place = client.get(f'/api/leaderboard/students/{self.students[4].pk}/').json()
+        self.assertEqual((place['rank'], place['total']), (7, 8))
+        self.assertEqual(client.get(f'/api/leaderboard/students/{Student.objects.last().pk}/').status_code, 404)
+        response = self.client.get('/')
+        self.assertEqual([row['name'] for row in response.context['top_students']],
+                         ['Студент 1', 'Студент 3', 'Студент 2', 'Студент 5', 'Студент 6'])
+
+
+class SnakeLeaderboardTests(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title='Информатика')
+        self.students = [Student.objects.create(name=f'Игрок {i}', age=20, email=f's{i}@test.ru') for i in range(4)]
+        for student in self.students[:2]:
+            Enrollment.objects.create(student=student, course=self.course)
+
+    def test_buffer_aggregates_before_writing(self):
+        from .snake import ScoreBuffer
+        buffer = ScoreBuffer(autostart=False)
+        first, second = self.students[0].pk, self.students[1].pk
+        buffer.submit([(first, 30), (second, 50), (first, 70)])
+        buffer.submit([(first, 10), (999999, 40)])
+        self.assertEqual(buffer.pending_count(), 3)
+        self.assertEqual(SnakeScore.objects.count(), 0)
+
+        with self.assertNumQueries(5):  # savepoint, студенты, вставка недостающих, UPDATE, release
+            self.assertEqual(buffer.flush(), 2)
+        buffer.submit([(first, 20)])
+        buffer.flush()
+
+        self.assertEqual(buffer.stats['flushed'], 6)
+        self.assertEqual(
+            list(SnakeScore.objects.order_by('student_id').values_list('student_id', 'best', 'games', 'total')),
+            [(first, 70, 4, 130), (second, 50, 1, 50)],
+        )
+
+    def test_write_adds_in_sql_without_reading(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .snake import write
+        first, second = self.students[0].pk, self.students[1].pk
+        SnakeScore.objects.create(student_id=first, best=100, games=2, total=150)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(write({first: [60, 3, 120], second: [80, 1, 80]}), 2)
+        # текущие рекорды не читаются — иначе параллельный сброс перезаписал бы чужие игры
+        self.assertFalse([q for q in queries if q['sql'].startswith('SELECT') and 'snakescore' in q['sql']])
+        write({first: [120, 1, 120]})
+        self.assertEqual(
+            list(SnakeScore.objects.order_by('student_id').values_list('student_id', 'best', 'games', 'total')),
+            [(first, 120, 6, 390), (second, 80, 1, 80)],
+        )
+        self.assertEqual(write({999999: [10, 1, 10]}), 0)
+
+    def test_scores_need_a_signed_player(self):
+        from .snake import player_token
+        url = '/snake-game/scores/'
+        token = player_token(self.students[0].pk)
+        for player in (None, str(self.students[0].pk), token[:-1] + ('A' if token[-1] != 'A' else 'B')):
+            response = self.client.post(url, {'player': player, 'scores': [10]}, content_type='application/json')
+            self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.post(url, {'scores': [10]}, content_type='application/json').status_code, 400)
+        self.assertEqual(SnakeScore.objects.count(), 0)
+
+        self.assertEqual(self.client.get('/snake-game/', {'player': 'подделка'}).status_code, 404)
+        self.assertNotContains(self.client.get(f'/student/{self.students[0].pk}/'), 'player=')
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        self.assertContains(self.client.get(f'/student/{self.students[0].pk}/'), f'?player={token}')
+
+    @override_settings(SNAKE_LEADERBOARD={'BUFFERED': False, 'MAX_BATCH': 3})
+    def test_submit_and_poll(self):
+        from .snake import player_token
+        url = '/snake-game/scores/'
+
+        def post(index, scores):
+            return self.client.post(url, {'player': player_token(self.students[index].pk), 'scores': scores},
+                                    content_type='application/json')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for index, score in ((0, 40), (2, 90), (1, 40)):
+                self.assertEqual(post(index, [score]).status_code, 202)
+        self.assertEqual(SnakeScore.objects.count(), 3)
+        self.assertEqual(post(0, [1, 2, 3, 4]).status_code, 400)
+        self.assertEqual(post(0, [-5]).status_code, 400)
+        self.assertEqual(self.client.post(url, 'не json', content_type='application/json').status_code, 400)
+        token = player_token(self.students[0].pk)
+        for body in ('{"player": "%s", "scores": [1e400]}' % token, '[1, 2]',
+                     {'player': token, 'scores': [99.9]}, {'player': token, 'scores': '123'},
+                     {'player': token, 'scores': [True]}, {'player': token, 'scores': [10, '20']},
+                     {'player': token, 'scores': {'a': 1}}):
+            response = self.client.post(url, body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+        self.assertEqual(SnakeScore.objects.get(pk=self.students[0].pk).games, 1)
+
+        response = self.client.get('/snake-game/leaderboard/')
+        self.assertEqual([(row['rank'], row['best']) for row in response.json()['scores']], [(1, 90), (2, 40), (2, 40)])
+        course = self.client.get('/snake-game/leaderboard/', {'course': self.course.pk}).json()
+        self.assertEqual([row['student_id'] for row in course['scores']], [self.students[0].pk, self.students[1].pk])
+
+        with self.assertNumQueries(0):
+            cached = self.client.get('/snake-game/leaderboard/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            post(3, [100])
+        fresh = self.client.get('/snake-game/leaderboard/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(fresh.json()['scores'][0]['best'], 100)
+
+        page = self.client.get('/snake-game/', {'player': player_token(self.students[2].pk)})
+        self.assertEqual(page.context['best'], 90)
+        self.assertNotContains(page, 'snakeHighScore')
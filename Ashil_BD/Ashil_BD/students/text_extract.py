@@ -0,0 +1,125 @@
+"""
+Извлечение текста из файлов документов.
+
+Модуль намеренно не импортирует Django: extract() выполняется в дочерних
+процессах пула (extraction.py) и работает только с путём к файлу.
+DOCX/PPTX/XLSX разбираются стандартной библиотекой (это zip с XML), PDF —
+через pypdf (requirements.txt). Без него PDF получают статус «не
+поддерживается»; missing_dependencies() позволяет сообщить об этом сразу.
+"""
+import importlib.util
+import re
+import time
+import zipfile
+from xml.etree import ElementTree
+
+MAX_CHARS = 1_000_000  # больше для поиска не нужно, а строка в БД растёт
+
+W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+A_NS = '{http://schemas.openxmlformats.org/drawingml/2006/main}'
+S_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+
+# форматы, которым нужен сторонний пакет
+DEPENDENCIES = {'pdf': 'pypdf'}
+
+
+class Unsupported(Exception):
+    pass
+
+
+def missing_dependencies():
+    """[(расширение, пакет), ...] — форматы, пакет для которых не установлен."""
+    return [(ext, package) for ext, package in DEPENDENCIES.items() if importlib.util.find_spec(package) is None]
+
+
+def _xml_text(data, paragraph_tag, text_tag):
+    parts = []
+    root = ElementTree.fromstring(data)
+    for paragraph in root.iter(paragraph_tag):
+        line = ''.join(node.text or '' for node in paragraph.iter(text_tag))
+        if line:
+            parts.append(line)
+    return '\n'.join(parts)
+
+
+def _docx(path):
+    with zipfile.ZipFile(path) as archive:
+        return _xml_text(archive.read('word/document.xml'), f'{W_NS}p', f'{W_NS}t')
+
+
+def _slide_number(name):
+    match = re.search(r'(\d+)\.xml$', name)
+    return int(match.group(1)) if match else 0
+
+
+def _pptx(path):
+    with zipfile.ZipFile(path) as archive:
+        slides = sorted((n for n in archive.namelist() if re.match(r'ppt/slides/slide\d+\.xml$', n)),
+                        key=_slide_number)
+        return '\n\n'.join(_xml_text(archive.read(name), f'{A_NS}p', f'{A_NS}t') for name in slides)
+
+
+def _xlsx(path):
+    with zipfile.ZipFile(path) as archive:
+        if 'xl/sharedStrings.xml' not in archive.namelist():
+            return ''
+        return _xml_text(archive.read('xl/sharedStrings.xml'), f'{S_NS}si', f'{S_NS}t')
+
+
+def _pdf(path):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise Unsupported('для PDF нужен пакет pypdf')
+    reader = PdfReader(path)
+    parts = []
+    size = 0
+    for page in reader.pages:
+        text = page.extract_text() or ''
+        parts.append(text)
+        size += len(text)
+        if size >= MAX_CHARS:
+            break
+    return '\n\n'.join(parts)
+
+
+def _plain(path):
+    with open(path, 'rb') as source:
+        data = source.read(MAX_CHARS * 4)
+    for encoding in ('utf-8', 'cp1251'):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode('utf-8', errors='replace')
+
+
+EXTRACTORS = {
+    'pdf': _pdf,
+    'docx': _docx,
+    'pptx': _pptx,
+    'xlsx': _xlsx,
+    'txt': _plain,
+    'md': _plain,
+    'csv': _plain,
+}
+
+
+def extract(path, ext):
+    """
+    Возвращает (текст, секунд). Unsupported — формат не поддерживается,
+    прочие исключения — битый файл.
+    """
+    extractor = EXTRACTORS.get(ext)
+    if extractor is None:
+        raise Unsupported(f'формат .{ext} не поддерживается' if ext else 'файл без расширения')
+    started = time.perf_counter()
+    try:
+        text = extractor(path)
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as exc:
+        raise ValueError(f'файл повреждён: {exc}')
+    # схлопываем пробелы: индексу они не нужны, а место в БД занимают
+    text = re.sub(r'[ \t\r\f\v]+', ' ', text)
+    text = re.sub(r'\n\s*\n+', '\n\n', text).strip()
+    return text[:MAX_CHARS], time.perf_counter() - started
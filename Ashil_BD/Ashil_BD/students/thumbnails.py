@@ -0,0 +1,127 @@
+"""
+Миниатюры фото студентов.
+
+После сохранения Student с новым фото (on_commit) рендер уходит в пул
+процессов: запрос не ждёт Pillow, а тяжёлое декодирование не держит GIL
+процесса с веб-воркерами. Для каждого размера из STUDENT_THUMBNAILS['SIZES']
+пишутся JPEG и WebP: thumbnails/<путь фото без расширения>_<px>.jpg|.webp.
+
+Student.thumbnail_source хранит имя фото, для которого миниатюры готовы, —
+шаблоны узнают о готовности без обращений к диску; пока миниатюр нет,
+показывается оригинал. Хранилище фото должно быть файловым (storage.path).
+"""
+import logging
+import os
+import posixpath
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import cache as page_cache
+from . import imaging
+from .pools import LazyProcessPool
+from .models import Student
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = 'thumbnails'
+FORMATS = ('jpg', 'webp')
+
+
+def _options():
+    return getattr(settings, 'STUDENT_THUMBNAILS', {})
+
+
+def sizes():
+    """{'card': 160, ...} — имя размера → сторона квадрата в пикселях."""
+    return _options().get('SIZES', {'card': 160, 'admin': 120})
+
+
+def thumbnail_name(photo_name, px, fmt):
+    stem, _ = posixpath.splitext(photo_name)
+    return posixpath.join(THUMBNAIL_DIR, f'{stem}_{px}.{fmt}')
+
+
+def targets(photo_name, storage):
+    return {
+        px: tuple(storage.path(thumbnail_name(photo_name, px, fmt)) for fmt in FORMATS)
+        for px in set(sizes().values())
+    }
+
+
+def urls(student):
+    """
+    {'card': {'jpg': url, 'webp': url | None}, ...}. Если миниатюры ещё не
+    готовы — оригинал вместо JPEG и None вместо WebP.
+    """
+    photo = student.photo
+    if not photo:
+        return {}
+    ready = student.thumbnail_source == photo.name
+    result = {}
+    for name, px in sizes().items():
+        if ready:
+            result[name] = {fmt: photo.storage.url(thumbnail_name(photo.name, px, fmt)) for fmt in FORMATS}
+        else:
+            result[name] = {'jpg': photo.url, 'webp': None}
+    return result
+
+
+def mark_ready(done):
+    """done — [(student_id, photo_name)]. Отметка только если фото не сменилось за время рендера."""
+    updated = 0
+    for student_id, photo_name in done:
+        updated += Student.objects.filter(pk=student_id, photo=photo_name).update(thumbnail_source=photo_name)
+    if updated:
+        # update() не шлёт сигналы — сами сбрасываем кэш страниц со студентами
+        page_cache.bump_version(Student)
+    return updated
+
+
+def render(photo_name, storage=None):
+    storage = storage or Student._meta.get_field('photo').storage
+    return imaging.render_thumbnails(storage.path(photo_name), targets(photo_name, storage))
+
+
+pool = LazyProcessPool(lambda: _options().get('WORKERS', 2))
+
+
+def _finished(student_id, photo_name, future):
+    # вызывается в служебном потоке пула
+    try:
+        future.result()
+        mark_ready([(student_id, photo_name)])
+    except FileNotFoundError:
+        logger.warning('Фото %s студента %s не найдено на диске', photo_name, student_id)
+    except Exception:
+        logger.exception('Не удалось построить миниатюры %s студента %s', photo_name, student_id)
+    finally:
+        close_old_connections()
+
+
+def schedule(student_id, photo_name):
+    """Ставит рендер в пул; при ASYNC=False (тесты, dev) рендерит прямо в запросе."""
+    if not _options().get('ASYNC', True):
+        try:
+            render(photo_name)
+        except (OSError, ValueError):
+            logger.exception('Не удалось построить миниатюры %s студента %s', photo_name, student_id)
+            return
+        mark_ready([(student_id, photo_name)])
+        return
+    storage = Student._meta.get_field('photo').storage
+    job = (storage.path(photo_name), targets(photo_name, storage))
+    future = pool.submit(imaging.render_thumbnails, *job)
+    future.add_done_callback(partial(_finished, student_id, photo_name))
+    return future
+
+
+def delete_thumbnails(photo_name, storage=None):
+    storage = storage or Student._meta.get_field('photo').storage
+    for paths in targets(photo_name, storage).values():
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
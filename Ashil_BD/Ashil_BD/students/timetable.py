@@ -0,0 +1,99 @@
+"""
+Сетка расписания на неделю из таблицы Schedule.
+
+Все активные занятия читаются одним запросом (с курсом и преподавателем
+через JOIN), дальше сетка строится в памяти: строки — интервалы времени,
+колонки — дни недели, в ячейке список занятий (больше одного — накладка).
+Фильтры: аудитория, преподаватель, студент (курсы по Enrollment).
+
+Готовая сетка кэшируется в версионированном кэше страниц (cache.py) и
+строится заново только после изменения Schedule, Course или Teacher, а
+для расписания студента — ещё и Enrollment.
+"""
+import hashlib
+
+from .cache import cached_context
+from .models import Course, Enrollment, Schedule, Teacher
+
+DAYS = Schedule.DAYS_OF_WEEK
+DAY_INDEX = {code: index for index, (code, _) in enumerate(DAYS)}
+WORKDAYS = 5  # пн–пт показываем всегда, выходные — только если в них есть занятия
+
+TIMETABLE_MODELS = (Schedule, Course, Teacher)
+
+
+def load_entries():
+    """Активные занятия в порядке день → время → аудитория."""
+    rows = (Schedule.objects.filter(is_active=True)
+            .select_related('course__teacher')
+            .order_by())
+    entries = []
+    for row in rows:
+        teacher = row.course.teacher
+        entries.append({
+            'id': row.id,
+            'course_id': row.course_id,
+            'course': row.course.title,
+            'code': row.course.code,
+            'teacher_id': teacher.id if teacher else None,
+            'teacher': teacher.name if teacher else '',
+            'classroom': row.classroom,
+            'day': row.day_of_week,
+            'start': row.start_time,
+            'end': row.end_time,
+        })
+    entries.sort(key=lambda e: (DAY_INDEX.get(e['day'], len(DAYS)), e['start'], e['end'], e['classroom']))
+    return entries
+
+
+def build_grid(entries):
+    used = {DAY_INDEX[e['day']] for e in entries if e['day'] in DAY_INDEX}
+    days = [DAYS[i] for i in range(len(DAYS)) if i < WORKDAYS or i in used]
+    column = {code: i for i, (code, _) in enumerate(days)}
+    slots = {}
+    for entry in entries:
+        if entry['day'] not in column:
+            continue
+        cells = slots.setdefault((entry['start'], entry['end']), [[] for _ in days])
+        cells[column[entry['day']]].append(entry)
+    rows = [
+        {'start': start.strftime('%H:%M'), 'end': end.strftime('%H:%M'), 'cells': cells}
+        for (start, end), cells in sorted(slots.items())
+    ]
+    return {'days': days, 'rows': rows, 'count': len(entries)}
+
+
+def _cache_part(value):
+    # название аудитории — произвольный текст; в ключ кэша идёт его хэш
+    return hashlib.md5(value.encode('utf-8')).hexdigest()[:12] if value else ''
+
+
+def timetable(classroom='', teacher_id=None, student_id=None):
+    """Сетка недели с учётом фильтров; при неизменных данных — из кэша."""
+    def build():
+        entries = load_entries()
+        if classroom:
+            entries = [e for e in entries if e['classroom'] == classroom]
+        if teacher_id is not None:
+            entries = [e for e in entries if e['teacher_id'] == teacher_id]
+        if student_id is not None:
+            courses = set(Enrollment.objects.filter(student_id=student_id).values_list('course_id', flat=True))
+            entries = [e for e in entries if e['course_id'] in courses]
+        return build_grid(entries)
+
+    models = TIMETABLE_MODELS + ((Enrollment,) if student_id is not None else ())
+    # 0 — такой же id, как любой другой: пустым ключом помечаем только отсутствие фильтра
+    return cached_context('timetable', models, build, _cache_part(classroom),
+                          '' if teacher_id is None else teacher_id, '' if student_id is None else student_id)
+
+
+def filter_choices():
+    """Аудитории и преподаватели, у которых есть активные занятия, — для фильтров страницы."""
+    def build():
+        active = Schedule.objects.filter(is_active=True)
+        classrooms = sorted(set(active.exclude(classroom='').values_list('classroom', flat=True)))
+        teachers = list(Teacher.objects.filter(course__schedules__is_active=True)
+                        .distinct().order_by('name').values_list('id', 'name'))
+        return {'classrooms': classrooms, 'teachers': teachers}
+
+    return cached_context('timetable_filters', TIMETABLE_MODELS, build)
@@ -0,0 +1,157 @@
+"""
+Докачиваемая загрузка больших документов частями.
+
+    POST   /api/uploads/                 — начать: filename, size, sha256, title, ...
+    PUT    /api/uploads/<id>/chunk/      — часть; смещение в Content-Range: bytes <start>-<end>/<size>
+    GET    /api/uploads/<id>/            — сколько уже принято (received), откуда продолжать
+    POST   /api/uploads/<id>/complete/   — проверка SHA-256 и создание Document
+    DELETE /api/uploads/<id>/            — отменить
+
+Каждая часть — короткий отдельный запрос: тело читается из сокета блоками
+по STREAM_BLOCK и сразу пишется в <id>.part, целиком в памяти не бывает.
+Часть принимается только с текущего конца файла (start == received), иначе
+409 с актуальным received; оборванная посреди часть засчитывается по тем
+байтам, что успели лечь на диск. Готовый файл переносится прямо в
+контентно-адресуемое хранилище (storage.py) без повторного копирования.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+
+from django.conf import settings
+from django.http import UnreadablePostError
+
+from . import documents
+from .models import Document, UploadSession
+from .storage import blob_name, document_storage, reuse_blob
+
+STREAM_BLOCK = 256 * 1024
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, received=None):
+        super().__init__(message)
+        self.status = status
+        self.received = received
+
+
+def options():
+    defaults = {
+        'ROOT': os.path.join(settings.BASE_DIR, 'upload_tmp'),
+        'CHUNK_SIZE': 8 * 1024 * 1024,
+        'MAX_CHUNK_SIZE': 32 * 1024 * 1024,
+        'MAX_FILE_SIZE': 4 * 1024 * 1024 * 1024,
+        'EXPIRE_HOURS': 24,
+    }
+    defaults.update(getattr(settings, 'CHUNKED_UPLOAD', {}))
+    return defaults
+
+
+def part_path(session):
+    return os.path.join(str(options()['ROOT']), f'{session.pk}.part')
+
+
+def parse_content_range(header, size):
+    """'bytes 0-1023/5000' → (start=0, length=1024)."""
+    match = CONTENT_RANGE.match(header or '')
+    if not match:
+        raise UploadError('нужен заголовок Content-Range: bytes <start>-<end>/<size>')
+    start, end, total = (int(g) for g in match.groups())
+    if total != size or end < start or end >= size:
+        raise UploadError('Content-Range не совпадает с размером файла')
+    return start, end - start + 1
+
+
+def write_chunk(session, stream, start, length):
+    """Пишет часть с позиции start, читая поток блоками. Возвращает новое значение received."""
+    if session.status != 'active':
+        raise UploadError('загрузка уже завершена', status=409, received=session.received)
+    if start != session.received:
+        raise UploadError(f'ожидается часть с байта {session.received}', status=409, received=session.received)
+    if length > options()['MAX_CHUNK_SIZE']:
+        raise UploadError(f'часть больше {options()["MAX_CHUNK_SIZE"]} байт', status=413)
+
+    path = part_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    written = 0
+    with open(path, 'r+b' if os.path.exists(path) else 'wb') as out:
+        out.seek(start)
+        try:
+            while written < length:
+                block = stream.read(min(STREAM_BLOCK, length - written))
+                if not block:
+                    break
+                out.write(block)
+                written += len(block)
+        except (UnreadablePostError, OSError):
+            pass  # соединение оборвалось — засчитываем то, что успели записать
+        out.truncate(start + written)
+    # условное обновление: параллельный повтор той же части не сдвинет received дважды
+    UploadSession.objects.filter(pk=session.pk, received=start).update(received=start + written)
+    session.received = start + written
+    if written < length:
+        raise UploadError('часть получена не полностью', status=400, received=session.received)
+    return session.received
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def complete(session):
+    """Проверяет размер и SHA-256, переносит файл в хранилище и создаёт Document."""
+    if session.status == 'complete':
+        return session.document
+    if session.received != session.size:
+        raise UploadError(f'получено {session.received} из {session.size} байт', status=409, received=session.received)
+    path = part_path(session)
+    content_hash = _file_sha256(path)
+    if content_hash != session.sha256:
+        # битый файл докачивать бессмысленно — начинаем заново
+        os.remove(path)
+        UploadSession.objects.filter(pk=session.pk).update(received=0)
+        session.received = 0
+        raise UploadError('SHA-256 не совпадает, загрузка сброшена', status=422, received=0)
+
+    ext = documents.file_extension(session.filename)
+    name = blob_name(content_hash, ext)
+    target = document_storage.path(name)
+    if reuse_blob(target):
+        os.remove(path)  # такой файл уже есть — просто ещё одна ссылка на него
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(path, target)  # rename, если каталоги на одном диске
+
+    document = Document(
+        title=session.title,
+        description=session.description,
+        file_type=session.file_type,
+        course=session.course,
+        uploaded_by=session.user,
+        original_name=session.filename[:255],
+        file_size=session.size,
+        file_ext=ext,
+        mime_type=mimetypes.guess_type(session.filename)[0] or 'application/octet-stream',
+        content_hash=content_hash,
+    )
+    document.file.name = name
+    document.save()
+    session.status = 'complete'
+    session.document = document
+    session.save(update_fields=['status', 'document', 'updated_at'])
+    return document
+
+
+def discard(session):
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
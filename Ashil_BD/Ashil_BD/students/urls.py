@@ -1,11 +1,15 @@
-from django.urls import path, include
+from django.urls import path, include, register_converter
 from . import views
+from .chat import RoomNameConverter
 from rest_framework.routers import DefaultRouter
 from .api_views import (
     StudentViewSet, CourseViewSet, TeacherViewSet,
-    EnrollmentViewSet, GradeViewSet, DocumentViewSet
+    EnrollmentViewSet, GradeViewSet, DocumentViewSet, UploadSessionViewSet, SearchAPIView, AnalyticsAPIView,
+    LeaderboardAPIView,
 )
 
+register_converter(RoomNameConverter, 'room')
+
 # Создаем router для API
 router = DefaultRouter()
 router.register(r'api/students', StudentViewSet)
@@ -14,6 +18,7 @@ router.register(r'api/teachers', TeacherViewSet)
 router.register(r'api/enrollments', EnrollmentViewSet)
 router.register(r'api/grades', GradeViewSet)
 router.register(r'api/documents', DocumentViewSet)
+router.register(r'api/uploads', UploadSessionViewSet)
 
 urlpatterns = [
     path('', views.dashboard, name='dashboard'),
@@ -21,6 +26,7 @@ urlpatterns = [
     path('student/<int:student_id>/', views.student_detail, name='student_detail'),
     path('courses/', views.course_list, name='course_list'),
     path('course/<int:course_id>/', views.course_detail, name='course_detail'),
+    path('course/<int:course_id>/gradebook/', views.course_gradebook, name='course_gradebook'),
     path('enrollment/<int:enrollment_id>/grade/', views.update_grade, name='update_grade'),
     path('add_student/', views.add_student, name='add_student'),
     path('add_course/', views.add_course, name='add_course'),
@@ -28,10 +34,28 @@ urlpatterns = [
     path('documents/', views.document_list, name='document_list'),
     path('documents/upload/', views.upload_document, name='upload_document'),
     path('documents/delete/<int:document_id>/', views.delete_document, name='delete_document'),
+    path('documents/<int:document_id>/download/', views.download_document, name='download_document'),
+    path('documents/text/stats/', views.document_text_stats, name='document_text_stats'),
     path('chat/', views.chat_room, name='chat_room'),
-    path('chat/<str:room_name>/', views.chat_room, name='chat_room'),
+    path('chat/<room:room_name>/', views.chat_room, name='chat_room'),
+    path('chat/<room:room_name>/messages/', views.chat_history, name='chat_history'),
     path('snake-game/', views.snake_game, name='snake_game'),
+    path('snake-game/scores/', views.snake_scores, name='snake_scores'),
+    path('snake-game/leaderboard/', views.snake_leaderboard, name='snake_leaderboard'),
     path('schedule/', views.schedule, name='schedule'),
+    path('calendar/<str:token>.ics', views.calendar_feed, name='calendar_feed'),
+    path('cache/stats/', views.page_cache_stats, name='page_cache_stats'),
+    path('export/gradebook.<str:fmt>', views.export_gradebook, name='export_gradebook'),
+    path('search/', views.site_search, name='site_search'),
+    path('api/search/', SearchAPIView.as_view(), name='api_search'),
+    path('api/analytics/', AnalyticsAPIView.as_view(scope='all'), name='api_analytics'),
+    path('api/analytics/courses/', AnalyticsAPIView.as_view(scope='courses'), name='api_analytics_courses'),
+    path('api/analytics/courses/<int:pk>/', AnalyticsAPIView.as_view(scope='course'), name='api_analytics_course'),
+    path('api/analytics/teachers/', AnalyticsAPIView.as_view(scope='teachers'), name='api_analytics_teachers'),
+    path('api/analytics/teachers/<int:pk>/', AnalyticsAPIView.as_view(scope='teacher'), name='api_analytics_teacher'),
+    path('api/analytics/cohorts/', AnalyticsAPIView.as_view(scope='cohorts'), name='api_analytics_cohorts'),
+    path('api/leaderboard/', LeaderboardAPIView.as_view(), name='api_leaderboard'),
+    path('api/leaderboard/students/<int:pk>/', LeaderboardAPIView.as_view(), name='api_leaderboard_student'),
     path('snake-game/', views.snake_game, name='snake_game'),
     # API URLs
     path('', include(router.urls)),
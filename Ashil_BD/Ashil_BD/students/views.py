@@ -1,54 +1,82 @@
+import json
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.db import models
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from datetime import datetime, timedelta
-from .models import Student, Course, Enrollment, Grade, Teacher, Document, ChatMessage  # ← ДОБАВЬ ChatMessage
+from django.db.models.functions import Coalesce
+from .models import Student, Course, Enrollment, Grade, Teacher, Document, DocumentText, ChatMessage, CourseStats  # ← ДОБАВЬ ChatMessage
 from .forms import EnrollmentForm, GradeForm, StudentForm, CourseForm, TeacherForm, DocumentForm, ChatMessageForm  # ← ДОБАВЬ ChatMessageForm
 from django.contrib import messages
+from django.core.paginator import Paginator
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import PermissionDenied
+from django.views.decorators.http import require_http_methods
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from . import documents, downloads, exports, extraction, gradebook, ical, leaderboard, search, snake, timetable
+from .cache import cached_context, cache_stats
+from .chat import HISTORY_LIMIT, fetch_history, fetch_range, serialize_message
+from .chat_buffer import submit_message
+
+DASHBOARD_MODELS = (Student, Course, Teacher, Enrollment, Grade)
 
 def dashboard(request):
+    context = cached_context('dashboard', DASHBOARD_MODELS, _dashboard_context)
+    return render(request, 'students/dashboard.html', context)
+
+def _dashboard_context():
     total_students = Student.objects.count()
     total_courses = Course.objects.count()
     total_teachers = Teacher.objects.count()
     
-    grades = Grade.objects.filter(score__isnull=False)
-    avg_score = grades.aggregate(avg=models.Avg('score'))['avg'] or 0
+    # Все агрегаты читаем из материализованных таблиц CourseStats/StudentStats
+    totals = CourseStats.objects.aggregate(score_sum=models.Sum('score_sum'), grade_count=models.Sum('grade_count'))
+    avg_score = totals['score_sum'] / totals['grade_count'] if totals['grade_count'] else 0
     
-    top_students = Student.objects.annotate(
-        avg_grade=models.Avg('enrollments__grade__score')
-    ).filter(avg_grade__isnull=False).order_by('-avg_grade')[:5]
+    # топ-5 — начало индекса рейтинга, без сортировки всех студентов
+    top_students = leaderboard.top(5)
     
     courses_stats = Course.objects.annotate(
-        student_count=models.Count('enrollments'),
-        avg_grade=models.Avg('enrollments__grade__score')
+        student_count=Coalesce('stats__enrollment_count', 0),
+        avg_grade=models.F('stats__score_avg')
     )
     
-    context = {
+    return {
         'total_students': total_students,
         'total_courses': total_courses,
         'total_teachers': total_teachers,
         'avg_score': round(float(avg_score), 2),
         'top_students': top_students,
-        'courses_stats': courses_stats,
+        'courses_stats': list(courses_stats),
     }
-    return render(request, 'students/dashboard.html', context)
 
 def student_list(request):
-    students = Student.objects.all()
+    students = cached_context('student_list', (Student,), lambda: list(Student.objects.all()))
     return render(request, 'students/student_list.html', {'students': students})
 
 def student_detail(request, student_id):
     student = get_object_or_404(Student, id=student_id)
     enrollments = student.enrollments.select_related('course').all()
-    return render(request, 'students/student_detail.html', {'student': student, 'enrollments': enrollments})
+    return render(request, 'students/student_detail.html', {
+        'student': student,
+        'enrollments': enrollments,
+        'calendar_url': ical.feed_url('student', student.id),
+        'place': leaderboard.rank(student.id),
+        # личная ссылка на игру — только персоналу, он передаёт её студенту
+        'snake_url': snake.play_url(student.id) if request.user.is_staff else None,
+    })
 
 def course_list(request):
-    courses = Course.objects.select_related('teacher').all()
+    courses = cached_context('course_list', (Course, Teacher), lambda: list(Course.objects.select_related('teacher').all()))
     return render(request, 'students/course_list.html', {'courses': courses})
 
 def course_detail(request, course_id):
     course = get_object_or_404(Course, id=course_id)
-    enrollments = course.enrollments.select_related('student').all()
+    # оценка тем же JOIN — без запроса на каждую строку в шаблоне
+    enrollments = course.enrollments.select_related('student', 'grade').all()
 
     if request.method == 'POST':
         form = EnrollmentForm(request.POST)
@@ -67,9 +95,18 @@ def course_detail(request, course_id):
     return render(request, 'students/course_detail.html', {
         'course': course,
         'enrollments': enrollments,
-        'form': form
+        'form': form,
+        'calendar_url': ical.feed_url('course', course.id),
+        'teacher_calendar_url': ical.feed_url('teacher', course.teacher_id) if course.teacher_id else None,
     })
 
+# 📊 Журнал курса: студенты × задания (см. gradebook.py)
+def course_gradebook(request, course_id):
+    course = get_object_or_404(Course.objects.select_related('teacher'), id=course_id)
+    context = gradebook.matrix(course, request.GET.get('page'))
+    context['course'] = course
+    return render(request, 'students/gradebook.html', context)
+
 def update_grade(request, enrollment_id):
     enrollment = get_object_or_404(Enrollment, id=enrollment_id)
     try:
@@ -124,9 +161,41 @@ def add_teacher(request):
     return render(request, 'students/add_teacher.html', {'form': form})
 
 # 📁 ФУНКЦИИ ДЛЯ ФАЙЛОВ
+DOCUMENTS_PER_PAGE = 24
+DOCUMENT_SORT_LABELS = [
+    ('new', 'Сначала новые'),
+    ('old', 'Сначала старые'),
+    ('title', 'По названию'),
+    ('size', 'Сначала большие'),
+    ('size_asc', 'Сначала маленькие'),
+    ('ext', 'По типу файла'),
+]
+
 def document_list(request):
-    documents = Document.objects.all().select_related('course').order_by('-uploaded_at')
-    return render(request, 'students/document_list.html', {'documents': documents})
+    sort = request.GET.get('sort')
+    if sort not in documents.SORTS:
+        sort = documents.DEFAULT_SORT
+
+    paginator = Paginator(Document.objects.select_related('course').order_by(*documents.SORTS[sort]), DOCUMENTS_PER_PAGE)
+    # число документов тоже из кэша — get_page() не делает COUNT на каждый запрос
+    paginator.count = cached_context('document_count', (Document,), Document.objects.count)
+    # ключ — по номеру после get_page(): ?page=abc, 0 и 999 дают ту же страницу, что и её номер
+    page = paginator.get_page(request.GET.get('page'))
+
+    def build():
+        # в кэш — готовые значения, а не Page с ленивым queryset внутри
+        return {
+            'documents': list(page.object_list),
+            'number': page.number,
+            'num_pages': paginator.num_pages,
+            'count': paginator.count,
+        }
+
+    context = cached_context('document_list', (Document, Course), build, sort, page.number)
+    context['sort'] = sort
+    context['sorts'] = DOCUMENT_SORT_LABELS
+    context['page_range'] = range(max(1, context['number'] - 3), min(context['num_pages'], context['number'] + 3) + 1)
+    return render(request, 'students/document_list.html', context)
 
 def upload_document(request):
     if request.method == 'POST':
@@ -148,28 +217,51 @@ def delete_document(request, document_id):
     messages.success(request, 'Файл удален!')
     return redirect('document_list')
 
+@staff_member_required
+def document_text_stats(request):
+    # метрики извлечения текста в этом процессе + сводка по базе
+    by_status = dict(DocumentText.objects.values_list('status').annotate(n=models.Count('pk')))
+    return JsonResponse({
+        'process': extraction.metrics(),
+        'stored': by_status,
+        'documents_without_text': Document.objects.filter(text__isnull=True).count(),
+    })
+
+@require_http_methods(['GET', 'HEAD'])
+def download_document(request, document_id):
+    document = get_object_or_404(Document.objects.select_related('course__teacher'), id=document_id)
+    if not request.user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    if not downloads.can_access(request.user, document):
+        raise PermissionDenied
+    try:
+        return downloads.serve(request, document)
+    except FileNotFoundError:
+        raise Http404('Файл документа не найден')
+
+# 📆 Лента расписания для календарных клиентов (.ics, см. ical.py)
+@require_http_methods(['GET', 'HEAD'])
+def calendar_feed(request, token):
+    subject = ical.parse_token(token)
+    feed = ical.feed(*subject) if subject is not None else None
+    if feed is None:
+        raise Http404('Календарь не найден')
+    return ical.serve(request, feed)
+
+CHAT_POST_WAIT = 2.0  # секунды
+
 def chat_room(request, room_name='general'):
     # ВАЖНО: фильтруем сообщения ТОЛЬКО по текущей комнате
-    messages = ChatMessage.objects.filter(room=room_name).order_by('timestamp')[:50]
+    messages, has_more = fetch_history(room_name)
     
+    # Обычный POST остаётся запасным вариантом, если WebSocket недоступен (WSGI)
     if request.method == 'POST':
         form = ChatMessageForm(request.POST)
         if form.is_valid():
-            message = form.save(commit=False)
-            # Используем гостевого пользователя для всех
-            from django.contrib.auth.models import User
-            try:
-                guest_user = User.objects.get(username='guest')
-            except User.DoesNotExist:
-                # Если пользователя нет - создаем
-                guest_user = User.objects.create_user(
-                    username='guest',
-                    email='guest@test.ru',
-                    password='123'
-                )
-            message.user = guest_user
-            message.room = room_name  # ВАЖНО: сохраняем в текущую комнату
-            message.save()
+            # ВАЖНО: сохраняем в текущую комнату; запись пакетная (chat_buffer),
+            # ждём её, чтобы после редиректа сообщение уже было в истории
+            written = submit_message(room_name, form.cleaned_data['message'])
+            written.wait(CHAT_POST_WAIT)
             return redirect('chat_room', room_name=room_name)
     else:
         form = ChatMessageForm()
@@ -177,13 +269,165 @@ def chat_room(request, room_name='general'):
     return render(request, 'students/chat_room.html', {
         'messages': messages,
         'form': form,
-        'room_name': room_name
+        'room_name': room_name,
+        'has_more': has_more,
     })
+
+def chat_history(request, room_name):
+    # ?after=<id> — новые сообщения, ?before=<id> — более ранние,
+    # ?since=<ISO>&until=<ISO> — за интервал времени (в том числе из архива)
+    try:
+        after = int(request.GET['after']) if 'after' in request.GET else None
+        before = int(request.GET['before']) if 'before' in request.GET else None
+        limit = int(request.GET.get('limit', HISTORY_LIMIT))
+    except ValueError:
+        return JsonResponse({'error': 'after, before и limit должны быть числами'}, status=400)
+    if after is not None and before is not None:
+        return JsonResponse({'error': 'укажите только after или только before'}, status=400)
+
+    if 'since' in request.GET:
+        if after is not None or before is not None:
+            return JsonResponse({'error': 'since/until нельзя сочетать с after/before'}, status=400)
+        try:
+            since = _aware(parse_datetime(request.GET['since']))
+            until = _aware(parse_datetime(request.GET['until'])) if 'until' in request.GET else timezone.now()
+        except (TypeError, ValueError):
+            return JsonResponse({'error': 'since и until — дата и время в ISO 8601'}, status=400)
+        rows, has_more = fetch_range(room_name, since, until, limit=limit)
+    else:
+        rows, has_more = fetch_history(room_name, after=after, before=before, limit=limit)
+    return JsonResponse({
+        'room': room_name,
+        'messages': [serialize_message(m) for m in rows],
+        'has_more': has_more,
+    })
+def _aware(value):
+    if value is None:
+        raise ValueError('не дата')
+    return timezone.make_aware(value) if timezone.is_naive(value) else value
+
 def snake_game(request):
+    # ?player=<подпись> — личная ссылка студента: его результаты попадают в общую таблицу рекордов
+    student = None
+    if 'player' in request.GET:
+        student_id = snake.parse_player(request.GET['player'])
+        if student_id is None:
+            raise Http404('Ссылка на игру недействительна')
+        student = get_object_or_404(Student, id=student_id)
+    config = snake.options()
     return render(request, 'students/snake_game.html', {
-        'page_title': 'Змейка знаний'
+        'page_title': 'Змейка знаний',
+        'student': student,
+        'player_token': request.GET['player'] if student else '',
+        'courses': list(student.enrollments.values('course_id', 'course__title').order_by('course__title')) if student else [],
+        'best': snake.personal_best(student.id) if student else 0,
+        'table': snake.table(),
+        'max_batch': config['MAX_BATCH'],
+        'poll_seconds': config['POLL_SECONDS'],
     })
+
+# 🐍 Результаты «Змейки» пачкой: {"player": "<подпись>", "scores": [120, 80, ...]} (см. snake.py)
+@require_http_methods(['POST'])
+def snake_scores(request):
+    config = snake.options()
+    try:
+        data = json.loads(request.body)
+        player, scores = data['player'], data['scores']
+    except (ValueError, KeyError, TypeError):
+        scores = None
+    # только список целых: 1e400 (inf), 99.9, true и строка "123" — не счёт
+    if not isinstance(scores, list) or not all(isinstance(score, int) and not isinstance(score, bool) for score in scores):
+        return JsonResponse({'error': 'ожидается {"player": подпись, "scores": [целое число, ...]}'}, status=400)
+    # за кого засчитать — решает подпись из личной ссылки, а не id из запроса
+    student_id = snake.parse_player(player)
+    if student_id is None:
+        return JsonResponse({'error': 'недействительная ссылка игрока'}, status=403)
+    if len(scores) > config['MAX_BATCH']:
+        return JsonResponse({'error': f'не больше {config["MAX_BATCH"]} результатов за раз'}, status=400)
+    if any(not 0 <= score <= config['MAX_SCORE'] for score in scores):
+        return JsonResponse({'error': f'счёт должен быть от 0 до {config["MAX_SCORE"]}'}, status=400)
+    snake.submit_scores([(student_id, score) for score in scores])
+    return JsonResponse({'accepted': len(scores)}, status=202)
+
+@require_http_methods(['GET', 'HEAD'])
+def snake_leaderboard(request):
+    # ?course=<id> — только записанные на курс; опрос страницы обычно получает 304
+    table = snake.table(_int_param(request, 'course'))
+    response = get_conditional_response(request, etag=table['etag'])
+    if response is None:
+        response = JsonResponse({'course_id': table['course_id'], 'scores': table['scores']})
+    response['ETag'] = table['etag']
+    patch_cache_control(response, no_cache=True)
+    return response
 def schedule(request):
-    return render(request, 'students/schedule.html', {
-        'page_title': 'Расписание занятий'
-    })
\ No newline at end of file
+    classroom = request.GET.get('classroom', '').strip()[:50]
+    teacher_id = _int_param(request, 'teacher')
+    student_id = _int_param(request, 'student')
+    student = get_object_or_404(Student, id=student_id) if student_id is not None else None
+    if teacher_id is not None:
+        get_object_or_404(Teacher, id=teacher_id)
+    context = {
+        'page_title': 'Расписание занятий',
+        'grid': timetable.timetable(classroom, teacher_id, student_id),
+        'classroom': classroom,
+        'teacher_id': teacher_id,
+        'student': student,
+    }
+    context.update(timetable.filter_choices())
+    return render(request, 'students/schedule.html', context)
+
+def _int_param(request, name):
+    try:
+        return int(request.GET[name])
+    except (KeyError, ValueError):
+        return None
+
+# 🗄️ Счётчики попаданий кэша страниц
+@staff_member_required
+def page_cache_stats(request):
+    return JsonResponse({'pages': cache_stats()})
+
+# 📤 Потоковая выгрузка журнала оценок (CSV / NDJSON)
+EXPORT_FORMATS = {
+    'csv': (exports.stream_csv, 'text/csv; charset=utf-8'),
+    'ndjson': (exports.stream_ndjson, 'application/x-ndjson; charset=utf-8'),
+}
+
+@staff_member_required
+def export_gradebook(request, fmt):
+    if fmt not in EXPORT_FORMATS:
+        raise Http404
+    course_id = request.GET.get('course')
+    if course_id is not None and not course_id.isdigit():
+        raise Http404
+    stream, content_type = EXPORT_FORMATS[fmt]
+    response = StreamingHttpResponse(stream(exports.gradebook_rows(course_id)), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="gradebook.{fmt}"'
+    response['Cache-Control'] = 'no-store'
+    response['X-Accel-Buffering'] = 'no'  # nginx не должен копить ответ целиком
+    return response
+
+# 🔎 Полнотекстовый поиск (search.py)
+SEARCH_PER_PAGE = 20
+
+def site_search(request):
+    query = request.GET.get('q', '').strip()[:200]
+    kind = request.GET.get('type')
+    kinds = [kind] if kind in search.INDEXES else None
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page = 1
+    # глубже последней доступной страницы не листаем — показываем её же с её номером
+    page = min(page, search.max_page(SEARCH_PER_PAGE))
+    results, has_more, truncated = search.search(query, kinds, (page - 1) * SEARCH_PER_PAGE, SEARCH_PER_PAGE)
+    return render(request, 'students/search.html', {
+        'search_query': query,
+        'kind': kind if kinds else '',
+        'kinds': [(index.kind, index.label) for index in search.INDEXES.values()],
+        'results': results,
+        'page': page,
+        'has_more': has_more,
+        'truncated': truncated,
+    })
+